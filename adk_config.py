@@ -10,8 +10,7 @@ class ADKConfig:
         # Google Cloud Configuration
         self.project_id = os.getenv("PROJECT_ID") or os.getenv("GOOGLE_CLOUD_PROJECT")
         
-        # Validate required configuration
-        self.validate()
+        # Validation is deferred to first use, so importing never fails or slows startup
 
     def validate(self):
         """Validate that all required configuration is present."""
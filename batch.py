@@ -0,0 +1,213 @@
+"""Headless batch runner: answer a file of questions concurrently without the Streamlit UI.
+
+Usage:
+    python batch.py questions.jsonl --output results/ --concurrency 8 --mode execute
+
+Each input line is a JSON object with a "question" and an optional "id". The
+runner writes one JSON line per question to ``results.jsonl`` in the output
+directory, the full result of each executed query as Parquet, a
+``summary.json`` with per-stage latency percentiles and throughput, and the
+run's metrics in Prometheus text format as ``metrics.prom``.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import Config
+from mcp_client import BigQueryClient, QueryExecutionError, parse_datasets
+from pipeline import PipelineError, QuestionPipeline
+from sql_generation_agent import SQLGenerationAgent, SQLGenerationError
+from tracing import get_metrics
+
+STAGES = ("schema", "generate", "prompt_build", "llm_call", "validate", "dry_run", "execute", "export", "total")
+
+
+def load_questions(path: str) -> List[Dict]:
+    """Read questions from a JSONL file, assigning line numbers as missing ids."""
+    questions = []
+    with open(path, encoding="utf-8") as handle:
+        for line_number, line in enumerate(handle, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if not record.get("question"):
+                raise ValueError(f"{path}:{line_number}: missing 'question'")
+            record.setdefault("id", str(line_number))
+            questions.append(record)
+    return questions
+
+
+def answer_question(
+    pipeline: QuestionPipeline,
+    record: Dict,
+    mode: str,
+    output_dir: str,
+    max_rows: Optional[int],
+) -> Dict:
+    """Run one question through the pipeline and describe the outcome as a JSON-able dict."""
+    started = time.perf_counter()
+    result = {"id": record["id"], "question": record["question"], "sql": None, "status": "error", "error": None}
+    timings: Dict[str, float] = {}
+    try:
+        prepared = pipeline.prepare(record["question"])
+        timings = prepared.timings
+        result.update(
+            sql=prepared.sql,
+            estimated_bytes=prepared.estimated_bytes,
+            regeneration_attempts=prepared.regeneration_attempts,
+        )
+
+        if mode != "execute":
+            prepared.trace.finish(status="not_executed")
+        else:
+            pager = pipeline.execute(prepared, max_rows=max_rows)
+            result.update(
+                row_count=pager.total_rows,
+                bytes_processed=pager.bytes_processed,
+                cache_hit=pager.cache_hit,
+            )
+            if pager.downloadable:
+                export_started = time.perf_counter()
+                file_path = os.path.join(output_dir, f"{_safe_file_name(record['id'])}.parquet")
+                pipeline.database_client.export_query_results(pager, "parquet", file_path=file_path)
+                timings["export"] = time.perf_counter() - export_started
+                result["result_file"] = file_path
+        result["status"] = "success"
+    except PipelineError as e:
+        timings = e.timings
+        result.update(sql=e.sql_query, error=str(e), failed_stage=e.stage)
+    except SQLGenerationError as e:
+        result.update(error=str(e), failed_stage="generate")
+    except QueryExecutionError as e:
+        result.update(error=str(e), failed_stage="execute")
+    except Exception as e:
+        # One bad question must not abort the whole batch
+        result.update(error=f"{type(e).__name__}: {e}", failed_stage="unknown")
+
+    timings["total"] = time.perf_counter() - started
+    result["timings"] = {stage: round(seconds, 4) for stage, seconds in timings.items()}
+    return result
+
+
+def summarize(results: List[Dict], wall_seconds: float) -> Dict:
+    """Aggregate per-stage p50/p95 latencies, success counts and throughput."""
+    stages = {}
+    for stage in STAGES:
+        samples = [result["timings"][stage] for result in results if stage in result["timings"]]
+        if samples:
+            stages[stage] = {
+                "count": len(samples),
+                "p50": round(float(np.percentile(samples, 50)), 4),
+                "p95": round(float(np.percentile(samples, 95)), 4),
+            }
+    succeeded = sum(1 for result in results if result["status"] == "success")
+    return {
+        "questions": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "wall_seconds": round(wall_seconds, 3),
+        "questions_per_second": round(len(results) / wall_seconds, 3) if wall_seconds > 0 else None,
+        "stages": stages,
+    }
+
+
+def run_batch(
+    questions: List[Dict],
+    output_dir: str,
+    concurrency: int = 4,
+    mode: str = "dry-run",
+    max_rows: Optional[int] = None,
+) -> Dict:
+    """Answer every question with at most ``concurrency`` in flight and write the results.
+
+    Results are appended to ``results.jsonl`` as each question finishes, so a long
+    batch can be monitored (and partially recovered) while it runs.
+
+    Returns:
+        The summary also written to ``summary.json``
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    database_client = BigQueryClient.from_config()
+    sql_agent = SQLGenerationAgent(database_client.schema_prefixes)
+    # The pipeline holds no per-question state, so one instance serves every worker
+    pipeline = QuestionPipeline(database_client, sql_agent)
+
+    # Warm the shared schema cache once instead of racing every worker into the first load
+    database_client.get_schema()
+
+    results = []
+    started = time.perf_counter()
+    with open(os.path.join(output_dir, "results.jsonl"), "w", encoding="utf-8") as results_file:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch") as executor:
+            futures = [
+                executor.submit(answer_question, pipeline, record, mode, output_dir, max_rows)
+                for record in questions
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                results_file.write(json.dumps(result, default=str) + "\n")
+                results_file.flush()
+                status = "ok" if result["status"] == "success" else f"failed: {result['error']}"
+                print(f"[{len(results)}/{len(questions)}] {result['id']}: {status}", file=sys.stderr)
+
+    summary = summarize(results, time.perf_counter() - started)
+    with open(os.path.join(output_dir, "summary.json"), "w", encoding="utf-8") as summary_file:
+        json.dump(summary, summary_file, indent=2)
+    with open(os.path.join(output_dir, "metrics.prom"), "w", encoding="utf-8") as metrics_file:
+        metrics_file.write(get_metrics().render_prometheus())
+    return summary
+
+
+def _safe_file_name(value: str) -> str:
+    return "".join(char if char.isalnum() or char in "-_" else "_" for char in str(value))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Answer a file of questions without the Streamlit UI.")
+    parser.add_argument("questions", help="JSONL file with one {\"id\", \"question\"} object per line")
+    parser.add_argument("--output", default="batch_results", help="Output directory (default: batch_results)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Questions processed in parallel (default: 4)")
+    parser.add_argument(
+        "--mode",
+        choices=("dry-run", "execute"),
+        default="dry-run",
+        help="dry-run stops after validation and the cost estimate; execute also runs each query",
+    )
+    parser.add_argument(
+        "--max-rows",
+        type=int,
+        default=None,
+        help="Row cap for each in-memory result (default: MAX_RESULT_ROWS); "
+             "the Parquet file always holds the full result",
+    )
+    args = parser.parse_args(argv)
+
+    if not Config.PROJECT_ID or not (Config.DATASET_ID or Config.DATASETS):
+        parser.error("PROJECT_ID and DATASET_ID (or DATASETS) must be set in the .env file.")
+    try:
+        parse_datasets(Config.DATASETS or [Config.DATASET_ID], Config.PROJECT_ID)
+    except ValueError as e:
+        parser.error(str(e))
+
+    summary = run_batch(
+        load_questions(args.questions),
+        args.output,
+        concurrency=args.concurrency,
+        mode=args.mode,
+        max_rows=args.max_rows,
+    )
+    print(json.dumps(summary, indent=2))
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
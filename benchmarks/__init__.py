@@ -0,0 +1 @@
+"""Offline benchmarks that run the app's hot paths against local LLM and BigQuery stand-ins."""
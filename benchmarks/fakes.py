@@ -0,0 +1,353 @@
+"""Deterministic local stand-ins for the LLM and BigQuery used by the benchmarks.
+
+Nothing here touches the network: the fake LLM answers from the prompt it is
+given and the fake BigQuery client serves synthetic INFORMATION_SCHEMA rows and
+Arrow results of a configurable size.
+"""
+
+import datetime
+import re
+import tempfile
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import pyarrow as pa
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_COLUMN_TYPES = ("INT64", "STRING", "FLOAT64", "TIMESTAMP", "BOOL", "DATE")
+_SCHEMA_PREFIX = re.compile(r"FROM (`[^`\s]+\.)table_name")
+# Matches both the compact ("  id INT64, ...") and verbose ("Columns:\n  - id (...)") encodings
+_FIRST_TABLE = re.compile(r"Table:\s*(\w+)\n(?:Columns:\n)?\s*-?\s*(\w+)")
+
+
+def synthetic_schema_rows(num_tables: int, columns_per_table: int, num_shards: int = 0) -> List[Dict[str, Any]]:
+    """Build INFORMATION_SCHEMA.COLUMNS-shaped rows for a synthetic dataset.
+
+    ``num_shards`` adds daily ``events_YYYYMMDD`` shards with identical columns.
+    """
+    rows = []
+    first_day = datetime.date(2024, 1, 1)
+    # (table name, name its columns are derived from); every shard shares "events"
+    tables = [(f"table_{table:04d}", f"table_{table:04d}") for table in range(num_tables)]
+    tables += [
+        (f"events_{first_day + datetime.timedelta(days=day):%Y%m%d}", "events") for day in range(num_shards)
+    ]
+    for table_name, base_name in tables:
+        for column in range(columns_per_table):
+            rows.append({
+                "table_name": table_name,
+                "column_name": f"{base_name}_col_{column:03d}" if column else "id",
+                "data_type": _COLUMN_TYPES[column % len(_COLUMN_TYPES)],
+                "is_nullable": "NO" if column == 0 else "YES",
+                "description": f"Column {column} of {base_name}" if column % 3 == 0 else None,
+            })
+    return rows
+
+
+def synthetic_arrow_table(num_rows: int, num_columns: int, seed: int = 0) -> pa.Table:
+    """Build a deterministic Arrow table mixing integer, float and string columns."""
+    generator = np.random.default_rng(seed)
+    columns = {}
+    for column in range(num_columns):
+        name = f"col_{column:03d}"
+        if column % 3 == 0:
+            columns[name] = pa.array(np.arange(num_rows, dtype=np.int64) + column)
+        elif column % 3 == 1:
+            columns[name] = pa.array(generator.random(num_rows))
+        else:
+            values = generator.integers(0, 1000, num_rows)
+            columns[name] = pa.array([f"value_{value}" for value in values])
+    return pa.table(columns)
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that streams a valid query for the first table in the prompt.
+
+    ``first_token_latency`` is slept before the first chunk and
+    ``token_latency`` before each following one, so time-to-first-token and
+    generation speed can be set independently.
+    """
+
+    first_token_latency: float = 0.0
+    token_latency: float = 0.0
+    chunk_size: int = 8
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-sql"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        text = "".join(chunk.message.content for chunk in self._stream(messages, stop, run_manager, **kwargs))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        text = self._answer(messages)
+        time.sleep(self.first_token_latency)
+        for start in range(0, len(text), self.chunk_size):
+            if start and self.token_latency:
+                time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text[start:start + self.chunk_size]))
+
+    @staticmethod
+    def _answer(messages) -> str:
+        prompt = "\n".join(str(message.content) for message in messages)
+        prefix = _SCHEMA_PREFIX.search(prompt)
+        table = _FIRST_TABLE.search(prompt)
+        if not prefix or not table:
+            return '{"query": "SELECT 1"}'
+        table_name, column_name = table.groups()
+        return f'{{"query": "SELECT {column_name} FROM {prefix.group(1)}{table_name}` LIMIT 100"}}'
+
+
+class FakeRowIterator:
+    """The subset of ``google.cloud.bigquery.table.RowIterator`` the app uses."""
+
+    def __init__(self, rows: Optional[List[Dict]] = None, table: Optional[pa.Table] = None, page_size: int = 1000):
+        self._rows = rows
+        self._table = table
+        self.page_size = page_size or 1000
+        self.total_rows = len(rows) if rows is not None else table.num_rows
+
+    def __iter__(self):
+        return iter(self._rows if self._rows is not None else self._table.to_pylist())
+
+    def to_arrow(self, bqstorage_client=None, create_bqstorage_client=True) -> pa.Table:
+        # Real downloads materialize fresh buffers, so do the same instead of sharing one table
+        return pa.Table.from_batches(list(self.to_arrow_iterable()), schema=self._table.schema)
+
+    def to_arrow_iterable(self, bqstorage_client=None) -> Iterator[pa.RecordBatch]:
+        for batch in self._table.to_batches(max_chunksize=self.page_size):
+            yield pa.record_batch([pa.concat_arrays([column]) for column in batch.columns], schema=batch.schema)
+
+
+class FakeQueryJob:
+    """A query job with a fixed scan size that finishes ``run_seconds`` after submission."""
+
+    def __init__(
+        self,
+        rows: Optional[List[Dict]],
+        table: Optional[pa.Table],
+        bytes_processed: int,
+        run_seconds: float = 0.0,
+    ):
+        self._rows = rows
+        self._table = table
+        self._bytes_processed = bytes_processed
+        self._finishes_at = time.monotonic() + run_seconds
+        self.job_id = f"fake_job_{id(self):x}"
+        self.project = "fake-project"
+        self.location = "US"
+        self.cancelled = False
+        self.destination = SimpleNamespace(table_id="anon_destination") if table is not None else None
+        self.timeline = []
+        self.slot_millis = None
+        # Raised, one per call, by the next status checks
+        self.poll_errors: List[Exception] = []
+
+    @property
+    def state(self) -> str:
+        return "DONE" if self.cancelled or time.monotonic() >= self._finishes_at else "RUNNING"
+
+    @property
+    def total_bytes_processed(self) -> Optional[int]:
+        return self._bytes_processed if self.state == "DONE" else None
+
+    def done(self, **kwargs) -> bool:
+        if self.poll_errors:
+            raise self.poll_errors.pop(0)
+        return self.state == "DONE"
+
+    def cancel(self, **kwargs) -> bool:
+        self.cancelled = True
+        return True
+
+    def result(self, page_size: Optional[int] = None, **kwargs) -> FakeRowIterator:
+        while not self.done():
+            time.sleep(0.01)
+        if self.cancelled:
+            raise RuntimeError(f"Job {self.job_id} was cancelled")
+        return FakeRowIterator(self._rows, self._table, page_size)
+
+
+class FakeBigQueryClient:
+    """Serves synthetic schema rows and Arrow results in place of ``bigquery.Client``.
+
+    Every non-metadata query returns the same synthetic result table, and dry
+    runs report ``bytes_processed`` unless ``dry_run_errors`` queues an error
+    for them to raise. ``__TABLES__`` reports the last-modified
+    times in ``table_modified`` (0 for tables not listed) and every table's
+    type from ``table_type``; it also lists ``column_less_tables`` and leaves
+    out ``unlisted_tables``. COLUMNS honours the ``table_names`` filter of
+    incremental schema refreshes and records each filter, or None for a full
+    read, in ``column_queries``. Result queries run for ``job_seconds``
+    and are kept in ``jobs``; their status checks raise the errors queued in
+    ``poll_errors`` first, and submissions raise those in ``submit_errors``
+    after creating the job, as if the response had been lost. Reusing a
+    ``job_id`` raises ``Conflict``. The default ``table_type`` "VIEW" keeps
+    results out of the local result cache so each execution is measured end
+    to end.
+    """
+
+    def __init__(
+        self,
+        schema_rows: List[Dict],
+        result_table: pa.Table,
+        bytes_processed: int = 10 * 1024 ** 2,
+        table_type: str = "VIEW",
+        job_seconds: float = 0.0,
+    ):
+        self.schema_rows = schema_rows
+        self.result_table = result_table
+        self.bytes_processed = bytes_processed
+        self.table_type = table_type
+        self.table_modified: Dict[str, int] = {}
+        self.column_less_tables: List[str] = []
+        self.unlisted_tables: List[str] = []
+        self.column_queries: List[Optional[List[str]]] = []
+        self.job_seconds = job_seconds
+        self.jobs: List[FakeQueryJob] = []
+        self.poll_errors: List[Exception] = []
+        self.submit_errors: List[Exception] = []
+        self.dry_run_errors: List[Exception] = []
+        self.query_count = 0
+
+    def query(self, sql_query: str, job_config=None, **kwargs) -> FakeQueryJob:
+        self.query_count += 1
+        if "__TABLES__" in sql_query:
+            if "type = 1" in sql_query and self.table_type != "TABLE":
+                return FakeQueryJob([], None, 0)
+            names = dict.fromkeys([*(row["table_name"] for row in self.schema_rows), *self.column_less_tables])
+            rows = [
+                {"table_id": name, "last_modified_time": self.table_modified.get(name, 0)}
+                for name in names if name not in self.unlisted_tables
+            ]
+            return FakeQueryJob(rows, None, 0)
+        if "INFORMATION_SCHEMA.COLUMNS" in sql_query:
+            parameters = {
+                parameter.name: parameter.values
+                for parameter in getattr(job_config, "query_parameters", None) or []
+            }
+            self.column_queries.append(parameters.get("table_names"))
+            wanted = set(parameters["table_names"]) if "table_names" in parameters else None
+            rows = [dict(row) for row in self.schema_rows if wanted is None or row["table_name"] in wanted]
+            return FakeQueryJob(rows, None, 0)
+        if job_config is not None and job_config.dry_run:
+            if self.dry_run_errors:
+                raise self.dry_run_errors.pop(0)
+            return FakeQueryJob(None, None, self.bytes_processed)
+        job_id = kwargs.get("job_id")
+        if job_id is not None and any(job.job_id == job_id for job in self.jobs):
+            from google.api_core.exceptions import Conflict
+
+            raise Conflict(f"Already Exists: Job {job_id}")
+        job = FakeQueryJob(None, self.result_table, self.bytes_processed, self.job_seconds)
+        job.query = sql_query
+        job.job_config = job_config
+        job.job_id = job_id or job.job_id
+        job.poll_errors = self.poll_errors
+        self.jobs.append(job)
+        if self.submit_errors:
+            # The job exists, but the caller never hears back
+            raise self.submit_errors.pop(0)
+        return job
+
+    def get_job(self, job_id: str, **kwargs) -> FakeQueryJob:
+        return next(job for job in self.jobs if job.job_id == job_id)
+
+    def list_rows(self, destination, page_size: Optional[int] = None, **kwargs) -> FakeRowIterator:
+        return FakeRowIterator(table=self.result_table, page_size=page_size)
+
+    def get_table(self, table) -> SimpleNamespace:
+        # Describes a query destination, which holds the result table
+        return SimpleNamespace(
+            table_type="TABLE", num_bytes=self.result_table.nbytes, num_rows=self.result_table.num_rows
+        )
+
+    def dataset(self, dataset_id: str):
+        return dataset_id
+
+    def list_tables(self, dataset_ref) -> List[SimpleNamespace]:
+        names = dict.fromkeys(row["table_name"] for row in self.schema_rows)
+        return [SimpleNamespace(table_id=name) for name in names]
+
+
+@contextmanager
+def fake_backends(bigquery_client: FakeBigQueryClient, project_id: str):
+    """Route the shared BigQuery client and every schema/result cache to local fakes.
+
+    The SQL and result caches are swapped for fresh in-memory instances (a
+    persisted SQL cache is never touched), schema snapshots go to a throwaway
+    directory and the schema cache is emptied, so measurements never reuse
+    state from a real backend. Request schedulers are replaced with unlimited
+    ones, so rate limits pace real traffic but never the measurements.
+    Everything is restored on exit.
+    """
+    import bigquery_tools
+    import client_pool
+    import result_cache
+    import scheduler
+    import schema_snapshot
+    import sql_cache
+    import sql_generation_agent
+    from config import Config
+
+    saved = (
+        dict(client_pool._clients),
+        client_pool._bqstorage_client,
+        result_cache._result_cache,
+        sql_cache._sql_cache,
+        schema_snapshot._snapshot_store,
+        dict(scheduler._schedulers),
+    )
+    snapshot_dir = tempfile.TemporaryDirectory(prefix="bq_bench_snapshots_")
+    client_pool._clients[project_id] = bigquery_client
+    # Large results would otherwise open a real Storage Read API channel
+    client_pool._bqstorage_client = object()
+    result_cache._result_cache = None
+    sql_cache._sql_cache = sql_cache.SQLCache(ttl=Config.SQL_CACHE_TTL, max_entries=Config.SQL_CACHE_MAX_ENTRIES)
+    schema_snapshot._snapshot_store = schema_snapshot.SchemaSnapshotStore(snapshot_dir.name)
+    bigquery_tools._schema_cache.invalidate()
+    bigquery_tools._table_versions_cache.invalidate()
+    scheduler._schedulers.clear()
+    scheduler._schedulers.update(
+        (backend, scheduler.Scheduler(backend, max_concurrency=0, rate=0, burst=1)) for backend in ("llm", "bigquery")
+    )
+    try:
+        yield bigquery_client
+    finally:
+        client_pool._clients.clear()
+        client_pool._clients.update(saved[0])
+        (
+            client_pool._bqstorage_client,
+            result_cache._result_cache,
+            sql_cache._sql_cache,
+            schema_snapshot._snapshot_store,
+        ) = saved[1:5]
+        scheduler._schedulers.clear()
+        scheduler._schedulers.update(saved[5])
+        snapshot_dir.cleanup()
+        bigquery_tools._schema_cache.invalidate()
+        bigquery_tools._table_versions_cache.invalidate()
+        with sql_generation_agent._llm_lock:
+            # Drop the chains built around fake models
+            for key in [key for key in sql_generation_agent._chains if str(key[0][1]).startswith("fake-")]:
+                del sql_generation_agent._chains[key]
+            for key in [key for key in sql_generation_agent._llm_instances if str(key[1]).startswith("fake-")]:
+                del sql_generation_agent._llm_instances[key]
+
+
+def fake_sql_agent(schema_prefix: str, llm: FakeChatModel):
+    """Build a SQLGenerationAgent whose LLM is the given fake, skipping API key checks."""
+    from sql_generation_agent import SQLGenerationAgent
+
+    agent = SQLGenerationAgent(schema_prefix)
+    agent._initialize_llm = lambda temperature=None: llm
+    agent._check_api_key = lambda: None
+    # Key the shared client and chain caches apart from any real configuration
+    agent.model_name = f"fake-{id(llm)}"
+    return agent
@@ -0,0 +1,96 @@
+"""Check that the app's entry points import within a startup-time budget.
+
+Usage:
+    python -m benchmarks.import_time --budget-ms 1000
+
+Each module is imported in fresh interpreters with ``-X importtime`` and the
+median cumulative import time is compared with the budget. The check also
+fails if a heavy SDK that should only load on first use (the ADK, LangChain,
+the LLM provider packages, the BigQuery client) is imported eagerly. The exit
+code is non-zero on any failure, so the check can gate CI.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional
+
+# Imported on first use only; seeing one at startup is a regression
+LAZY_MODULES = (
+    "google.adk",
+    "google.cloud.bigquery",
+    "google.cloud.bigquery_storage",
+    "langchain_core",
+    "langchain_google_genai",
+    "langchain_openai",
+)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PROBE = """
+import json, sys
+import {module}
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def measure_import(module: str) -> Dict:
+    """Import ``module`` in a fresh interpreter; return its cumulative time and loaded modules."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-W", "ignore", "-c", _PROBE.format(module=module)],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative_us = None
+    for line in completed.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            cumulative_us = int(parts[1])
+    return {
+        "import_ms": cumulative_us / 1000 if cumulative_us is not None else None,
+        "modules": json.loads(completed.stdout.strip().splitlines()[-1]),
+    }
+
+
+def check_module(module: str, runs: int, budget_ms: float) -> List[str]:
+    """Return the problems found for one module (empty when it is within budget)."""
+    samples = [measure_import(module) for _ in range(runs)]
+    timings = [sample["import_ms"] for sample in samples if sample["import_ms"] is not None]
+    problems = []
+    median_ms = statistics.median(timings) if timings else float("nan")
+    print(f"{module:<12} median {median_ms:8.1f} ms over {len(timings)} runs (budget {budget_ms:.0f} ms)")
+    if median_ms > budget_ms:
+        problems.append(f"{module}: import took {median_ms:.1f} ms, over the {budget_ms:.0f} ms budget")
+    loaded = samples[0]["modules"]
+    for lazy in LAZY_MODULES:
+        if any(name == lazy or name.startswith(lazy + ".") for name in loaded):
+            problems.append(f"{module}: imports {lazy} eagerly")
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check the import time of the app's entry points.")
+    parser.add_argument(
+        "modules", nargs="*", default=["main", "batch", "pipeline"],
+        help="Modules to import (default: main batch pipeline)",
+    )
+    parser.add_argument("--budget-ms", type=float, default=1000, help="Maximum median import time (default: 1000)")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module (default: 5)")
+    args = parser.parse_args(argv)
+
+    problems = []
+    for module in args.modules:
+        problems.extend(check_module(module, args.runs, args.budget_ms))
+    for problem in problems:
+        print(f"FAIL {problem}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
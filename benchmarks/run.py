@@ -0,0 +1,279 @@
+"""Run the offline benchmarks and optionally compare them with a saved baseline.
+
+Usage:
+    python -m benchmarks.run --save-baseline baseline.json
+    python -m benchmarks.run --baseline baseline.json --threshold 0.1
+
+Every benchmark runs against the local stand-ins in ``benchmarks.fakes``, so no
+LLM or BigQuery call is made and no credentials are needed. Each one reports
+p50/p95 wall time over the timed iterations, plus the peak traced memory and
+the memory blocks still allocated after a single traced iteration.
+"""
+
+import argparse
+import gc
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+# The app's modules read their configuration at import time
+os.environ.setdefault("PROJECT_ID", "benchmark-project")
+os.environ.setdefault("DATASET_ID", "benchmark_dataset")
+
+import bigquery_tools  # noqa: E402
+from adk_config import config  # noqa: E402
+from benchmarks.fakes import (  # noqa: E402
+    FakeBigQueryClient,
+    FakeChatModel,
+    fake_backends,
+    fake_sql_agent,
+    synthetic_arrow_table,
+    synthetic_schema_rows,
+)
+from mcp_client import BigQueryClient  # noqa: E402
+from pipeline import QuestionPipeline  # noqa: E402
+
+
+class BenchmarkContext:
+    """Shared fixtures for one benchmark run, built from the command-line sizes."""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.project_id = config.project_id
+        self.dataset_id = os.environ["DATASET_ID"]
+        self.schema_rows = synthetic_schema_rows(args.tables, args.columns, args.shards)
+        self.bigquery = FakeBigQueryClient(self.schema_rows, synthetic_arrow_table(args.rows, args.result_columns))
+        self.database_client = BigQueryClient(self.project_id, self.dataset_id)
+        self.llm = FakeChatModel(first_token_latency=args.llm_latency, token_latency=args.llm_token_latency)
+        self.sql_agent = fake_sql_agent(self.database_client.schema_prefix, self.llm)
+
+    def table_sql(self, num_tables: int = 3) -> str:
+        """A join over the first few synthetic tables, as generated SQL would look."""
+        tables = [f"table_{i:04d}" for i in range(min(num_tables, self.args.tables))]
+        sql = f"SELECT t0.id FROM {self.database_client.schema_prefix}{tables[0]}` AS t0"
+        for i, table in enumerate(tables[1:], start=1):
+            sql += f" JOIN {self.database_client.schema_prefix}{table}` AS t{i} ON t{i}.id = t0.id"
+        return sql + " LIMIT 100"
+
+
+def bench_format_schema(context: BenchmarkContext) -> Callable[[], Any]:
+    return lambda: bigquery_tools.format_schema(context.schema_rows)
+
+
+def bench_schema_load(context: BenchmarkContext) -> Callable[[], Any]:
+    def run():
+        # A cold start: table versions come from BigQuery, columns from the saved snapshot,
+        # then the prompt text, index and retriever are built
+        bigquery_tools._schema_cache.invalidate()
+        return context.database_client.get_schema()
+    return run
+
+
+def bench_schema_refresh(context: BenchmarkContext) -> Callable[[], Any]:
+    key = (context.project_id, context.dataset_id)
+    previous = bigquery_tools._refresh_dataset_schema(key, None)
+    counter = itertools.count(1)
+
+    def run():
+        # One table changed since the previous schema: only it is re-read and re-formatted
+        number = next(counter)
+        context.bigquery.table_modified[f"table_{number % context.args.tables:04d}"] = number
+        return bigquery_tools._refresh_dataset_schema(key, previous)
+    return run
+
+
+def bench_validate_table_name(context: BenchmarkContext) -> Callable[[], Any]:
+    context.database_client.get_schema()
+    sql = context.table_sql()
+    return lambda: context.database_client.validate_table_name(sql)
+
+
+def bench_execute_query(context: BenchmarkContext) -> Callable[[], Any]:
+    sql = context.table_sql(1)
+    return lambda: bigquery_tools.execute_query_with_context(sql)
+
+
+def bench_execute_query_stream(context: BenchmarkContext) -> Callable[[], Any]:
+    context.database_client.get_schema()
+    sql = context.table_sql(1)
+    return lambda: context.database_client.execute_query(sql, stream=True)
+
+
+def bench_prompt_build(context: BenchmarkContext) -> Callable[[], Any]:
+    schema_text = context.database_client.get_schema()
+    prompt = context.sql_agent._get_chain().first
+
+    def run():
+        human_message = context.sql_agent._create_human_message("How many rows are in table_0001?", schema_text)
+        return prompt.invoke({"human_message": human_message})
+    return run
+
+
+def bench_generate_sql_query(context: BenchmarkContext) -> Callable[[], Any]:
+    schema_text = context.database_client.get_relevant_schema("How many rows are in table_0001?")
+    return lambda: context.sql_agent.generate_sql_query(
+        "How many rows are in table_0001?", schema_text, use_cache=False
+    )
+
+
+def bench_pipeline(context: BenchmarkContext) -> Callable[[], Any]:
+    context.database_client.get_schema()
+    pipeline = QuestionPipeline(context.database_client, context.sql_agent)
+    counter = itertools.count()
+
+    def run():
+        # A new question every time, so the SQL cache never short-circuits generation
+        number = next(counter)
+        table = f"table_{number % context.args.tables:04d}"
+        prepared = pipeline.prepare(f"What are the latest {table} records? ({number})")
+        return pipeline.execute(prepared)
+    return run
+
+
+BENCHMARKS: Dict[str, Callable[[BenchmarkContext], Callable[[], Any]]] = {
+    "format_schema": bench_format_schema,
+    "schema_load": bench_schema_load,
+    "schema_refresh": bench_schema_refresh,
+    "validate_table_name": bench_validate_table_name,
+    "execute_query": bench_execute_query,
+    "execute_query_stream": bench_execute_query_stream,
+    "prompt_build": bench_prompt_build,
+    "generate_sql_query": bench_generate_sql_query,
+    "pipeline": bench_pipeline,
+}
+
+
+def measure(run: Callable[[], Any], iterations: int, warmup: int) -> Dict[str, Any]:
+    """Time ``run`` and trace the memory of one extra call."""
+    for _ in range(warmup):
+        run()
+
+    durations = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        run()
+        durations.append(time.perf_counter() - started)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        start_bytes, _ = tracemalloc.get_traced_memory()
+        result = run()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        del result
+        gc.collect()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    retained = [stat for stat in after.compare_to(before, "filename") if stat.count_diff > 0]
+
+    durations_ms = np.array(durations) * 1000
+    return {
+        "iterations": iterations,
+        "p50_ms": round(float(np.percentile(durations_ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(durations_ms, 95)), 4),
+        "mean_ms": round(float(durations_ms.mean()), 4),
+        "peak_bytes": peak_bytes - start_bytes,
+        "retained_blocks": sum(stat.count_diff for stat in retained),
+        "retained_bytes": sum(stat.size_diff for stat in retained if stat.size_diff > 0),
+    }
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """Return a line per benchmark whose p50, p95 or peak memory regressed beyond ``threshold``."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in ("p50_ms", "p95_ms", "peak_bytes"):
+            if previous[metric] > 0 and result[metric] > previous[metric] * (1 + threshold):
+                change = result[metric] / previous[metric] - 1
+                regressions.append(f"{name}: {metric} {previous[metric]} -> {result[metric]} (+{change:.0%})")
+    return regressions
+
+
+def print_report(results: Dict[str, Dict], baseline: Optional[Dict[str, Dict]] = None):
+    header = f"{'benchmark':<22} {'p50 ms':>10} {'p95 ms':>10} {'peak KiB':>10} {'blocks':>8}"
+    if baseline:
+        header += f" {'p50 vs base':>12}"
+    print(header)
+    for name, result in results.items():
+        line = (
+            f"{name:<22} {result['p50_ms']:>10.3f} {result['p95_ms']:>10.3f} "
+            f"{result['peak_bytes'] / 1024:>10.1f} {result['retained_blocks']:>8}"
+        )
+        previous = (baseline or {}).get(name)
+        if previous and previous["p50_ms"] > 0:
+            line += f" {result['p50_ms'] / previous['p50_ms'] - 1:>+12.1%}"
+        print(line)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run offline benchmarks against local LLM and BigQuery stand-ins.")
+    parser.add_argument("--only", action="append", choices=sorted(BENCHMARKS), help="Run only this benchmark (repeatable)")
+    parser.add_argument("--iterations", type=int, default=50, help="Timed iterations per benchmark (default: 50)")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed warm-up iterations (default: 3)")
+    parser.add_argument("--tables", type=int, default=200, help="Synthetic tables in the dataset (default: 200)")
+    parser.add_argument("--columns", type=int, default=20, help="Columns per synthetic table (default: 20)")
+    parser.add_argument("--shards", type=int, default=0, help="Daily events_YYYYMMDD shards in the dataset (default: 0)")
+    parser.add_argument("--rows", type=int, default=50000, help="Rows in each query result (default: 50000)")
+    parser.add_argument("--result-columns", type=int, default=8, help="Columns in each query result (default: 8)")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Fake LLM time to first token in seconds")
+    parser.add_argument("--llm-token-latency", type=float, default=0.0, help="Fake LLM delay per streamed chunk in seconds")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--save-baseline", help="Write the results as a baseline to this file")
+    parser.add_argument("--baseline", help="Compare against a baseline written by --save-baseline")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1,
+        help="Relative slowdown or memory growth reported as a regression (default: 0.1)",
+    )
+    args = parser.parse_args(argv)
+
+    parameters = {
+        key: getattr(args, key)
+        for key in ("tables", "columns", "shards", "rows", "result_columns", "llm_latency", "llm_token_latency")
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            saved = json.load(handle)
+        if saved.get("parameters") != parameters:
+            print(f"warning: baseline was recorded with {saved.get('parameters')}", file=sys.stderr)
+        baseline = saved["results"]
+
+    context = BenchmarkContext(args)
+    results = {}
+    with fake_backends(context.bigquery, context.project_id):
+        for name in args.only or BENCHMARKS:
+            results[name] = measure(BENCHMARKS[name](context), args.iterations, args.warmup)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": parameters,
+        "results": results,
+    }
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+
+    print_report(results, baseline)
+    if baseline is None:
+        return 0
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
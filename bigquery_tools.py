@@ -1,63 +1,459 @@
 """BigQuery tools that leverage Google ADK tools for database interactions."""
 
-import json
-import streamlit as st
-from typing import Any, Dict, List, Optional
-from google.adk.tools.bigquery import BigQueryToolset
-from google.adk.tools.bigquery.config import BigQueryToolConfig
-from google.adk.tools.bigquery.config import WriteMode
-from google.cloud import bigquery
+import threading
+import uuid
+import pyarrow as pa
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
 from adk_config import config
+from config import Config
+from client_pool import get_bigquery_client, get_bqstorage_client
+from query_jobs import JobProgress, wait_for_job
+from scheduler import get_scheduler
+from result_cache import get_result_cache, is_cacheable, make_result_key, referenced_tables
+from schema_cache import SchemaCache
+from schema_index import DatasetSchema, SchemaIndex
+from schema_format import entry_documents, format_entry, group_tables, join_blocks
+from schema_retrieval import SchemaRetriever, estimate_tokens, select_within_budget
+from schema_snapshot import TableSnapshot, diff_tables, get_snapshot_store
+import tracing
 
+if TYPE_CHECKING:
+    from google.cloud import bigquery
 
-# Define a tool configuration to allow read operations but block write operations
-tool_config = BigQueryToolConfig(write_mode=WriteMode.BLOCKED)
 
-# Create BigQuery toolset
-bigquery_toolset = BigQueryToolset(bigquery_tool_config=tool_config)
+# A (project, dataset) pair
+DatasetKey = Tuple[str, str]
 
+# Query jobs get client-side IDs so that a retried submission cannot start a second job
+_JOB_ID_PREFIX = "nl2sql_"
 
-def get_dataset_schema(dataset_id: str) -> str:
+_bigquery_toolset = None
+_toolset_lock = threading.Lock()
+
+
+def get_bigquery_toolset():
+    """Return the shared ADK BigQuery toolset, with write operations blocked.
+    
+    The ADK pulls in Vertex AI and several other SDKs, which takes seconds, so
+    it is imported on first use instead of when this module loads.
+    """
+    global _bigquery_toolset
+    if _bigquery_toolset is None:
+        with _toolset_lock:
+            if _bigquery_toolset is None:
+                from google.adk.tools.bigquery import BigQueryToolset
+                from google.adk.tools.bigquery.config import BigQueryToolConfig, WriteMode
+
+                # Define a tool configuration to allow read operations but block write operations
+                tool_config = BigQueryToolConfig(write_mode=WriteMode.BLOCKED)
+                _bigquery_toolset = BigQueryToolset(bigquery_tool_config=tool_config)
+    return _bigquery_toolset
+
+
+def get_dataset_schema(dataset_id: str, project_id: Optional[str] = None) -> str:
     """Retrieve schema information for a BigQuery dataset.
     
+    Results are served from a process-wide cache shared by all sessions and
+    refreshed in the background according to ``Config.SCHEMA_CACHE_TTL``;
+    only a schema older than ``Config.SCHEMA_CACHE_MAX_AGE`` is reloaded
+    while the caller waits.
+    
     Args:
         dataset_id: The dataset ID to get schema for
+        project_id: The dataset's project, defaults to the configured project
         
     Returns:
         Formatted schema information as string
     """
-    # Use direct BigQuery client for schema retrieval
-    client = bigquery.Client(project=config.project_id)
+    try:
+        return _schema_cache.get((project_id or config.project_id, dataset_id)).text
+    except Exception as e:
+        return f"Error retrieving schema from dataset '{dataset_id}': {e}"
+
+
+def get_datasets_schema(datasets: Sequence[DatasetKey]) -> str:
+    """Retrieve the combined schema of several datasets, fetching them concurrently.
+    
+    With more than one dataset, each one's tables are listed under a heading
+    giving the prefix to reference them with.
+    
+    Args:
+        datasets: (project, dataset) pairs
+        
+    Returns:
+        Formatted schema information as string
+    """
+    if len(datasets) == 1:
+        project_id, dataset_id = datasets[0]
+        return get_dataset_schema(dataset_id, project_id)
+    return _render_schemas(load_dataset_schemas(datasets))
+
+
+def get_dataset_schema_indexes(datasets: Sequence[DatasetKey]) -> Dict[DatasetKey, SchemaIndex]:
+    """Return the index of every dataset, empty for any whose schema could not be fetched."""
+    return {
+        key: schema.index if isinstance(schema, DatasetSchema) else SchemaIndex()
+        for key, schema in load_dataset_schemas(datasets).items()
+    }
+
+
+def load_dataset_schemas(datasets: Sequence[DatasetKey]) -> Dict[DatasetKey, Union[DatasetSchema, Exception]]:
+    """Return the cached schema of every dataset, loading missing ones concurrently.
+    
+    Datasets whose schema is fresh in the cache are served inline; the rest are
+    loaded on up to ``Config.SCHEMA_FETCH_CONCURRENCY`` threads, so startup
+    latency is that of the slowest dataset rather than the sum.
+    
+    Returns:
+        (project, dataset) to its schema, or to the exception raised loading it
+    """
+    missing = [key for key in datasets if not _schema_cache.is_fresh(key)]
+    schemas: Dict[DatasetKey, Union[DatasetSchema, Exception]] = {}
+    if len(missing) > 1:
+        workers = max(1, min(len(missing), Config.SCHEMA_FETCH_CONCURRENCY))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="schema-load") as executor:
+            futures = {key: executor.submit(_schema_cache.get, key) for key in missing}
+            for key, future in futures.items():
+                try:
+                    schemas[key] = future.result()
+                except Exception as e:
+                    schemas[key] = e
+    for key in datasets:
+        if key not in schemas:
+            try:
+                schemas[key] = _schema_cache.get(key)
+            except Exception as e:
+                schemas[key] = e
+    return {key: schemas[key] for key in datasets}
+
+
+def get_relevant_schema(datasets: Sequence[DatasetKey], question: str) -> str:
+    """Retrieve the part of the datasets' schema relevant to a question.
+    
+    When the full schema fits in ``Config.SCHEMA_PROMPT_TOKEN_BUDGET`` it is
+    returned unchanged. Otherwise the entries (tables, or groups of date
+    shards) of every dataset are ranked against the question with each
+    dataset's local BM25 index, and the top ``Config.SCHEMA_PRUNING_TOP_K``
+    that fit the budget are kept.
+    
+    Args:
+        datasets: (project, dataset) pairs
+        question: The user's natural-language question
+        
+    Returns:
+        Formatted schema information as string
+    """
+    schemas = load_dataset_schemas(datasets)
+    if len(schemas) == 1:
+        (_, dataset_id), schema = next(iter(schemas.items()))
+        if isinstance(schema, Exception):
+            return f"Error retrieving schema from dataset '{dataset_id}': {schema}"
+        full_text = schema.text
+    else:
+        full_text = _render_schemas(schemas)
+    
+    loaded = {key: schema for key, schema in schemas.items() if isinstance(schema, DatasetSchema)}
+    budget = Config.SCHEMA_PROMPT_TOKEN_BUDGET
+    if all(schema.retriever is None for schema in loaded.values()) or estimate_tokens(full_text) <= budget:
+        return full_text
+    
+    # BM25 scores are merged across datasets as they are; each is normalized by its own corpus
+    ranked = sorted(
+        (
+            ((key, entry_key), score)
+            for key, schema in loaded.items() if schema.retriever is not None
+            for entry_key, score in schema.retriever.rank(question)
+        ),
+        key=lambda item: -item[1],
+    )
+    tokens = {
+        (key, entry_key): entry_tokens
+        for key, schema in loaded.items()
+        for entry_key, entry_tokens in schema.table_tokens.items()
+    }
+    selected = select_within_budget(ranked, tokens, Config.SCHEMA_PRUNING_TOP_K, budget)
+    if not selected:
+        # Nothing matched: fall back to as many tables as fit, in schema order
+        used_tokens = 0
+        for entry, entry_tokens in tokens.items():
+            if used_tokens + entry_tokens > budget or len(selected) >= Config.SCHEMA_PRUNING_TOP_K:
+                break
+            selected.append(entry)
+            used_tokens += entry_tokens
+    
+    return (
+        f"{_render_schemas(schemas, set(selected))}\n\n"
+        f"(Showing {len(selected)} of {len(tokens)} tables, "
+        f"selected for relevance to the question.)"
+    )
+
+
+def _render_schemas(
+    schemas: Dict[DatasetKey, Union[DatasetSchema, Exception]],
+    selected: Optional[Set[Tuple[DatasetKey, str]]] = None,
+) -> str:
+    """Join the formatted entry blocks of one or more datasets.
+    
+    Reuses the blocks formatted when each schema was loaded. Only ``selected``
+    (dataset, entry) pairs are included when given.
+    """
+    multiple = len(schemas) > 1
+    entries = []
+    blocks = []
+    errors = []
+    for (project_id, dataset_id), schema in schemas.items():
+        if isinstance(schema, Exception):
+            errors.append(f"\nError retrieving schema from dataset '{project_id}.{dataset_id}': {schema}")
+            continue
+        keys = [key for key in schema.entries if selected is None or ((project_id, dataset_id), key) in selected]
+        if multiple and keys:
+            blocks.append(
+                f"\nDataset: {project_id}.{dataset_id} "
+                f"(reference its tables as `{project_id}.{dataset_id}.<table>`)"
+            )
+        entries.extend(schema.entries[key] for key in keys)
+        blocks.extend(schema.table_blocks[key] for key in keys)
+    return join_blocks(entries, blocks + errors, Config.SCHEMA_PROMPT_FORMAT == "compact")
+
+
+def get_schema_cache_stats() -> Dict[str, Any]:
+    """Return hit/miss counters for the shared schema cache."""
+    return _schema_cache.stats()
+
+
+def _load_dataset_schema(key) -> DatasetSchema:
+    """Load the schema for a (project, dataset) key, reusing the previous one where possible."""
+    return _refresh_dataset_schema(key, _schema_cache.peek(key))
+
+
+def _refresh_dataset_schema(key, previous: Optional[DatasetSchema]) -> DatasetSchema:
+    """Fetch a dataset schema, re-reading columns only for tables that changed.
+    
+    In incremental mode the dataset's table list and last-modified times are
+    compared with ``previous`` (or, on a cold start, the snapshot saved on
+    disk), and INFORMATION_SCHEMA.COLUMNS is queried only for tables created or
+    modified since. Unchanged tables keep their formatted text and index
+    entries. Without a usable baseline, or when most tables changed, the whole
+    dataset is read in one query as in full mode.
+    
+    Every table ``__TABLES__`` lists is recorded with its version, even one
+    without COLUMNS rows, so an unchanged dataset settles into a no-op diff.
+    Tables with columns but no ``__TABLES__`` entry are kept until the next
+    full read.
+    """
+    project_id, dataset_id = key
+    # Metadata queries are billed to the configured project, which may read other projects' datasets
+    client = get_bigquery_client()
+    if Config.SCHEMA_REFRESH_MODE != "incremental":
+        return _load_full_schema(client, project_id, dataset_id)
+    
+    try:
+        versions = _fetch_table_versions(client, project_id, dataset_id)
+    except Exception:
+        # No access to table metadata: fall back to reading every column
+        return _load_full_schema(client, project_id, dataset_id)
+    
+    store = get_snapshot_store()
+    baseline = previous.tables if previous is not None and previous.tables else None
+    if baseline is None:
+        baseline = store.load(project_id, dataset_id)
+        # Snapshot tables have rows but no formatted blocks yet
+        previous = None
+    
+    changed, dropped = diff_tables(baseline or {}, versions)
+    tracing.annotate(schema_tables_changed=len(changed), schema_tables_dropped=len(dropped))
+    if previous is not None and not changed and not dropped:
+        return previous
+    
+    if baseline is None or len(changed) > len(versions) // 2:
+        # One scan of the whole dataset beats a long IN list, and replaces every table of the baseline
+        fetched = _fetch_columns(client, project_id, dataset_id)
+        changed = set(versions) | set(fetched)
+        tables = {}
+    else:
+        fetched = _fetch_columns(client, project_id, dataset_id, sorted(changed)) if changed else {}
+        tables = {table: snapshot for table, snapshot in baseline.items() if table not in changed | dropped}
+    # Tables listed without columns are recorded too, so the next diff does not fetch them again
+    for table in changed:
+        tables[table] = TableSnapshot(modified=versions.get(table), rows=fetched.get(table, []))
+    dropped = set(baseline or {}) - set(tables)
+    
+    schema = _build_dataset_schema(dataset_id, tables, previous, changed | dropped)
+    if changed or dropped:
+        store.save(project_id, dataset_id, tables)
+    return schema
+
+
+def _load_full_schema(client: "bigquery.Client", project_id: str, dataset_id: str) -> DatasetSchema:
+    """Read every column of the dataset in one query, without last-modified times."""
+    fetched = _fetch_columns(client, project_id, dataset_id)
+    tables = {table: TableSnapshot(modified=None, rows=rows) for table, rows in fetched.items()}
+    return _build_dataset_schema(dataset_id, tables)
+
+
+def _fetch_table_versions(
+    client: "bigquery.Client",
+    project_id: str,
+    dataset_id: str,
+    base_tables_only: bool = False,
+) -> Dict[str, int]:
+    """Return each table's last-modified time in milliseconds since the epoch.
+    
+    INFORMATION_SCHEMA.TABLES has no last-modified column, so this reads the
+    ``__TABLES__`` meta-table, which is free and covers views as well. With
+    ``base_tables_only``, views and external tables are left out.
+    """
+    # __TABLES__ types: 1 is a table, 2 a view, 3 an external table
+    type_filter = "WHERE type = 1" if base_tables_only else ""
+    query = f"""
+        SELECT table_id, last_modified_time
+        FROM `{project_id}.{dataset_id}.__TABLES__`
+        {type_filter}
+    """
+    rows = client.query(query).result()
+    return {row["table_id"]: row["last_modified_time"] for row in rows}
+
+
+def _fetch_columns(
+    client: "bigquery.Client",
+    project_id: str,
+    dataset_id: str,
+    table_names: Optional[List[str]] = None,
+) -> Dict[str, List[Dict]]:
+    """Query INFORMATION_SCHEMA for the columns of every table, or only of ``table_names``."""
+    job_config = None
+    table_filter = ""
+    if table_names is not None:
+        # Already loaded by the client that runs the job, so this import is free
+        from google.cloud import bigquery
+
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ArrayQueryParameter("table_names", "STRING", table_names)]
+        )
+        table_filter = "WHERE c.table_name IN UNNEST(@table_names)"
     
     query = f"""
         SELECT 
-            table_name,
-            column_name,
-            data_type,
-            is_nullable
-        FROM `{config.project_id}.{dataset_id}.INFORMATION_SCHEMA.COLUMNS`
-        ORDER BY table_name, ordinal_position
+            c.table_name,
+            c.column_name,
+            c.data_type,
+            c.is_nullable,
+            p.description
+        FROM `{project_id}.{dataset_id}.INFORMATION_SCHEMA.COLUMNS` AS c
+        LEFT JOIN `{project_id}.{dataset_id}.INFORMATION_SCHEMA.COLUMN_FIELD_PATHS` AS p
+            ON p.table_name = c.table_name
+            AND p.column_name = c.column_name
+            AND p.field_path = c.column_name
+        {table_filter}
+        ORDER BY c.table_name, c.ordinal_position
     """
     
-    try:
-        query_job = client.query(query)
-        results = query_job.result()
-        schema_info_list = [dict(row.items()) for row in results]
-        
-        if not schema_info_list:
-            return f"No schema information found for dataset '{dataset_id}'."
-        
-        # Format schema information
-        formatted_schema = format_schema(schema_info_list)
-        return formatted_schema
-        
-    except Exception as e:
-        return f"Error retrieving schema from dataset '{dataset_id}': {e}"
+    query_job = client.query(query, job_config=job_config)
+    results = query_job.result()
+    tables: Dict[str, List[Dict]] = {}
+    for row in results:
+        row = dict(row.items())
+        tables.setdefault(row['table_name'], []).append(row)
+    return tables
+
+
+def _build_dataset_schema(
+    dataset_id: str,
+    tables: Dict[str, TableSnapshot],
+    previous: Optional[DatasetSchema] = None,
+    changed: Optional[Set[str]] = None,
+) -> DatasetSchema:
+    """Format a schema and build its indexes, reusing ``previous`` for tables not in ``changed``.
+    
+    The prompt text and retriever work on schema entries, where date shards
+    with identical columns are collapsed into one wildcard entry; the
+    validation index keeps every concrete table.
+    
+    Args:
+        dataset_id: The dataset ID, for the empty-schema message
+        tables: Table name to its snapshot
+        previous: The schema these tables were patched from, if any
+        changed: Tables whose rows differ from ``previous`` (created, modified or dropped)
+    """
+    snapshots = dict(sorted(tables.items()))
+    rows = [row for snapshot in snapshots.values() for row in snapshot.rows]
+    if not rows:
+        return DatasetSchema(rows=[], text=f"No schema information found for dataset '{dataset_id}'.")
+    
+    changed = changed if changed is not None else set(snapshots)
+    reusable = previous is not None
+    compact = Config.SCHEMA_PROMPT_FORMAT == "compact"
+    entries = group_tables(
+        {table: snapshot.rows for table, snapshot in snapshots.items() if snapshot.rows},
+        Config.SCHEMA_SHARD_MIN_TABLES,
+    )
+    table_blocks: Dict[str, str] = {}
+    table_tokens: Dict[str, int] = {}
+    changed_entries = set(previous.entries) - set(entries) if reusable else set()
+    for key, entry in entries.items():
+        unchanged = (
+            reusable
+            and key in previous.entries
+            and previous.entries[key].tables == entry.tables
+            and not changed.intersection(entry.tables)
+        )
+        if unchanged:
+            table_blocks[key] = previous.table_blocks[key]
+            table_tokens[key] = previous.table_tokens[key]
+        else:
+            changed_entries.add(key)
+            table_blocks[key] = format_entry(entry, compact)
+            table_tokens[key] = estimate_tokens(table_blocks[key])
+    
+    documents = entry_documents(entries)
+    if reusable and previous.retriever is not None:
+        changed_rows = [row for table in changed if table in snapshots for row in snapshots[table].rows]
+        index = previous.index.patched(changed_rows, changed)
+        retriever = previous.retriever.patched(documents, changed_entries)
+    else:
+        index = SchemaIndex(rows)
+        retriever = SchemaRetriever(documents)
+    
+    return DatasetSchema(
+        rows=rows,
+        text=join_blocks(list(entries.values()), table_blocks.values(), compact),
+        index=index,
+        retriever=retriever,
+        table_tokens=table_tokens,
+        table_blocks=table_blocks,
+        tables=snapshots,
+        entries=entries,
+    )
+
+
+def _load_base_table_versions(key) -> Dict[str, int]:
+    """Load the last-modified times of a (project, dataset) key's base tables."""
+    project_id, dataset_id = key
+    return _fetch_table_versions(get_bigquery_client(), project_id, dataset_id, base_tables_only=True)
+
+
+# Shared across Streamlit sessions: module state survives script reruns.
+_schema_cache = SchemaCache(
+    loader=_load_dataset_schema,
+    ttl=Config.SCHEMA_CACHE_TTL,
+    max_entries=Config.SCHEMA_CACHE_MAX_ENTRIES,
+    max_age=Config.SCHEMA_CACHE_MAX_AGE,
+)
+# Table versions for result cache keys; a short TTL, never served past, bounds how stale a cached result can be
+_table_versions_cache = SchemaCache(
+    loader=_load_base_table_versions,
+    ttl=Config.RESULT_CACHE_VERSION_TTL,
+    max_entries=Config.SCHEMA_CACHE_MAX_ENTRIES,
+)
 
 
 def format_schema(schema_data: List[Dict]) -> str:
     """Format schema data.
     
+    Date-sharded tables are collapsed into wildcard entries, and columns use
+    the encoding selected by ``Config.SCHEMA_PROMPT_FORMAT``.
+    
     Args:
         schema_data: List of schema information dictionaries
         
@@ -66,39 +462,48 @@ def format_schema(schema_data: List[Dict]) -> str:
     """
     if not schema_data:
         return ""
-        
-    # Group by table
-    tables = {}
+    
+    tables: Dict[str, List[Dict]] = {}
     for row in schema_data:
-        table_name = row['table_name']
-        if table_name not in tables:
-            tables[table_name] = []
-        tables[table_name].append({
-            'column': row['column_name'],
-            'type': row['data_type'],
-            'nullable': row['is_nullable']
-        })
-    
-    # Format as string
-    context_lines = []
-    context_lines.append("Database Schema:")
-    context_lines.append("================")
-    
-    for table_name, columns in tables.items():
-        context_lines.append(f"\nTable: {table_name}")
-        context_lines.append("Columns:")
-        for col in columns:
-            nullable = "NULL" if col['nullable'] == 'YES' else "NOT NULL"
-            context_lines.append(f"  - {col['column']} ({col['type']}, {nullable})")
-    
-    return "\n".join(context_lines)
-
-
-def execute_query_with_context(sql_query: str) -> Dict[str, Any]:
+        tables.setdefault(row['table_name'], []).append(row)
+    compact = Config.SCHEMA_PROMPT_FORMAT == "compact"
+    entries = list(group_tables(tables, Config.SCHEMA_SHARD_MIN_TABLES).values())
+    return join_blocks(entries, [format_entry(entry, compact) for entry in entries], compact)
+
+
+def execute_query_with_context(
+    sql_query: str,
+    stream: bool = False,
+    on_progress: Optional[Callable[[JobProgress], None]] = None,
+) -> Dict[str, Any]:
     """Execute a BigQuery query.
     
+    The job is submitted without blocking and polled until it finishes; jobs
+    running past ``Config.QUERY_TIMEOUT_MS`` are cancelled, as is a job whose
+    wait is interrupted (see ``query_jobs.wait_for_job``).
+    
+    Jobs go through the process-wide "bigquery" scheduler: identical SQL
+    already running for another session is not submitted again, and each
+    caller reads the shared job's result through its own job handle. Only the
+    submission is retried on rate limits and server errors, under one
+    client-side job ID, so a job that exists is never started again.
+    
+    Results stay in Arrow format end to end. Large results are downloaded as
+    record batches through the BigQuery Storage Read API; results with at most
+    ``Config.STORAGE_API_MIN_ROWS`` rows use REST paging, where opening a read
+    session would cost more than it saves.
+    
+    Results of deterministic queries are kept in a local result cache keyed by
+    the normalized SQL and the last-modified time of every referenced table; a
+    hit is flagged with "cache_hit" and, while the table versions are cached
+    (``Config.RESULT_CACHE_VERSION_TTL``), skips BigQuery entirely.
+    
     Args:
         sql_query: The SQL query to execute
+        stream: If True, return a lazy iterator of record batches under "batches"
+            instead of downloading the whole result into "data"
+        on_progress: Called with a ``JobProgress`` after every status check, and
+            with state "QUEUED" or "COALESCED" while waiting for the scheduler
         
     Returns:
         Dictionary containing query results and execution metadata
@@ -107,26 +512,188 @@ def execute_query_with_context(sql_query: str) -> Dict[str, Any]:
         return {"error": "No SQL query provided"}
     
     try:
-        # Use direct BigQuery client for query execution
+        # Use the shared BigQuery client for query execution
         # This maintains the security configuration from ADK while actually executing the query
-        client = bigquery.Client(project=config.project_id)
+        client = get_bigquery_client()
         
-        # Add query metadata
-        job_config = bigquery.QueryJobConfig()
-        job_config.use_query_cache = True
-        job_config.use_legacy_sql = False
+        result_cache = get_result_cache()
+        cache_key = _result_cache_key(sql_query)
+        cached_table = result_cache.get(cache_key) if cache_key else None
+        tracing.annotate(result_cache_hit=cached_table is not None)
+        if cached_table is not None:
+            tracing.annotate(rows=cached_table.num_rows, bytes_processed=0)
+            result = {
+                "status": "success",
+                "row_count": cached_table.num_rows,
+                "bytes_processed": 0,
+                "cache_hit": True,
+                "data": cached_table,
+            }
+            if stream:
+                result["batches"] = iter(cached_table.to_batches(max_chunksize=Config.RESULT_PAGE_ROWS))
+            return result
         
-        query_job = client.query(sql_query, job_config=job_config)
-        
-        # Get query statistics
-        df = query_job.to_dataframe()
+        timeout_seconds = Config.QUERY_TIMEOUT_MS / 1000 if Config.QUERY_TIMEOUT_MS > 0 else None
+        scheduler = get_scheduler("bigquery")
+        on_wait = _scheduler_progress(on_progress)
+        submitted = []
+
+        def submit_and_wait() -> "bigquery.QueryJob":
+            # Only the insert is retried, under one job ID, so a retry never starts a second job
+            job_id = f"{_JOB_ID_PREFIX}{uuid.uuid4().hex}"
+            job = scheduler.call(lambda: _insert_query_job(client, sql_query, job_id), on_wait)
+            submitted.append(job)
+            tracing.annotate(job_id=getattr(job, "job_id", None))
+            wait_for_job(job, timeout_seconds, on_progress)
+            return job
+
+        query_job = scheduler.run(submit_and_wait, key=("query", sql_query), on_wait=on_wait, retry=False)
+        if not submitted:
+            # Another session ran this job; job objects are not thread-safe, so page through our own handle
+            query_job = client.get_job(query_job.job_id, project=query_job.project, location=query_job.location)
+            tracing.annotate(job_id=query_job.job_id, coalesced=True)
+        rows = query_job.result(page_size=Config.RESULT_PAGE_ROWS)
+        bqstorage_client = _bqstorage_client_for(rows.total_rows)
         
-        return {
+        result = {
             "status": "success",
-            "row_count": len(df),
+            "row_count": rows.total_rows or 0,
             "bytes_processed": query_job.total_bytes_processed,
-            "data": df.to_dict('records') if not df.empty else []
+            "cache_hit": False,
+            "destination": query_job.destination,
         }
+        tracing.annotate(rows=result["row_count"], bytes_processed=result["bytes_processed"] or 0)
+        if stream:
+            batches = rows.to_arrow_iterable(bqstorage_client=bqstorage_client)
+            if cache_key:
+                # Cached once the pager has pulled every row; a partly read result is not fetched again
+                batches = result_cache.caching_iterator(cache_key, batches, rows.total_rows)
+            result["batches"] = batches
+        else:
+            arrow_table = rows.to_arrow(bqstorage_client=bqstorage_client, create_bqstorage_client=False)
+            if cache_key:
+                result_cache.put(cache_key, arrow_table)
+            result["row_count"] = arrow_table.num_rows
+            result["data"] = arrow_table
+        return result
         
     except Exception as e:
-        return {"status": "error", "error": str(e)}
\ No newline at end of file
+        return {"status": "error", "error": str(e)}
+
+
+def dry_run_query(sql_query: str) -> Dict[str, Any]:
+    """Validate a query with a BigQuery dry run and estimate its cost.
+    
+    Dry runs are free: BigQuery parses the query, resolves tables and columns
+    and reports the bytes it would scan without executing anything. Identical
+    dry runs in flight across sessions share one request.
+    
+    Args:
+        sql_query: The SQL query to check
+        
+    Returns:
+        Dictionary with the estimated "bytes_processed", or the dry-run error
+    """
+    if not sql_query:
+        return {"status": "error", "error": "No SQL query provided"}
+    
+    try:
+        client = get_bigquery_client()
+        job_config = _query_job_config()
+        job_config.dry_run = True
+        job_config.use_query_cache = False
+        query_job = get_scheduler("bigquery").run(
+            lambda: client.query(sql_query, job_config=job_config), key=("dry_run", sql_query)
+        )
+        return {"status": "success", "bytes_processed": query_job.total_bytes_processed or 0}
+    except Exception as e:
+        return {"status": "error", "error": str(e)}
+
+
+def stream_query_results(destination) -> Iterator[pa.RecordBatch]:
+    """Re-read a finished query's full result from its destination table.
+    
+    Args:
+        destination: The ``TableReference`` of a completed query job
+        
+    Returns:
+        Iterator of Arrow record batches covering every row of the result
+    """
+    client = get_bigquery_client()
+    rows = client.list_rows(destination, page_size=Config.RESULT_PAGE_ROWS)
+    return rows.to_arrow_iterable(bqstorage_client=_bqstorage_client_for(rows.total_rows))
+
+
+def get_result_cache_stats() -> Dict[str, Any]:
+    """Return hit counters and occupancy for the local result cache."""
+    return get_result_cache().stats()
+
+
+def _result_cache_key(sql_query: str) -> Optional[str]:
+    """Key a query by its text and table versions, or None if it must not be cached.
+    
+    Versions come from each dataset's ``__TABLES__`` listing, cached for
+    ``Config.RESULT_CACHE_VERSION_TTL`` seconds, so a cache hit makes no
+    BigQuery request while the listing is fresh.
+    """
+    if not is_cacheable(sql_query):
+        return None
+    tables = referenced_tables(sql_query, config.project_id)
+    if not tables:
+        return None
+    try:
+        versions = []
+        for project_id, dataset_id, table_id in tables:
+            modified = _table_versions_cache.get((project_id, dataset_id)).get(table_id)
+            if modified is None:
+                # A view, external or wildcard table can change without a version of its own to key on
+                return None
+            versions.append((f"{project_id}.{dataset_id}.{table_id}", modified))
+    except Exception:
+        # No access to the dataset's metadata: play safe
+        return None
+    return make_result_key(sql_query, versions)
+
+
+def _insert_query_job(client, sql_query: str, job_id: str) -> "bigquery.QueryJob":
+    """Submit a query under a fixed job ID, picking up the job if an earlier attempt created it."""
+    from google.api_core.exceptions import Conflict
+
+    try:
+        return client.query(sql_query, job_config=_query_job_config(), job_id=job_id)
+    except Conflict:
+        # The insert reached BigQuery but its response was lost
+        return client.get_job(job_id)
+
+
+def _scheduler_progress(on_progress: Optional[Callable[[JobProgress], None]]):
+    """Adapt a job progress callback to the scheduler's ``on_wait(seconds, coalesced)``."""
+    if on_progress is None:
+        return None
+    return lambda waited, coalesced: on_progress(
+        JobProgress(job_id=None, state="COALESCED" if coalesced else "QUEUED", elapsed_seconds=waited)
+    )
+
+
+def _query_job_config() -> "bigquery.QueryJobConfig":
+    """Build the job configuration shared by every query this app runs."""
+    # Already loaded by the client that runs the job, so this import is free
+    from google.cloud import bigquery
+
+    job_config = bigquery.QueryJobConfig()
+    job_config.use_query_cache = True
+    job_config.use_legacy_sql = False
+    if Config.MAX_BYTES_BILLED > 0:
+        # BigQuery fails the job up front instead of billing past the budget
+        job_config.maximum_bytes_billed = Config.MAX_BYTES_BILLED
+    if Config.QUERY_TIMEOUT_MS > 0:
+        # BigQuery cancels the job itself even if this process never polls again
+        job_config.job_timeout_ms = Config.QUERY_TIMEOUT_MS
+    return job_config
+
+
+def _bqstorage_client_for(total_rows: Optional[int]):
+    """Use the Storage Read API only when the result is large enough to benefit."""
+    if (total_rows or 0) > Config.STORAGE_API_MIN_ROWS:
+        return get_bqstorage_client()
+    return None
@@ -0,0 +1,248 @@
+"""Per-session chat history with a memory budget for query results."""
+
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+import weakref
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from result_pager import ResultPager
+
+
+@dataclass
+class ResultEntry:
+    """A query result in the chat history.
+
+    ``preview`` (the first few rows) always stays in memory. The rest lives in
+    ``pager`` while the result is recent, then in a Parquet file at
+    ``spill_path`` once it has been spilled, and is gone once evicted.
+    ``exports`` maps a file format to the prepared download of the full result.
+    """
+    entry_id: str
+    preview: pa.Table
+    total_rows: Optional[int]
+    loaded_rows: int
+    bytes_processed: Optional[int] = None
+    cache_hit: bool = False
+    caveat: Optional[str] = None
+    # Where downloads can re-stream the complete result from
+    destination: object = None
+    pager: Optional[ResultPager] = None
+    spill_path: Optional[str] = None
+    spill_bytes: int = 0
+    evicted: bool = False
+    exports: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def in_memory(self) -> bool:
+        return self.pager is not None
+
+    @property
+    def downloadable(self) -> bool:
+        """Whether the full result can still be exported."""
+        return self.destination is not None or self.source_table is not None
+
+    @property
+    def source_table(self) -> Optional[pa.Table]:
+        """The complete result held by a live pager that came from the result cache."""
+        return self.pager.source_table if self.pager is not None else None
+
+    @property
+    def memory_bytes(self) -> int:
+        """Bytes held by the live pager, including a cached full table it references."""
+        if self.pager is None:
+            return 0
+        size = sum(batch.nbytes for batch in self.pager.batches)
+        if self.pager.source_table is not None:
+            size += self.pager.source_table.nbytes
+        return size
+
+
+Message = Tuple[str, Union[str, ResultEntry]]
+
+
+class ChatHistory:
+    """Chat messages whose query results are bounded in memory and on disk.
+
+    Results beyond ``memory_budget_bytes`` are spilled oldest first to
+    zstd-compressed Parquet files, read back through a memory map when shown.
+    Once spilled files exceed ``disk_budget_bytes`` the oldest results are
+    evicted, leaving only their preview. The most recent result is never
+    spilled, so its "Load more rows" and download controls keep working.
+    Spill files are deleted when the history is garbage collected (i.e. when
+    the Streamlit session ends) or at interpreter exit.
+
+    Prepared downloads are written to the same directory and deleted once a
+    newer result arrives or their result is evicted; they can be prepared
+    again on demand.
+    """
+
+    def __init__(
+        self,
+        memory_budget_bytes: int,
+        disk_budget_bytes: int,
+        preview_rows: int,
+        spill_dir: Optional[str] = None,
+    ):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.disk_budget_bytes = disk_budget_bytes
+        self.preview_rows = max(1, preview_rows)
+        base_dir = spill_dir or os.path.join(tempfile.gettempdir(), "bq_chat_history")
+        os.makedirs(base_dir, exist_ok=True)
+        self.spill_dir = tempfile.mkdtemp(prefix="session_", dir=base_dir)
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.spill_dir, True)
+
+        self.messages: List[Message] = []
+        self._lock = threading.Lock()
+
+    def __iter__(self) -> Iterator[Message]:
+        return iter(list(self.messages))
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def add_text(self, role: str, text: str):
+        """Append a plain markdown message."""
+        with self._lock:
+            self.messages.append((role, text))
+
+    def add_result(self, role: str, pager: ResultPager) -> ResultEntry:
+        """Append a query result, keeping its pager live until it is spilled."""
+        entry = ResultEntry(
+            entry_id=uuid.uuid4().hex,
+            preview=_head(pager.to_table(), self.preview_rows),
+            total_rows=pager.total_rows,
+            loaded_rows=pager.loaded_rows,
+            bytes_processed=pager.bytes_processed,
+            cache_hit=pager.cache_hit,
+            caveat=pager.caveat,
+            destination=pager.destination,
+            pager=pager,
+        )
+        with self._lock:
+            for _, content in self.messages:
+                if isinstance(content, ResultEntry):
+                    _delete_exports(content)
+            self.messages.append((role, entry))
+        self.enforce_budget()
+        return entry
+
+    def export_path(self, entry: ResultEntry, file_format: str) -> str:
+        """Return the file a download of ``entry`` in ``file_format`` is written to."""
+        return os.path.join(self.spill_dir, f"{entry.entry_id}_export.{file_format}")
+
+    def add_export(self, entry: ResultEntry, file_format: str, file_path: str):
+        """Record a prepared download of ``entry``, deleting it at once if the entry is gone."""
+        with self._lock:
+            entry.exports[file_format] = file_path
+            if entry.evicted:
+                _delete_exports(entry)
+
+    def latest_result(self) -> Optional[ResultEntry]:
+        """Return the most recent result entry, if any."""
+        return self._latest_entry()
+
+    def load(self, entry: ResultEntry) -> Optional[pa.Table]:
+        """Return an entry's loaded rows, from memory or its memory-mapped spill file."""
+        if entry.pager is not None:
+            return entry.pager.to_table()
+        if entry.spill_path is not None:
+            return pq.read_table(entry.spill_path, memory_map=True)
+        return None
+
+    def enforce_budget(self):
+        """Spill and evict old results until memory and disk use fit their budgets.
+
+        Called after each new result and on every rerun, since "Load more rows"
+        grows a live pager after it was added.
+        """
+        with self._lock:
+            entries = [content for _, content in self.messages if isinstance(content, ResultEntry)]
+            latest = entries[-1] if entries else None
+            memory_bytes = sum(entry.memory_bytes for entry in entries)
+            for entry in entries:
+                if memory_bytes <= self.memory_budget_bytes:
+                    break
+                if entry is latest or not entry.in_memory:
+                    continue
+                memory_bytes -= entry.memory_bytes
+                self._spill(entry)
+
+            disk_bytes = sum(entry.spill_bytes for entry in entries)
+            for entry in entries:
+                if disk_bytes <= self.disk_budget_bytes:
+                    break
+                if entry.spill_path is not None:
+                    disk_bytes -= entry.spill_bytes
+                    self._evict(entry)
+
+    def stats(self) -> dict:
+        """Return message counts and memory/disk occupancy."""
+        with self._lock:
+            entries = [content for _, content in self.messages if isinstance(content, ResultEntry)]
+            return {
+                "messages": len(self.messages),
+                "results": len(entries),
+                "in_memory": sum(1 for entry in entries if entry.in_memory),
+                "spilled": sum(1 for entry in entries if entry.spill_path is not None),
+                "evicted": sum(1 for entry in entries if entry.evicted),
+                "memory_bytes": sum(entry.memory_bytes for entry in entries),
+                "disk_bytes": sum(entry.spill_bytes for entry in entries),
+            }
+
+    def close(self):
+        """Delete every spill file now instead of at garbage collection."""
+        self._finalizer()
+
+    def _spill(self, entry: ResultEntry):
+        # Caller must hold self._lock.
+        pager = entry.pager
+        # Only the loaded rows: a pager over a cached full table still shows at most max_rows of it
+        table = pager.to_table().slice(0, pager.max_rows)
+        entry.pager = None
+        if self.disk_budget_bytes <= 0:
+            entry.evicted = True
+            _delete_exports(entry)
+            return
+        path = os.path.join(self.spill_dir, f"{entry.entry_id}.parquet")
+        pq.write_table(table, path, compression="zstd")
+        entry.spill_path = path
+        entry.spill_bytes = os.path.getsize(path)
+        entry.loaded_rows = table.num_rows
+
+    def _evict(self, entry: ResultEntry):
+        # Caller must hold self._lock.
+        try:
+            os.remove(entry.spill_path)
+        except OSError:
+            pass
+        entry.spill_path = None
+        entry.spill_bytes = 0
+        entry.evicted = True
+        _delete_exports(entry)
+
+    def _latest_entry(self) -> Optional[ResultEntry]:
+        for _, content in reversed(self.messages):
+            if isinstance(content, ResultEntry):
+                return content
+        return None
+
+
+def _delete_exports(entry: ResultEntry):
+    for file_path in entry.exports.values():
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+    entry.exports.clear()
+
+
+def _head(table: pa.Table, num_rows: int) -> pa.Table:
+    """Copy the first rows so the preview does not pin the full result's buffers."""
+    return table.take(pa.array(range(min(num_rows, table.num_rows)), type=pa.int64()))
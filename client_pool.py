@@ -0,0 +1,95 @@
+"""Shared, thread-safe BigQuery client provider.
+
+The Google Cloud SDKs take most of a second to import, so they are loaded when
+the first client is created rather than when this module is imported.
+"""
+
+import threading
+from typing import TYPE_CHECKING, Dict, Optional
+
+from adk_config import config
+from config import Config
+
+if TYPE_CHECKING:
+    from google.cloud import bigquery
+    from google.cloud import bigquery_storage
+
+_SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+
+_clients: Dict[str, "bigquery.Client"] = {}
+_credentials = None
+_bqstorage_client: Optional["bigquery_storage.BigQueryReadClient"] = None
+_lock = threading.Lock()
+
+
+def get_bigquery_client(project_id: Optional[str] = None) -> "bigquery.Client":
+    """Return the process-wide BigQuery client for a project.
+
+    The client is created once per project and reused by every module and
+    Streamlit session, so credentials are resolved once and HTTPS connections
+    stay warm in a pool sized by ``Config.BIGQUERY_POOL_SIZE``.
+
+    Args:
+        project_id: The project to bill queries to; defaults to the configured project
+
+    Returns:
+        A shared ``bigquery.Client`` instance
+    """
+    if not project_id:
+        config.validate()
+        project_id = config.project_id
+    client = _clients.get(project_id)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(project_id)
+        if client is None:
+            client = _create_client(project_id)
+            _clients[project_id] = client
+        return client
+
+
+def get_bqstorage_client() -> "bigquery_storage.BigQueryReadClient":
+    """Return the process-wide BigQuery Storage Read API client.
+
+    The gRPC channel is opened once and shared, so large result downloads do not
+    pay the channel setup cost on every query.
+    """
+    global _bqstorage_client
+    if _bqstorage_client is not None:
+        return _bqstorage_client
+
+    with _lock:
+        if _bqstorage_client is None:
+            from google.cloud import bigquery_storage
+
+            _bqstorage_client = bigquery_storage.BigQueryReadClient(credentials=_get_credentials())
+        return _bqstorage_client
+
+
+def _get_credentials():
+    """Resolve application default credentials once per process."""
+    # Callers hold _lock.
+    global _credentials
+    if _credentials is None:
+        import google.auth
+
+        _credentials, _ = google.auth.default(scopes=_SCOPES)
+    return _credentials
+
+
+def _create_client(project_id: str) -> "bigquery.Client":
+    """Build a client whose HTTP session keeps a connection pool per host."""
+    import requests
+    from google.auth.transport.requests import AuthorizedSession
+    from google.cloud import bigquery
+
+    credentials = _get_credentials()
+    session = AuthorizedSession(credentials)
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=Config.BIGQUERY_POOL_SIZE,
+        pool_maxsize=Config.BIGQUERY_POOL_SIZE,
+    )
+    session.mount("https://", adapter)
+    return bigquery.Client(project=project_id, credentials=credentials, _http=session)
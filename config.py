@@ -8,11 +8,15 @@ class Config:
     # Google Cloud Project Configuration
     PROJECT_ID = os.getenv("PROJECT_ID")
     DATASET_ID = os.getenv("DATASET_ID")
+    # Comma-separated "dataset" or "project.dataset" entries; unset uses DATASET_ID only
+    DATASETS = [entry.strip() for entry in os.getenv("DATASETS", "").split(",") if entry.strip()]
     
     # AI Model Configuration
     LLM_PROVIDER = os.getenv("LLM_PROVIDER", "google")  # Default to Google
     MODEL_NAME = os.getenv("MODEL_NAME")
     TEMPERATURE = float(os.getenv("TEMPERATURE", 0))
+    SPECULATIVE_CANDIDATES = int(os.getenv("SPECULATIVE_CANDIDATES", 1))  # >1 races parallel generations
+    SPECULATIVE_TEMPERATURE_STEP = float(os.getenv("SPECULATIVE_TEMPERATURE_STEP", 0.3))  # Added per extra candidate
     
     # LLM Base URLs for custom endpoints
     GOOGLE_BASE_URL = os.getenv("GOOGLE_BASE_URL")
@@ -22,5 +26,70 @@ class Config:
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     
+    # BigQuery Connection Configuration
+    BIGQUERY_POOL_SIZE = int(os.getenv("BIGQUERY_POOL_SIZE", 16))  # Max pooled HTTPS connections per host
+    STORAGE_API_MIN_ROWS = int(os.getenv("STORAGE_API_MIN_ROWS", 10000))  # Smaller results use REST paging
+    
+    # Query Cost Configuration
+    MAX_BYTES_BILLED = int(os.getenv("MAX_BYTES_BILLED", 100 * 1024**3))  # Hard per-query limit; 0 disables
+    DRY_RUN_CONFIRM_BYTES = int(os.getenv("DRY_RUN_CONFIRM_BYTES", 10 * 1024**3))  # Ask before running larger scans
+    
+    # Query Execution Configuration
+    QUERY_TIMEOUT_MS = int(os.getenv("QUERY_TIMEOUT_MS", 5 * 60 * 1000))  # Longer jobs are cancelled; 0 disables
+    QUERY_POLL_INTERVAL = float(os.getenv("QUERY_POLL_INTERVAL", 1.0))  # Max seconds between job status checks
+    PREVIEW_MODE = os.getenv("PREVIEW_MODE", "auto")  # "auto" previews large scans first; "off" always runs exactly
+    PREVIEW_MIN_BYTES = int(os.getenv("PREVIEW_MIN_BYTES", 1024**3))  # Smaller scans run exactly straight away
+    PREVIEW_SAMPLE_PERCENT = float(os.getenv("PREVIEW_SAMPLE_PERCENT", 1.0))  # TABLESAMPLE SYSTEM share of the table
+    PREVIEW_ROW_LIMIT = int(os.getenv("PREVIEW_ROW_LIMIT", 1000))  # Rows returned by a preview
+    
+    # Request Scheduling Configuration (shared by every session in the process)
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))  # LLM calls in flight at once; 0 disables
+    LLM_RATE_LIMIT = float(os.getenv("LLM_RATE_LIMIT", 5.0))  # LLM calls started per second; 0 disables
+    LLM_RATE_BURST = float(os.getenv("LLM_RATE_BURST", 10))  # Calls allowed back to back before the rate applies
+    BIGQUERY_MAX_CONCURRENCY = int(os.getenv("BIGQUERY_MAX_CONCURRENCY", 50))  # Jobs running at once; 0 disables
+    BIGQUERY_RATE_LIMIT = float(os.getenv("BIGQUERY_RATE_LIMIT", 10.0))  # Jobs started per second; 0 disables
+    BIGQUERY_RATE_BURST = float(os.getenv("BIGQUERY_RATE_BURST", 20))
+    SCHEDULER_MAX_RETRIES = int(os.getenv("SCHEDULER_MAX_RETRIES", 4))  # Retries on 429 and 5xx errors
+    SCHEDULER_BACKOFF_BASE = float(os.getenv("SCHEDULER_BACKOFF_BASE", 0.5))  # Seconds, doubled per retry, jittered
+    SCHEDULER_BACKOFF_MAX = float(os.getenv("SCHEDULER_BACKOFF_MAX", 20.0))
+    
+    # Result Streaming Configuration
+    RESULT_PAGE_ROWS = int(os.getenv("RESULT_PAGE_ROWS", 1000))  # Rows rendered per page
+    MAX_RESULT_ROWS = int(os.getenv("MAX_RESULT_ROWS", 100000))  # Max rows materialized in memory
+    
     # Cache Configuration
-    SCHEMA_CACHE_TTL = int(os.getenv("SCHEMA_CACHE_TTL", 3600))  # 1 hour in seconds
\ No newline at end of file
+    SCHEMA_CACHE_TTL = int(os.getenv("SCHEMA_CACHE_TTL", 3600))  # 1 hour in seconds
+    SCHEMA_CACHE_MAX_AGE = int(os.getenv("SCHEMA_CACHE_MAX_AGE", 86400))  # Oldest schema served while refreshing
+    SCHEMA_CACHE_MAX_ENTRIES = int(os.getenv("SCHEMA_CACHE_MAX_ENTRIES", 32))  # (project, dataset) pairs
+    SCHEMA_FETCH_CONCURRENCY = int(os.getenv("SCHEMA_FETCH_CONCURRENCY", 8))  # Datasets loaded in parallel
+    SCHEMA_REFRESH_MODE = os.getenv("SCHEMA_REFRESH_MODE", "incremental")  # "incremental" or "full"
+    SCHEMA_SNAPSHOT_DIR = os.getenv("SCHEMA_SNAPSHOT_DIR")  # Defaults to a directory under the system temp dir
+    
+    # Prompt Schema Pruning Configuration
+    SCHEMA_PROMPT_TOKEN_BUDGET = int(os.getenv("SCHEMA_PROMPT_TOKEN_BUDGET", 8000))  # Larger schemas are pruned
+    SCHEMA_PRUNING_TOP_K = int(os.getenv("SCHEMA_PRUNING_TOP_K", 15))  # Max tables kept per question
+    SCHEMA_PROMPT_FORMAT = os.getenv("SCHEMA_PROMPT_FORMAT", "compact")  # "compact" or "verbose" column encoding
+    SCHEMA_SHARD_MIN_TABLES = int(os.getenv("SCHEMA_SHARD_MIN_TABLES", 2))  # Date shards collapsed into name_*; 0 disables
+    
+    # Generated SQL Cache Configuration
+    SQL_CACHE_TTL = int(os.getenv("SQL_CACHE_TTL", 86400))  # 1 day in seconds
+    SQL_CACHE_MAX_ENTRIES = int(os.getenv("SQL_CACHE_MAX_ENTRIES", 1000))
+    SQL_CACHE_PATH = os.getenv("SQL_CACHE_PATH")  # SQLite file; unset keeps the cache in memory only
+    
+    # Query Result Cache Configuration
+    RESULT_CACHE_MEMORY_BYTES = int(os.getenv("RESULT_CACHE_MEMORY_BYTES", 256 * 1024**2))  # In-memory Arrow budget
+    RESULT_CACHE_DISK_BYTES = int(os.getenv("RESULT_CACHE_DISK_BYTES", 2 * 1024**3))  # Spill budget; 0 disables spilling
+    RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR")  # Defaults to a directory under the system temp dir
+    RESULT_CACHE_VERSION_TTL = int(os.getenv("RESULT_CACHE_VERSION_TTL", 30))  # Seconds table versions are reused
+    
+    # Chat History Configuration
+    CHAT_HISTORY_MEMORY_BYTES = int(os.getenv("CHAT_HISTORY_MEMORY_BYTES", 128 * 1024**2))  # Per-session result budget
+    CHAT_HISTORY_DISK_BYTES = int(os.getenv("CHAT_HISTORY_DISK_BYTES", 1024**3))  # Per-session spill budget; 0 disables
+    CHAT_HISTORY_PREVIEW_ROWS = int(os.getenv("CHAT_HISTORY_PREVIEW_ROWS", 20))  # Rows always kept inline per result
+    CHAT_HISTORY_DIR = os.getenv("CHAT_HISTORY_DIR")  # Defaults to a directory under the system temp dir
+    
+    # Tracing and Metrics Configuration
+    TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH")  # JSONL file receiving one line per question; unset disables
+    METRICS_PORT = int(os.getenv("METRICS_PORT", 0))  # Port serving Prometheus /metrics; 0 disables
+    METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")  # Interface /metrics binds to; "0.0.0.0" exposes it
+    TRACE_SIDEBAR = os.getenv("TRACE_SIDEBAR", "false").lower() == "true"  # Show a latency waterfall per question
@@ -0,0 +1,33 @@
+"""Shared test fixtures; every test runs against the local fakes in ``benchmarks.fakes``."""
+
+import os
+
+# The app's modules read their configuration at import time
+os.environ.setdefault("PROJECT_ID", "test-project")
+os.environ.setdefault("DATASET_ID", "test_dataset")
+
+import pytest  # noqa: E402
+
+from adk_config import config  # noqa: E402
+from benchmarks.fakes import (  # noqa: E402
+    FakeBigQueryClient,
+    fake_backends,
+    synthetic_arrow_table,
+    synthetic_schema_rows,
+)
+
+
+@pytest.fixture
+def bigquery():
+    """A fake BigQuery client of 5 base tables whose queries return 3,000 rows."""
+    client = FakeBigQueryClient(synthetic_schema_rows(5, 4), synthetic_arrow_table(3000, 3), table_type="TABLE")
+    with fake_backends(client, config.project_id):
+        yield client
+
+
+@pytest.fixture
+def database_client(bigquery):
+    """A ``BigQueryClient`` for the configured dataset, backed by the ``bigquery`` fake."""
+    from mcp_client import BigQueryClient
+
+    return BigQueryClient(config.project_id, os.environ["DATASET_ID"])
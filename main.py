@@ -1,48 +1,398 @@
 import streamlit as st
-import pandas as pd
-from typing import Optional
-from mcp_client import BigQueryClient
-from sql_generation_agent import SQLGenerationAgent
+import pyarrow as pa
+from typing import Optional, Union
+from chat_history import ChatHistory, ResultEntry
+from mcp_client import BigQueryClient, QueryExecutionError, format_bytes
+from pipeline import PipelineError, PreparedQuery, QuestionPipeline
+from query_jobs import JobProgress
+from query_preview import PreviewQuery
+from result_pager import ResultPager
+from sql_generation_agent import SQLGenerationAgent, SQLGenerationError
 from config import Config
+from tracing import Trace, start_metrics_server
+
+# Number of recent questions whose traces the latency sidebar can show
+MAX_SIDEBAR_TRACES = 20
 
 
 def initialize_chat_history():
     """Initialize chat history in session state."""
     if 'chat_history' not in st.session_state:
-        st.session_state.chat_history = []
+        st.session_state.chat_history = ChatHistory(
+            memory_budget_bytes=Config.CHAT_HISTORY_MEMORY_BYTES,
+            disk_budget_bytes=Config.CHAT_HISTORY_DISK_BYTES,
+            preview_rows=Config.CHAT_HISTORY_PREVIEW_ROWS,
+            spill_dir=Config.CHAT_HISTORY_DIR,
+        )
 
 
-def display_chat_history():
-    """Display the chat history."""
-    for role, content in st.session_state.chat_history:
+def display_chat_history(database_client: BigQueryClient):
+    """Display the chat history.
+    
+    Only the most recent result is rendered in full; older ones show a preview
+    and load their rows only when expanded.
+    """
+    history: ChatHistory = st.session_state.chat_history
+    # "Load more rows" may have grown a pager since the last rerun
+    history.enforce_budget()
+    latest = history.latest_result()
+    for role, content in history:
         with st.chat_message(role):
-            if isinstance(content, pd.DataFrame):
-                st.dataframe(content)
+            if isinstance(content, ResultEntry):
+                render_result_entry(content, database_client, expanded=content is latest)
             else:
                 st.markdown(content)
 
 
-def add_to_chat_history(role: str, content):
+def add_to_chat_history(role: str, content: Union[str, ResultPager]) -> Optional[ResultEntry]:
     """Add message to chat history."""
-    st.session_state.chat_history.append((role, content))
+    if isinstance(content, ResultPager):
+        return st.session_state.chat_history.add_result(role, content)
+    st.session_state.chat_history.add_text(role, content)
+    return None
+
+
+def prepare_download(database_client: BigQueryClient, entry: ResultEntry, file_format: str):
+    """Stream the full result to a file in the session's history directory and remember it for download."""
+    history: ChatHistory = st.session_state.chat_history
+    file_path = database_client.export_query_results(entry, file_format, history.export_path(entry, file_format))
+    history.add_export(entry, file_format, file_path)
+
+
+def render_result_entry(entry: ResultEntry, database_client: BigQueryClient, expanded: bool = False):
+    """Render a result from the history: in full if expanded, otherwise as a preview."""
+    key = f"result_{entry.entry_id}"
+    if expanded and entry.pager is not None:
+        render_result_pager(entry, database_client)
+        return
+
+    if entry.caveat:
+        st.caption(entry.caveat)
+    st.dataframe(entry.preview)
+    total = f"{entry.total_rows:,}" if entry.total_rows is not None else "?"
+    st.caption(f"Preview of {entry.preview.num_rows:,} of {total} rows.")
+    if entry.evicted:
+        st.caption("The rest of this result was dropped from the session to save memory. Ask again to re-run it.")
+        return
+    if entry.loaded_rows <= entry.preview.num_rows:
+        return
+
+    # Toggled off, an older result costs only its preview on each rerun
+    if not st.toggle(f"Show all {entry.loaded_rows:,} loaded rows", key=f"{key}_expand"):
+        return
+    if entry.pager is not None:
+        render_result_pager(entry, database_client)
+        return
+    st.dataframe(st.session_state.chat_history.load(entry))
+    if entry.downloadable:
+        render_download_controls(entry, database_client)
+
+
+def render_result_pager(entry: ResultEntry, database_client: BigQueryClient):
+    """Render the loaded pages of a live result with paging and download controls."""
+    pager = entry.pager
+    key = f"result_{entry.entry_id}"
+    if pager.caveat:
+        st.warning(pager.caveat)
+    st.dataframe(pager.to_table())
+
+    total = f"{pager.total_rows:,}" if pager.total_rows is not None else "?"
+    st.caption(f"Showing {pager.loaded_rows:,} of {total} rows.")
+    if pager.has_more:
+        st.button("Load more rows", key=f"{key}_more", on_click=pager.load_next_page)
+    elif pager.truncated:
+        st.caption(f"Display is limited to {pager.max_rows:,} rows. Download the file for the full result.")
+
+    if pager.downloadable:
+        render_download_controls(entry, database_client)
+
+
+def render_download_controls(entry: ResultEntry, database_client: BigQueryClient):
+    """Render Parquet and CSV buttons that prepare, then download, the full result.
+
+    The export is streamed to disk, but ``st.download_button`` reads the
+    prepared file into Streamlit's in-memory media store while it is shown.
+    """
+    key = f"result_{entry.entry_id}"
+    columns = st.columns(2)
+    for column, file_format in zip(columns, ("parquet", "csv")):
+        with column:
+            file_path = entry.exports.get(file_format)
+            if file_path:
+                with open(file_path, "rb") as handle:
+                    st.download_button(
+                        f"Download {file_format.upper()}",
+                        data=handle,
+                        file_name=f"query_result.{file_format}",
+                        key=f"{key}_{file_format}_download",
+                    )
+            else:
+                st.button(
+                    f"Prepare {file_format.upper()} download",
+                    key=f"{key}_{file_format}_prepare",
+                    on_click=prepare_download,
+                    args=(database_client, entry, file_format),
+                )
 
 
-def handle_query_result(query_result_df: Optional[pd.DataFrame]):
+def handle_query_result(query_result: Optional[ResultPager], database_client: BigQueryClient):
     """Handle and display query results."""
     with st.chat_message("assistant"):
-        if query_result_df is not None:
-            if not query_result_df.empty:
+        if query_result is not None:
+            if query_result.loaded_rows > 0:
                 st.success("Query successful! Here are the results:")
-                st.dataframe(query_result_df)
-                add_to_chat_history("assistant", query_result_df)
+                entry = add_to_chat_history("assistant", query_result)
+                render_result_pager(entry, database_client)
             else:
                 message = "Query executed successfully, but returned no rows."
+                if query_result.caveat:
+                    message += f" {query_result.caveat}"
                 st.warning(message)
                 add_to_chat_history("assistant", message)
         else:
             add_to_chat_history("assistant", "That query didn't work. Try another question.")
 
 
+def run_query(pipeline: QuestionPipeline, prepared: PreparedQuery, preview: Optional[PreviewQuery] = None):
+    """Execute a validated query, or its preview, and display its results."""
+    database_client = pipeline.database_client
+    if preview is not None:
+        st.info(f"Previewing Query: ```sql\n{preview.sql}\n```")
+        # Offered even if the preview fails, since the exact query may still work
+        st.session_state.full_query_offer = {"prepared": prepared}
+    else:
+        st.info(f"Executing Query: ```sql\n{prepared.sql}\n```")
+    progress = st.empty()
+    try:
+        # Progress updates also let Streamlit interrupt the run (and cancel the job) on a new question
+        pager = pipeline.execute(
+            prepared,
+            on_progress=lambda job: render_job_progress(progress, job, prepared.estimated_bytes),
+            preview=preview is not None,
+        )
+    except QueryExecutionError as e:
+        st.error(
+            f"BigQuery Execution Failed. The query was invalid or timed out. "
+            f"Please try to rephrase your question. Error: {e}"
+        )
+        handle_query_result(None, database_client)
+        render_full_query_offer()
+        return
+    finally:
+        progress.empty()
+        record_trace(prepared.trace)
+
+    st.write(f"Query executed successfully. Returned {pager.total_rows or 0} rows.")
+    if pager.cache_hit:
+        st.write("Served from the local result cache; no query job was run.")
+    else:
+        st.write(f"Processed {pager.bytes_processed or 0} bytes.")
+    handle_query_result(pager, database_client)
+    render_full_query_offer()
+
+
+def render_job_progress(placeholder, job: JobProgress, estimated_bytes: int):
+    """Show a running query's elapsed time and scan progress in place."""
+    if job.state == "QUEUED":
+        placeholder.info(f"Waiting for a free BigQuery slot... {job.elapsed_seconds:.0f}s queued")
+        return
+    if job.state == "COALESCED":
+        placeholder.info(
+            f"The same query is already running for another user; sharing its result... "
+            f"{job.elapsed_seconds:.0f}s elapsed"
+        )
+        return
+    parts = [f"Running query against BigQuery... {job.elapsed_seconds:.0f}s elapsed"]
+    if job.bytes_processed is not None:
+        parts.append(f"{format_bytes(job.bytes_processed)} scanned")
+    elif estimated_bytes:
+        parts.append(f"about {format_bytes(estimated_bytes)} to scan")
+    if job.total_units:
+        parts.append(f"{job.completed_units or 0:,} of {job.total_units:,} work units done")
+    placeholder.info(", ".join(parts))
+
+
+def render_pipeline_event(event: str, preview=None, **details):
+    """Show pipeline progress in the chat as the question is turned into SQL."""
+    if event == "generated":
+        if preview is not None:
+            preview.empty()
+        if details["attempt"] == 0:
+            st.write(f"Generated SQL: {details['sql']}")
+        else:
+            st.write(f"Regenerated SQL (attempt {details['attempt']}): {details['sql']}")
+    elif event == "validation_failed":
+        st.warning(f"Validation failed: {details['error']}")
+    elif event == "regenerating":
+        st.info("Asking AI agent to regenerate SQL to fix the error...")
+    elif event == "validated" and details["attempt"] > 0:
+        st.success("Regenerated SQL passed validation!")
+
+
+def record_trace(trace: Optional[Trace]):
+    """Keep the most recent question traces for the latency sidebar."""
+    if trace is None:
+        return
+    traces = st.session_state.setdefault("traces", [])
+    if trace not in traces:
+        traces.append(trace)
+        del traces[:-MAX_SIDEBAR_TRACES]
+
+
+def render_trace_sidebar(panel):
+    """Draw a latency waterfall of the selected question's spans in the sidebar."""
+    traces = st.session_state.get("traces", [])
+    with panel.container():
+        st.subheader("Latency")
+        if not traces:
+            st.caption("Ask a question to see where its time was spent.")
+            return
+        selected = st.selectbox(
+            "Question",
+            range(len(traces) - 1, -1, -1),
+            format_func=lambda i: traces[i].question[:60],
+            key=f"trace_select_{traces[-1].trace_id}",
+        )
+        trace = traces[selected]
+        st.caption(f"{trace.status} in {trace.duration * 1000:,.0f} ms")
+        rows = [
+            {
+                "span": f"{s.span_id:02d} {'  ' * s.depth}{s.name}",
+                "stage": s.name,
+                "start_ms": round(s.start * 1000, 1),
+                "end_ms": round((s.start + s.duration) * 1000, 1),
+                "duration_ms": round(s.duration * 1000, 1),
+                "details": ", ".join(f"{key}={value}" for key, value in s.attributes.items()),
+            }
+            for s in trace.spans
+        ]
+        st.vega_lite_chart(
+            pa.Table.from_pylist(rows),
+            {
+                "mark": {"type": "bar"},
+                "encoding": {
+                    "y": {"field": "span", "type": "nominal", "sort": None, "title": None},
+                    "x": {"field": "start_ms", "type": "quantitative", "title": "ms"},
+                    "x2": {"field": "end_ms"},
+                    "color": {"field": "stage", "type": "nominal", "legend": None},
+                    "tooltip": [
+                        {"field": "stage"},
+                        {"field": "duration_ms", "title": "ms"},
+                        {"field": "details"},
+                    ],
+                },
+            },
+            use_container_width=True,
+        )
+
+
+def confirm_pending_query():
+    """Mark the pending expensive query as approved by the user."""
+    pending = st.session_state.pop("pending_query", None)
+    if pending:
+        st.session_state.confirmed_query = pending["prepared"]
+
+
+def discard_pending_query(status: str) -> bool:
+    """Drop the pending expensive query, closing its trace with ``status``."""
+    pending = st.session_state.pop("pending_query", None)
+    if not pending:
+        return False
+    if pending["prepared"].trace is not None:
+        pending["prepared"].trace.finish(status=status)
+    return True
+
+
+def cancel_pending_query():
+    """Discard the pending expensive query."""
+    if discard_pending_query("cancelled"):
+        add_to_chat_history("assistant", "Query cancelled.")
+
+
+def render_pending_query():
+    """Ask the user to confirm a query whose dry run exceeded the confirmation threshold."""
+    pending = st.session_state.get("pending_query")
+    if not pending:
+        return
+    prepared = pending["prepared"]
+    with st.chat_message("assistant"):
+        st.warning(
+            f"This query is estimated to scan {format_bytes(prepared.estimated_bytes)}, above the "
+            f"{format_bytes(Config.DRY_RUN_CONFIRM_BYTES)} confirmation threshold."
+        )
+        st.code(prepared.sql, language="sql")
+        run_column, cancel_column = st.columns(2)
+        with run_column:
+            st.button("Run anyway", key="pending_run", on_click=confirm_pending_query)
+        with cancel_column:
+            st.button("Cancel", key="pending_cancel", on_click=cancel_pending_query)
+
+
+def run_full_query():
+    """Queue the exact version of the previewed query."""
+    offer = st.session_state.pop("full_query_offer", None)
+    if offer:
+        st.session_state.confirmed_query = offer["prepared"]
+
+
+def render_full_query_offer():
+    """Offer to run the exact query after its preview."""
+    offer = st.session_state.get("full_query_offer")
+    if not offer:
+        return
+    prepared = offer["prepared"]
+    with st.chat_message("assistant"):
+        st.button(
+            f"Run full query (scans about {format_bytes(prepared.estimated_bytes)})",
+            key="full_query_run",
+            on_click=run_full_query,
+        )
+
+
+def preview_plan(database_client: BigQueryClient, prepared: PreparedQuery) -> Optional[PreviewQuery]:
+    """Return the preview to run before a large scan, if preview mode is on and the query has one."""
+    if Config.PREVIEW_MODE != "auto" or prepared.estimated_bytes < Config.PREVIEW_MIN_BYTES:
+        return None
+    return database_client.preview_query(prepared.sql)
+
+
+def answer_question(pipeline: QuestionPipeline, user_question: str):
+    """Turn a new question into validated SQL and run it, unless it needs confirmation."""
+    # Add user question to history and display
+    add_to_chat_history("user", user_question)
+    with st.chat_message("user"):
+        st.markdown(user_question)
+
+    # Generate, validate and repair the SQL, streaming the draft while it is written
+    trace = Trace(user_question)
+    with st.spinner("Generating SQL query..."):
+        preview = st.empty()
+        pipeline.on_event = lambda event, **details: render_pipeline_event(event, preview, **details)
+        pipeline.on_text = lambda text: preview.code(text, language="json")
+        try:
+            prepared = pipeline.prepare(user_question, trace=trace)
+        except SQLGenerationError as e:
+            st.error(f"AI Agent failed to generate a valid SQL query. Error: {e}")
+            return
+        except PipelineError as e:
+            st.error(str(e))
+            return
+        finally:
+            preview.empty()
+            record_trace(trace)
+
+    st.write(f"Estimated scan: {format_bytes(prepared.estimated_bytes)}.")
+    preview = preview_plan(pipeline.database_client, prepared)
+    # A sampled preview scans only a fraction of the estimate, so it needs no confirmation
+    if prepared.estimated_bytes > Config.DRY_RUN_CONFIRM_BYTES and preview is None:
+        st.session_state.pending_query = {"prepared": prepared}
+        render_pending_query()
+        return
+
+    # Execute the validated SQL, or a quick preview of it first
+    run_query(pipeline, prepared, preview)
+
+
 def main():
     # Page configuration
     st.title("Chat with your BQ Database")
@@ -50,19 +400,27 @@ def main():
     st.divider()
 
     # Configuration validation
-    if not Config.PROJECT_ID or not Config.DATASET_ID:
-        st.error("PROJECT_ID and DATASET_ID must be set in the .env file.")
+    if not Config.PROJECT_ID or not (Config.DATASET_ID or Config.DATASETS):
+        st.error("PROJECT_ID and DATASET_ID (or DATASETS) must be set in the .env file.")
         st.stop()
 
-    # Configuration
-    PROJECT_ID = Config.PROJECT_ID
-    DATASET_ID = Config.DATASET_ID
+    # Prometheus metrics endpoint, started once per process
+    try:
+        start_metrics_server(Config.METRICS_PORT, Config.METRICS_HOST)
+    except OSError as e:
+        st.warning(f"Could not serve metrics on {Config.METRICS_HOST}:{Config.METRICS_PORT}: {e}")
 
     # Initialize components
-    database_client = BigQueryClient(PROJECT_ID, DATASET_ID)
-    sql_agent = SQLGenerationAgent(database_client.schema_prefix)
+    try:
+        database_client = BigQueryClient.from_config()
+        sql_agent = SQLGenerationAgent(database_client.schema_prefixes)
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+    pipeline = QuestionPipeline(database_client, sql_agent)
 
     # Fetch schema
+    st.write("Fetching database schema...")
     schema_text = database_client.get_schema()
     if not schema_text:
         st.warning("Cannot proceed without a valid database schema.")
@@ -70,68 +428,32 @@ def main():
 
     # Initialize chat interface
     initialize_chat_history()
+    trace_panel = st.sidebar.empty() if Config.TRACE_SIDEBAR else None
     user_question = st.chat_input("Ask a question about your data...")
 
     # Display chat history
-    display_chat_history()
+    display_chat_history(database_client)
 
-    # Handle user input
+    # A new question supersedes any query still waiting for confirmation or a full run
     if user_question:
-        # Add user question to history and display
-        add_to_chat_history("user", user_question)
-        with st.chat_message("user"):
-            st.markdown(user_question)
-
-        # Generate SQL
-        generated_sql = sql_agent.generate_sql_query(user_question, schema_text)
-        if generated_sql:
-            st.write(f"Generated SQL: {generated_sql}")
-            
-            # Validate table names and regenerate if needed
-            is_valid, error_message = database_client.validate_table_name(generated_sql)
-            regeneration_attempts = 0
-            max_regenerations = 2
-            
-            while not is_valid and regeneration_attempts < max_regenerations:
-                st.warning(f"Table validation failed: {error_message}")
-                
-                # Extract available tables from schema
-                available_tables = database_client.extract_tables_from_schema(schema_text)
-                if available_tables:
-                    table_info = f"Available tables in the schema: {', '.join(available_tables)}"
-                else:
-                    # Fallback to getting tables directly
-                    available_tables = database_client.get_table_list()
-                    table_info = f"Available tables in the dataset: {', '.join(available_tables)}"
-                
-                st.info("Asking AI agent to regenerate SQL with correct table names...")
-                
-                # Create a more informative prompt for regeneration
-                corrected_prompt = f"{user_question}\n\nPrevious attempt failed with error: {error_message}\n{table_info}\nPlease regenerate the SQL query with correct table names from the available tables."
-                generated_sql = sql_agent.generate_sql_query(corrected_prompt, schema_text)
-                
-                if generated_sql:
-                    st.write(f"Regenerated SQL (attempt {regeneration_attempts + 1}): {generated_sql}")
-                    
-                    # Validate the regenerated SQL
-                    is_valid, error_message = database_client.validate_table_name(generated_sql)
-                    if is_valid:
-                        st.success("Regenerated SQL has valid table names!")
-                        break
-                else:
-                    st.error("Failed to regenerate SQL query.")
-                    return
-                
-                regeneration_attempts += 1
-            
-            if not is_valid:
-                st.error(f"Failed to generate valid SQL after {max_regenerations} attempts. Last error: {error_message}")
-                return
-            
-            # Execute the validated SQL
-            query_result_df = database_client.execute_query(generated_sql)
-            handle_query_result(query_result_df)
+        discard_pending_query("superseded")
+        st.session_state.pop("full_query_offer", None)
+
+    # Run a query the user approved after the cost check or its preview
+    confirmed = st.session_state.pop("confirmed_query", None)
+    if confirmed:
+        run_query(pipeline, confirmed)
+    else:
+        render_full_query_offer()
+    render_pending_query()
+
+    try:
+        if user_question:
+            answer_question(pipeline, user_question)
+    finally:
+        if trace_panel is not None:
+            render_trace_sidebar(trace_panel)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,104 +1,280 @@
-import streamlit as st
-import pandas as pd
-from typing import Optional, List, Tuple, Dict
-from bigquery_tools import get_dataset_schema, execute_query_with_context
+import pyarrow as pa
+from typing import Callable, Optional, List, Sequence, Tuple, Dict, Union
+from bigquery_tools import (
+    get_dataset_schema_indexes,
+    get_datasets_schema,
+    get_relevant_schema,
+    execute_query_with_context,
+    dry_run_query,
+    stream_query_results,
+)
+from query_jobs import JobProgress
+from query_preview import PreviewQuery, make_preview
+from schema_index import SchemaIndex
+from chat_history import ResultEntry
+from result_pager import ResultPager, export_batches
+from sql_validator import SQLValidator, TABLE_ISSUE_CODES, format_issues
+from config import Config
 import re
+import tempfile
+
+
+_SCHEMA_TABLE_PATTERN = re.compile(r'Table:\s*([a-zA-Z_][a-zA-Z0-9_]*\*?)')
+
+
+def format_bytes(num_bytes: int) -> str:
+    """Format a byte count for display (e.g. 1.5 GiB)."""
+    size = float(num_bytes)
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if size < 1024 or unit == "TiB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class QueryExecutionError(Exception):
+    """Raised when a query fails validation or BigQuery execution."""
+
+
+def parse_datasets(entries: Sequence[str], default_project: str) -> List[Tuple[str, str]]:
+    """Parse "dataset" or "project.dataset" entries into (project, dataset) pairs.
+    
+    Raises:
+        ValueError: If an entry is not one of those forms
+    """
+    datasets = []
+    for entry in entries:
+        parts = entry.strip().strip("`").split(".")
+        if len(parts) == 1 and parts[0]:
+            datasets.append((default_project, parts[0]))
+        elif len(parts) == 2 and all(parts):
+            datasets.append((parts[0], parts[1]))
+        else:
+            raise ValueError(f"Invalid dataset '{entry}': expected 'dataset' or 'project.dataset'.")
+    return list(dict.fromkeys(datasets))
 
 
 class BigQueryClient:
-    """BigQuery client for database operations using Google ADK tools."""
+    """BigQuery client for database operations using Google ADK tools.
+    
+    The client has no UI side effects; callers decide how to report progress
+    and errors.
+    
+    Queries are billed to ``project_id`` and may read any of ``datasets``,
+    which can live in other projects. The first dataset is the default one.
+    """
 
-    def __init__(self, project_id: str, dataset_id: str):
+    def __init__(
+        self,
+        project_id: str,
+        dataset_id: Optional[str] = None,
+        datasets: Optional[Sequence[Tuple[str, str]]] = None,
+    ):
         self.project_id = project_id
-        self.dataset_id = dataset_id
-        self.schema_prefix = f"`{project_id}.{dataset_id}."
+        self.datasets: List[Tuple[str, str]] = list(datasets) if datasets else []
+        if not self.datasets and dataset_id:
+            self.datasets = [(project_id, dataset_id)]
+        if not self.datasets:
+            raise ValueError("At least one dataset is required.")
+        self.dataset_id = self.datasets[0][1]
+        self.schema_prefixes = [f"`{project}.{dataset}." for project, dataset in self.datasets]
+        self.schema_prefix = self.schema_prefixes[0]
+
+    @classmethod
+    def from_config(cls) -> "BigQueryClient":
+        """Build a client for ``Config.DATASETS``, or ``Config.DATASET_ID`` when that is unset.
+        
+        Raises:
+            ValueError: If no dataset is configured or an entry is malformed
+        """
+        entries = Config.DATASETS or [Config.DATASET_ID or ""]
+        return cls(Config.PROJECT_ID, datasets=parse_datasets(entries, Config.PROJECT_ID))
 
     def get_schema(self) -> str:
         """Get the database schema using ADK BigQuery tools."""
-        st.write("Fetching database schema...")
-        return get_dataset_schema(self.dataset_id)
-
-    def get_table_list(self) -> List[str]:
-        """Get list of available tables in the dataset."""
-        # Use direct BigQuery client to get table list
-        from google.cloud import bigquery
-        from adk_config import config
+        return get_datasets_schema(self.datasets)
+
+    def get_relevant_schema(self, question: str) -> str:
+        """Get the schema pruned to the tables most relevant to a question."""
+        return get_relevant_schema(self.datasets, question)
+
+    def get_table_indexes(self) -> Dict[Tuple[str, str], SchemaIndex]:
+        """Get the table index of every dataset, keyed by (project, dataset)."""
+        return get_dataset_schema_indexes(self.datasets)
+
+    def available_table_names(self) -> List[str]:
+        """List every known table, qualified with its dataset when there are several.
         
-        try:
-            client = bigquery.Client(project=config.project_id)
-            dataset_ref = client.dataset(self.dataset_id)
-            tables = list(client.list_tables(dataset_ref))
-            return [table.table_id for table in tables]
-        except Exception as e:
-            st.error(f"Error fetching table list: {e}")
-            return []
+        Names are qualified with their project too when the datasets span
+        several projects, since BigQuery resolves ``dataset.table`` against the
+        billing project only.
+        """
+        indexes = self.get_table_indexes()
+        if len(indexes) == 1:
+            return next(iter(indexes.values())).table_names()
+        single_project = all(project_id == self.project_id for project_id, _ in indexes)
+        return [
+            f"{dataset_id}.{table}" if single_project else f"{project_id}.{dataset_id}.{table}"
+            for (project_id, dataset_id), index in indexes.items()
+            for table in index.table_names()
+        ]
 
     def extract_tables_from_schema(self, schema_text: str) -> List[str]:
         """Extract table names from schema text."""
         # Look for table names in the schema text
-        table_pattern = r'Table:\s*([a-zA-Z_][a-zA-Z0-9_]*)'
-        table_matches = re.findall(table_pattern, schema_text)
-        return table_matches
+        return _SCHEMA_TABLE_PATTERN.findall(schema_text)
+
+    def get_sql_validator(self) -> SQLValidator:
+        """Get a local SQL validator bound to the cached schema index of every dataset."""
+        return SQLValidator(self.get_table_indexes(), self.project_id)
 
     def validate_table_name(self, sql_query: str) -> Tuple[bool, str]:
-        """Validate if table names in SQL query exist in the dataset.
+        """Validate if table names in SQL query exist in the configured datasets.
+        
+        Lookups go against the in-memory index of the cached schema, so no
+        BigQuery API call is made.
+        
+        Returns:
+            tuple: (is_valid, error_message)
+        """
+        issues = [
+            issue for issue in self.get_sql_validator().validate(sql_query)
+            if issue.code in TABLE_ISSUE_CODES or issue.code == "parse_error"
+        ]
+        if not issues:
+            return True, ""
+        available = ', '.join(self.available_table_names())
+        return False, f"{format_issues(issues)}\nAvailable tables: {available}"
+
+    def validate_sql(self, sql_query: str) -> Tuple[bool, str]:
+        """Validate every table and column reference in a query against the cached schema.
+        
+        Runs entirely locally, so a failing query can be repaired without any
+        BigQuery call.
         
         Returns:
             tuple: (is_valid, error_message)
         """
-        # Extract table names from SQL query
-        # This is a simplified regex - in production, you might want to use a proper SQL parser
-        table_pattern = rf'`?{self.project_id}\.{self.dataset_id}\.([a-zA-Z_][a-zA-Z0-9_]*)`?'
-        table_matches = re.findall(table_pattern, sql_query)
+        issues = self.get_sql_validator().validate(sql_query)
+        if not issues:
+            return True, ""
+        message = format_issues(issues)
+        if any(issue.code in TABLE_ISSUE_CODES for issue in issues):
+            message += f"\nAvailable tables: {', '.join(self.available_table_names())}"
+        return False, message
+
+    def dry_run(self, sql_query: str) -> Tuple[bool, str, int]:
+        """Dry-run a query to catch errors and estimate its scan size for free.
         
-        if not table_matches:
-            # Try to find table names without full path
-            simple_table_pattern = r'FROM\s+([a-zA-Z_][a-zA-Z0-9_]*)'
-            simple_matches = re.findall(simple_table_pattern, sql_query, re.IGNORECASE)
-            if simple_matches:
-                return False, f"Table names should include full path. Available tables: {', '.join(self.get_table_list())}"
-            return False, "No valid table names found in query"
+        Returns:
+            tuple: (is_valid, error_message, estimated_bytes)
+        """
+        result = dry_run_query(sql_query)
+        if result.get("status") != "success":
+            return False, f"Dry run failed: {result.get('error', 'Unknown error')}", 0
+
+        estimated_bytes = result.get("bytes_processed", 0)
+        if 0 < Config.MAX_BYTES_BILLED < estimated_bytes:
+            return False, (
+                f"Query would scan {format_bytes(estimated_bytes)}, which exceeds the "
+                f"{format_bytes(Config.MAX_BYTES_BILLED)} budget. Filter on partition or "
+                f"clustering columns, or select fewer columns."
+            ), estimated_bytes
+        return True, "", estimated_bytes
+
+    def export_query_results(
+        self,
+        pager: Union[ResultPager, ResultEntry],
+        file_format: str = "parquet",
+        file_path: Optional[str] = None,
+    ) -> str:
+        """Stream a finished query's full result to a Parquet or CSV file.
         
-        # Get actual table list
-        actual_tables = self.get_table_list()
+        Batches are written as they arrive, so the full result is never held in memory.
         
-        # Check if all tables in query exist
-        for table_name in table_matches:
-            if table_name not in actual_tables:
-                return False, f"Table '{table_name}' does not exist. Available tables: {', '.join(actual_tables)}"
+        Args:
+            pager: The pager of the finished query, or its chat history entry
+            file_format: Either "parquet" or "csv"
+            file_path: Destination path, defaults to a new temporary file that the
+                caller must delete
         
-        return True, ""
+        Returns:
+            Path of the written file
+        """
+        if pager.source_table is not None:
+            batches = iter(pager.source_table.to_batches())
+        else:
+            batches = stream_query_results(pager.destination)
+        if file_path is None:
+            with tempfile.NamedTemporaryFile(suffix=f".{file_format}", delete=False) as handle:
+                file_path = handle.name
+        export_batches(batches, file_path, file_format)
+        return file_path
 
-    def execute_query(self, sql_query: str) -> Optional[pd.DataFrame]:
-        """Execute a SQL query using ADK BigQuery tools."""
+    def preview_query(self, sql_query: str) -> Optional[PreviewQuery]:
+        """Plan the preview ``execute_query(preview=True)`` would run, if the query has one."""
+        return make_preview(sql_query, Config.PREVIEW_SAMPLE_PERCENT, Config.PREVIEW_ROW_LIMIT)
+
+    def execute_query(
+        self,
+        sql_query: str,
+        stream: bool = False,
+        max_rows: Optional[int] = None,
+        on_progress: Optional[Callable[[JobProgress], None]] = None,
+        preview: bool = False,
+    ) -> Union[pa.Table, ResultPager]:
+        """Execute a SQL query using ADK BigQuery tools.
+        
+        In preview mode the validated query is rewritten by ``preview_query``
+        to sample its table, and the pager's ``caveat`` says how the result
+        differs from the exact one. Queries without a safe preview
+        run exactly, with no caveat.
+        
+        Args:
+            sql_query: The SQL query to execute
+            stream: If True, return a ResultPager with only the first page loaded
+                instead of downloading the full result
+            max_rows: Row cap for the ResultPager, defaults to Config.MAX_RESULT_ROWS
+            on_progress: Called with a ``JobProgress`` while the BigQuery job runs
+            preview: If True, run a cheaper approximate version of the query when
+                possible; requires ``stream``
+        
+        Returns:
+            The results as an Arrow table, or a ResultPager when streaming
+        
+        Raises:
+            QueryExecutionError: If validation or execution fails
+        """
         if not sql_query:
-            return None
+            raise QueryExecutionError("No SQL query provided")
+        if preview and not stream:
+            raise ValueError("Preview mode requires stream=True, so the result carries its caveat.")
 
         # Validate table names before execution
         is_valid, error_message = self.validate_table_name(sql_query)
         if not is_valid:
-            st.error(f"Table validation failed: {error_message}")
-            return None
-
-        st.info(f"Executing Query: ```sql\n{sql_query}\n```")
-        with st.spinner("Running query against BigQuery..."):
-            result = execute_query_with_context(sql_query)
-            
-            if result.get("status") == "success":
-                st.write(f"Query executed successfully. Returned {result.get('row_count', 0)} rows.")
-                st.write(f"Processed {result.get('bytes_processed', 0)} bytes.")
-                
-                # Convert to DataFrame
-                data = result.get("data", [])
-                if data:
-                    df = pd.DataFrame(data)
-                    return df
-                else:
-                    return pd.DataFrame()
-            else:
-                error = result.get("error", "Unknown error")
-                st.error(
-                    f"BigQuery Execution Failed. The query was invalid or timed out. "
-                    f"Please try to rephrase your question. Error: {error}"
-                )
-                return None
\ No newline at end of file
+            raise QueryExecutionError(f"Table validation failed: {error_message}")
+
+        plan = self.preview_query(sql_query) if preview else None
+        result = execute_query_with_context(plan.sql if plan else sql_query, stream=stream, on_progress=on_progress)
+        if result.get("status") != "success":
+            error = result.get("error", "Unknown error")
+            # e.g. TABLESAMPLE on a view; the exact query is not run in its place, as it may cost far more
+            raise QueryExecutionError(f"Preview failed: {error}" if plan else error)
+
+        if not stream:
+            # Results are already an Arrow table; st.dataframe renders it without conversion
+            return result.get("data")
+
+        pager = ResultPager(
+            result["batches"],
+            page_rows=Config.RESULT_PAGE_ROWS,
+            max_rows=max_rows or Config.MAX_RESULT_ROWS,
+            total_rows=result.get("row_count"),
+            bytes_processed=result.get("bytes_processed"),
+            destination=result.get("destination"),
+            source_table=result.get("data"),
+            cache_hit=result.get("cache_hit", False),
+            caveat=plan.describe() if plan is not None else None,
+        )
+        pager.load_next_page()
+        return pager
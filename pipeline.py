@@ -0,0 +1,206 @@
+"""Headless question pipeline: schema -> generate -> validate -> dry run -> execute."""
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import tracing
+from config import Config
+from mcp_client import BigQueryClient
+from query_jobs import JobProgress
+from result_pager import ResultPager
+from schema_retrieval import estimate_tokens
+from sql_generation_agent import SQLGenerationAgent
+from tracing import Trace
+
+
+class PipelineError(Exception):
+    """Raised when a question cannot be turned into a valid query."""
+
+    def __init__(self, message: str, stage: str, sql_query: Optional[str] = None, timings: Optional[Dict] = None):
+        super().__init__(message)
+        self.stage = stage
+        self.sql_query = sql_query
+        self.timings = timings or {}
+
+
+@dataclass
+class PreparedQuery:
+    """A validated, dry-run query ready to execute."""
+    question: str
+    sql: str
+    prompt_schema: str
+    estimated_bytes: int
+    regeneration_attempts: int
+    # Seconds spent in each stage; stages that repeat are summed
+    timings: Dict[str, float] = field(default_factory=dict)
+    # Spans of this question; finished once the query runs or is abandoned
+    trace: Optional[Trace] = None
+
+
+class QuestionPipeline:
+    """Turns a natural-language question into a validated query and runs it.
+
+    The pipeline has no UI dependency. Progress is reported through an optional
+    ``on_event(event, **details)`` callback so the Streamlit app can render it,
+    while the batch runner simply collects timings.
+
+    Events: "generated" (sql, attempt), "validation_failed" (error, attempt),
+    "regenerating" (attempt), "validated" (sql, attempt, estimated_bytes).
+    """
+
+    def __init__(
+        self,
+        database_client: BigQueryClient,
+        sql_agent: SQLGenerationAgent,
+        max_regenerations: int = 2,
+        on_event: Optional[Callable[..., None]] = None,
+        on_text: Optional[Callable[[str], None]] = None,
+    ):
+        self.database_client = database_client
+        self.sql_agent = sql_agent
+        self.max_regenerations = max_regenerations
+        self.on_event = on_event
+        self.on_text = on_text
+
+    def prepare(self, question: str, trace: Optional[Trace] = None) -> PreparedQuery:
+        """Generate SQL for a question and repair it until it validates and dry-runs.
+
+        Every stage is recorded as a span of ``trace`` (a new one by default).
+        The trace stays open on success so execution can be added to it, and is
+        finished with status "error" on failure.
+
+        Raises:
+            PipelineError: If no valid query is produced within ``max_regenerations``
+            SQLGenerationError: If the LLM call itself fails
+        """
+        trace = trace or Trace(question)
+        with trace.activate():
+            try:
+                return self._prepare(question, trace)
+            except Exception:
+                trace.finish(status="error")
+                raise
+
+    def execute(
+        self,
+        prepared: PreparedQuery,
+        max_rows: Optional[int] = None,
+        on_progress: Optional[Callable[[JobProgress], None]] = None,
+        preview: bool = False,
+    ) -> ResultPager:
+        """Run a prepared query and return a pager with its first page loaded.
+
+        The execution is recorded in the prepared query's trace, which is then
+        finished; a query run after its trace was closed gets a new trace.
+        ``on_progress`` receives a ``JobProgress`` while the BigQuery job runs.
+        With ``preview`` a cheaper approximate version runs when one is safe
+        (see ``BigQueryClient.execute_query``).
+
+        Raises:
+            QueryExecutionError: If BigQuery rejects or fails the query
+        """
+        if prepared.trace is None or prepared.trace.finished:
+            prepared.trace = Trace(prepared.question)
+        trace = prepared.trace
+        with trace.activate():
+            try:
+                with trace.span("execute", preview=preview) as execute_span:
+                    pager = self.database_client.execute_query(
+                        prepared.sql, stream=True, max_rows=max_rows, on_progress=on_progress, preview=preview
+                    )
+            except Exception:
+                trace.finish(status="error")
+                raise
+        prepared.timings["execute"] = execute_span.duration
+        trace.finish()
+        return pager
+
+    def _prepare(self, question: str, trace: Trace) -> PreparedQuery:
+        with trace.span("schema") as schema_span:
+            # Only the tables relevant to this question go into the prompt
+            prompt_schema = self.database_client.get_relevant_schema(question)
+            schema_span.attributes.update(
+                schema_tokens=estimate_tokens(prompt_schema),
+                tables=len(self.database_client.extract_tables_from_schema(prompt_schema)),
+            )
+
+        with trace.span("generate", attempt=0):
+            generated_sql = self._generate(question, prompt_schema)
+        self._emit("generated", sql=generated_sql, attempt=0)
+
+        is_valid, error_message, estimated_bytes = self._validate(generated_sql)
+        regeneration_attempts = 0
+        while not is_valid and regeneration_attempts < self.max_regenerations:
+            self._emit("validation_failed", error=error_message, attempt=regeneration_attempts)
+            regeneration_attempts += 1
+            self._emit("regenerating", attempt=regeneration_attempts)
+
+            with trace.span("regeneration", attempt=regeneration_attempts):
+                with trace.span("generate", attempt=regeneration_attempts):
+                    generated_sql = self._generate(
+                        self._correction_prompt(question, prompt_schema, error_message), prompt_schema
+                    )
+                self._emit("generated", sql=generated_sql, attempt=regeneration_attempts)
+                is_valid, error_message, estimated_bytes = self._validate(generated_sql)
+
+        if not is_valid:
+            raise PipelineError(
+                f"Failed to generate valid SQL after {self.max_regenerations} attempts. Last error: {error_message}",
+                stage="validate",
+                sql_query=generated_sql,
+                timings=trace.stage_totals(),
+            )
+
+        # Only SQL that passed validation is reused for repeat questions
+        self.sql_agent.cache_sql(question, prompt_schema, generated_sql)
+        self._emit("validated", sql=generated_sql, attempt=regeneration_attempts, estimated_bytes=estimated_bytes)
+
+        return PreparedQuery(
+            question=question,
+            sql=generated_sql,
+            prompt_schema=prompt_schema,
+            estimated_bytes=estimated_bytes,
+            regeneration_attempts=regeneration_attempts,
+            timings=trace.stage_totals(),
+            trace=trace,
+        )
+
+    def _generate(self, question: str, schema_text: str) -> str:
+        """Generate SQL, racing parallel candidates when speculative generation is enabled."""
+        if Config.SPECULATIVE_CANDIDATES > 1:
+            return self.sql_agent.generate_sql_candidates(question, schema_text, self.database_client.validate_sql)
+        return self.sql_agent.generate_sql_query(question, schema_text, on_text=self.on_text)
+
+    def _validate(self, sql_query: str) -> Tuple[bool, str, int]:
+        """Check tables and columns locally, then dry-run the query in BigQuery."""
+        with tracing.span("validate") as validate_span:
+            is_valid, error_message = self.database_client.validate_sql(sql_query)
+            validate_span.attributes["valid"] = is_valid
+        if not is_valid:
+            return False, error_message, 0
+        with tracing.span("dry_run") as dry_run_span:
+            is_valid, error_message, estimated_bytes = self.database_client.dry_run(sql_query)
+            dry_run_span.attributes.update(valid=is_valid, estimated_bytes=estimated_bytes)
+        return is_valid, error_message, estimated_bytes
+
+    def _correction_prompt(self, question: str, prompt_schema: str, error_message: str) -> str:
+        """Build the regeneration prompt that feeds the validation error back to the LLM."""
+        # Extract available tables from schema
+        available_tables = self.database_client.extract_tables_from_schema(prompt_schema)
+        if available_tables:
+            table_info = f"Available tables in the schema: {', '.join(available_tables)}"
+        else:
+            # Fallback to the cached table indexes
+            available_tables = self.database_client.available_table_names()
+            table_info = f"Available tables: {', '.join(available_tables)}"
+
+        return (
+            f"{question}\n\nPrevious attempt failed with error: {error_message}\n{table_info}\n"
+            f"Please regenerate the SQL query so that it fixes this error, using only tables "
+            f"and columns from the schema."
+        )
+
+    def _emit(self, event: str, **details: Any):
+        if self.on_event is not None:
+            self.on_event(event, **details)
+
@@ -0,0 +1,126 @@
+"""Polling of running query jobs with a timeout, progress reports and cancellation."""
+
+import random
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Optional
+
+from config import Config
+from scheduler import is_retryable
+
+if TYPE_CHECKING:
+    from google.cloud import bigquery
+
+# First status check comes quickly so short queries return promptly; later ones back off
+_FIRST_POLL_SECONDS = 0.1
+
+
+@dataclass
+class JobProgress:
+    """A snapshot of a running query job."""
+    job_id: Optional[str]
+    # BigQuery's PENDING, RUNNING or DONE; QUEUED or COALESCED while waiting in the scheduler
+    state: str
+    elapsed_seconds: float
+    # BigQuery usually reports these only once the job has finished
+    bytes_processed: Optional[int] = None
+    slot_millis: Optional[int] = None
+    # Parallel work units of the latest timeline sample
+    completed_units: Optional[int] = None
+    total_units: Optional[int] = None
+
+
+def wait_for_job(
+    query_job: "bigquery.QueryJob",
+    timeout_seconds: Optional[float] = None,
+    on_progress: Optional[Callable[[JobProgress], None]] = None,
+    poll_interval: Optional[float] = None,
+) -> JobProgress:
+    """Poll a submitted job until it finishes, reporting progress in between.
+
+    The job is cancelled if it outlives ``timeout_seconds`` or if anything
+    interrupts the wait, including an exception raised by ``on_progress``.
+    Streamlit stops a script run that way when its session submits a new
+    question or disconnects, so a superseded query stops using slots.
+
+    A rate limit or transient server error from a status check says nothing
+    about the job itself: the check is retried against the same job with
+    jittered backoff, up to ``Config.SCHEDULER_MAX_RETRIES`` times in a row,
+    and the job is left running if the checks keep failing.
+
+    Args:
+        query_job: A job returned by ``Client.query``, which does not wait for it
+        timeout_seconds: Cancel the job after this long; None waits indefinitely
+        on_progress: Called after every status check with a ``JobProgress``
+        poll_interval: Longest pause between checks, defaults to Config.QUERY_POLL_INTERVAL
+
+    Returns:
+        The progress of the finished job
+
+    Raises:
+        TimeoutError: If the job was cancelled for running past the timeout
+    """
+    poll_interval = poll_interval if poll_interval is not None else Config.QUERY_POLL_INTERVAL
+    started = time.monotonic()
+    delay = min(_FIRST_POLL_SECONDS, poll_interval)
+    failed_polls = 0
+    try:
+        while True:
+            try:
+                done = query_job.done()
+            except Exception as e:
+                if not is_retryable(e) or failed_polls >= Config.SCHEDULER_MAX_RETRIES:
+                    raise
+                failed_polls += 1
+                _check_timeout(time.monotonic() - started, timeout_seconds)
+                # Full jitter, as in the scheduler's own retries
+                time.sleep(random.uniform(0, min(
+                    Config.SCHEDULER_BACKOFF_MAX, Config.SCHEDULER_BACKOFF_BASE * 2 ** (failed_polls - 1)
+                )))
+                continue
+            failed_polls = 0
+            progress = _job_progress(query_job, time.monotonic() - started)
+            if on_progress is not None:
+                on_progress(progress)
+            if done:
+                return progress
+            _check_timeout(progress.elapsed_seconds, timeout_seconds)
+            time.sleep(delay)
+            delay = min(delay * 2, poll_interval)
+    except BaseException as e:
+        # Status checks that kept failing transiently leave the job to BigQuery's own job timeout
+        if not (isinstance(e, Exception) and is_retryable(e)):
+            _cancel(query_job)
+        raise
+
+
+def _check_timeout(elapsed_seconds: float, timeout_seconds: Optional[float]):
+    if timeout_seconds and elapsed_seconds >= timeout_seconds:
+        raise TimeoutError(
+            f"Query exceeded the {timeout_seconds:g} s timeout and was cancelled (QUERY_TIMEOUT_MS)."
+        )
+
+
+def _job_progress(query_job: "bigquery.QueryJob", elapsed_seconds: float) -> JobProgress:
+    timeline = query_job.timeline
+    sample = timeline[-1] if timeline else None
+    completed = sample.completed_units if sample is not None else None
+    pending = sample.pending_units if sample is not None else None
+    return JobProgress(
+        job_id=getattr(query_job, "job_id", None),
+        state=query_job.state,
+        elapsed_seconds=elapsed_seconds,
+        bytes_processed=query_job.total_bytes_processed,
+        slot_millis=query_job.slot_millis,
+        completed_units=completed,
+        total_units=(completed or 0) + (pending or 0) if sample is not None else None,
+    )
+
+
+def _cancel(query_job: "bigquery.QueryJob"):
+    """Ask BigQuery to cancel a job; best effort, since it may already have finished."""
+    try:
+        if query_job.state != "DONE":
+            query_job.cancel()
+    except Exception:
+        pass
@@ -0,0 +1,89 @@
+"""Cheap sampled preview rewrites of validated queries, labelled as approximate."""
+
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+from sql_validator import analyze_query
+
+# Clauses that already follow a FROM item and must not be combined with a new sample clause
+_TABLE_MODIFIER = re.compile(r"\s*(?:FOR\s+SYSTEM_TIME|TABLESAMPLE)\b", re.IGNORECASE)
+
+
+@dataclass
+class PreviewQuery:
+    """A sampled rewrite of a query that returns quickly, with what it gives up."""
+    sql: str
+    row_limit: int
+    sample_percent: float
+    sampled_table: str
+    # Whether values or ordering, not only the number of rows, can differ from the exact result
+    approximate: bool = False
+    # Set when sampling only affects which rows come first, not the values in them
+    ordered_only: bool = False
+
+    def describe(self) -> str:
+        """Explain to the user how the preview differs from the exact result."""
+        sample = f"a ~{self.sample_percent:g}% sample of {self.sampled_table}"
+        if self.ordered_only:
+            detail = "Every row is a real match, but the ordering only covers the sample, so the top rows may differ."
+        elif self.approximate:
+            detail = (
+                f"All aggregates are approximate: counts and sums are roughly {self.sample_percent:g}% of their "
+                f"true values, and averages, minimums, maximums and distinct values are estimates."
+            )
+        else:
+            detail = "Every row is a real match, but most matches are missing."
+        return f"Approximate preview computed from {sample}. {detail} Run the full query for exact results."
+
+
+def make_preview(sql_query: str, sample_percent: float, row_limit: int) -> Optional[PreviewQuery]:
+    """Rewrite a query into a cheaper sampled preview, or return None if none is safe.
+
+    Only a query reading a single base table is previewed: it samples the
+    table with ``TABLESAMPLE SYSTEM``, which cuts the bytes scanned. Joins are
+    never sampled, since sampling both sides compounds the error in ways a
+    label cannot describe, and a LIMIT alone would not help: BigQuery bills the
+    full scan regardless, so the preview and the full run would each cost as
+    much as the exact query. The preview also caps the row count at
+    ``row_limit``, lowering an existing outer LIMIT if needed.
+
+    Args:
+        sql_query: A validated query
+        sample_percent: Share of the table's storage blocks to read, in percent
+        row_limit: Most rows the preview returns
+
+    Returns:
+        The preview, or None when the query should run exactly instead
+    """
+    structure = analyze_query(sql_query)
+    if structure is None or len(structure.tables) != 1:
+        return None
+    table = structure.tables[0]
+    # Drop a trailing semicolon and comments, so the LIMIT added below is still part of the statement
+    sql = sql_query[:structure.end]
+    can_sample = (
+        0 < sample_percent < 100
+        and "*" not in table.path
+        and "INFORMATION_SCHEMA" not in table.path.upper()
+        and not _TABLE_MODIFIER.match(sql, table.end)
+    )
+    if not can_sample:
+        return None
+
+    # Cap the rows first: it edits text after the table reference, so the table's offset stays valid
+    if structure.limit_span is not None:
+        start, end = structure.limit_span
+        sql = f"{sql[:start]}{min(structure.limit, row_limit)}{sql[end:]}"
+    else:
+        sql = f"{sql}\nLIMIT {row_limit}"
+
+    sql = f"{sql[:table.end]} TABLESAMPLE SYSTEM ({sample_percent:g} PERCENT){sql[table.end:]}"
+    return PreviewQuery(
+        sql=sql,
+        row_limit=row_limit,
+        sample_percent=sample_percent,
+        sampled_table=table.path,
+        approximate=structure.aggregated or structure.ordered,
+        ordered_only=structure.ordered and not structure.aggregated,
+    )
@@ -0,0 +1,226 @@
+"""Local cache of executed query results held as Arrow tables."""
+
+import atexit
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+
+from config import Config
+from sql_validator import analyze_query
+
+_QUOTED_OR_CODE = re.compile(r"('(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`)")
+_WHITESPACE = re.compile(r"\s+")
+# BigQuery never caches these either: their results change between runs.
+# The CURRENT_* functions may also be written without parentheses.
+_NON_DETERMINISTIC = re.compile(
+    r"\bCURRENT_(DATE|DATETIME|TIME|TIMESTAMP)\b|\b(NOW|RAND|GENERATE_UUID|SESSION_USER)\s*\(",
+    re.IGNORECASE,
+)
+
+
+def normalize_sql(sql_query: str) -> str:
+    """Collapse whitespace outside string literals and drop a trailing semicolon."""
+    parts = _QUOTED_OR_CODE.split(sql_query.strip().rstrip(";").strip())
+    # Odd indices are the quoted segments captured by the split pattern
+    return "".join(part if i % 2 else _WHITESPACE.sub(" ", part) for i, part in enumerate(parts))
+
+
+def referenced_tables(
+    sql_query: str,
+    billing_project: Optional[str] = None,
+) -> Optional[List[Tuple[str, str, str]]]:
+    """Return the distinct (project, dataset, table) tables a query reads.
+
+    FROM items are found with the validator's parser, so every path it
+    accepts counts, whether the whole path, each part or nothing is
+    backticked, and struct paths such as ``alias.column.field`` never do. Two-part ``dataset.table``
+    names resolve against ``billing_project``, as in BigQuery.
+
+    Returns:
+        The tables, sorted, or None if a FROM item cannot be pinned to a table
+        (an unqualified name, INFORMATION_SCHEMA or a table-valued function),
+        since a key without it would outlive changes to that data
+    """
+    structure = analyze_query(sql_query)
+    if structure is None or structure.table_functions:
+        return None
+    tables = set()
+    for table in structure.tables:
+        parts = table.path.split(".")
+        if any(part.upper() == "INFORMATION_SCHEMA" for part in parts):
+            return None
+        if len(parts) == 3:
+            tables.add((parts[0], parts[1], parts[2]))
+        elif len(parts) == 2 and billing_project:
+            tables.add((billing_project, parts[0], parts[1]))
+        else:
+            return None
+    return sorted(tables)
+
+
+def is_cacheable(sql_query: str) -> bool:
+    """Whether the query's result depends only on its text and table contents."""
+    return not _NON_DETERMINISTIC.search(sql_query)
+
+
+def make_result_key(sql_query: str, table_versions: Iterable[Tuple[str, Any]]) -> str:
+    """Build a cache key from the normalized SQL and each table's last-modified time."""
+    parts = [normalize_sql(sql_query)]
+    parts.extend(f"{table}@{modified}" for table, modified in table_versions)
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """LRU cache of Arrow tables with a memory budget that spills to disk.
+
+    Tables evicted from memory are written as uncompressed Arrow IPC files and
+    read back through a memory map, so a disk hit costs page faults rather than
+    a full copy. Disk usage has its own budget; the oldest spilled files go first.
+    """
+
+    def __init__(self, memory_budget_bytes: int, disk_budget_bytes: int, spill_dir: str):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.disk_budget_bytes = disk_budget_bytes
+        self.spill_dir = spill_dir
+        os.makedirs(spill_dir, exist_ok=True)
+
+        self._memory: "OrderedDict[str, pa.Table]" = OrderedDict()
+        self._disk: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[pa.Table]:
+        """Return the cached table for ``key``, or None."""
+        with self._lock:
+            table = self._memory.get(key)
+            if table is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return table
+
+            spilled = self._disk.get(key)
+            if spilled is not None:
+                self._disk.move_to_end(key)
+                self.hits += 1
+                self.disk_hits += 1
+                # The returned table references the mapped pages; the map stays open with it
+                return pa.ipc.open_file(pa.memory_map(spilled[0], "r")).read_all()
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, table: pa.Table):
+        """Cache a table, spilling least recently used tables to disk as needed."""
+        size = table.nbytes
+        with self._lock:
+            if key in self._memory or key in self._disk:
+                return
+            if size > self.memory_budget_bytes:
+                self._spill(key, table)
+                return
+            self._memory[key] = table
+            self._memory_bytes += size
+            while self._memory_bytes > self.memory_budget_bytes:
+                old_key, old_table = self._memory.popitem(last=False)
+                self._memory_bytes -= old_table.nbytes
+                self._spill(old_key, old_table)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit counters and memory/disk occupancy."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+            }
+
+    def caching_iterator(
+        self,
+        key: str,
+        batches: Iterable[pa.RecordBatch],
+        total_rows: Optional[int] = None,
+    ) -> Iterator[pa.RecordBatch]:
+        """Pass batches through and cache the full table once every row has been read.
+
+        With ``total_rows`` the table is cached as soon as that many rows have
+        passed, since a consumer that knows the row count stops without asking
+        for more. Only batches the consumer pulls anyway are kept, so a result
+        is never downloaded a second time to fill the cache. Nothing is cached
+        if the consumer stops early or the result outgrows the memory budget.
+        """
+        collected = []
+        collected_bytes = 0
+        collected_rows = 0
+        for batch in batches:
+            if collected is not None:
+                collected_bytes += batch.nbytes
+                collected_rows += batch.num_rows
+                if collected_bytes > self.memory_budget_bytes:
+                    collected = None
+                else:
+                    collected.append(batch)
+                    if total_rows is not None and collected_rows >= total_rows:
+                        self.put(key, pa.Table.from_batches(collected))
+                        collected = None
+            yield batch
+        if collected:
+            self.put(key, pa.Table.from_batches(collected))
+
+    def _spill(self, key: str, table: pa.Table):
+        # Caller must hold self._lock.
+        if self.disk_budget_bytes <= 0:
+            return
+        path = os.path.join(self.spill_dir, f"{key}.arrow")
+        with pa.OSFile(path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        size = os.path.getsize(path)
+        self._disk[key] = (path, size)
+        self._disk_bytes += size
+        while self._disk_bytes > self.disk_budget_bytes and self._disk:
+            _, (old_path, old_size) = self._disk.popitem(last=False)
+            self._disk_bytes -= old_size
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+
+_result_cache: Optional[ResultCache] = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """Return the process-wide result cache configured from ``Config``."""
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                base_dir = Config.RESULT_CACHE_DIR or os.path.join(tempfile.gettempdir(), "bq_result_cache")
+                # Spill files are only indexed in memory, so each process owns its own directory
+                spill_dir = os.path.join(base_dir, str(os.getpid()))
+                atexit.register(shutil.rmtree, spill_dir, True)
+                _result_cache = ResultCache(
+                    memory_budget_bytes=Config.RESULT_CACHE_MEMORY_BYTES,
+                    disk_budget_bytes=Config.RESULT_CACHE_DISK_BYTES,
+                    spill_dir=spill_dir,
+                )
+    return _result_cache
@@ -0,0 +1,140 @@
+"""Incremental, memory-bounded access to streamed query results."""
+
+import threading
+from typing import Iterable, Iterator, List, Optional
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+
+class ResultPager:
+    """Materializes a stream of Arrow record batches one page at a time.
+
+    At most ``max_rows`` rows are ever held in memory; the rest of the result can
+    still be exported by streaming it straight to disk with ``export_batches``.
+    """
+
+    def __init__(
+        self,
+        batches: Iterable[pa.RecordBatch],
+        page_rows: int,
+        max_rows: int,
+        total_rows: Optional[int] = None,
+        bytes_processed: Optional[int] = None,
+        destination=None,
+        source_table: Optional[pa.Table] = None,
+        cache_hit: bool = False,
+        caveat: Optional[str] = None,
+    ):
+        self.page_rows = max(1, page_rows)
+        self.max_rows = max(1, max_rows)
+        self.total_rows = total_rows
+        self.bytes_processed = bytes_processed
+        self.cache_hit = cache_hit
+        # How the result differs from the exact answer, e.g. for a sampled preview
+        self.caveat = caveat
+        # Where the complete result can be re-streamed from for downloads: the job's
+        # destination table, or the full Arrow table when it came from the result cache
+        self.destination = destination
+        self.source_table = source_table
+
+        self.batches: List[pa.RecordBatch] = []
+        self.loaded_rows = 0
+        self.exhausted = False
+        self.schema: Optional[pa.Schema] = None
+
+        self._source: Iterator[pa.RecordBatch] = iter(batches)
+        self._pending: Optional[pa.RecordBatch] = None
+        self._lock = threading.Lock()
+
+    @property
+    def downloadable(self) -> bool:
+        """Whether the full result can be exported."""
+        return self.destination is not None or self.source_table is not None
+
+    @property
+    def has_more(self) -> bool:
+        """Whether another page can be loaded without exceeding ``max_rows``."""
+        return not self.exhausted and self.loaded_rows < self.max_rows
+
+    @property
+    def truncated(self) -> bool:
+        """Whether rows exist beyond the materialization cap."""
+        if self.loaded_rows < self.max_rows:
+            return False
+        if self.total_rows is not None:
+            return self.total_rows > self.loaded_rows
+        return not self.exhausted
+
+    def load_next_page(self) -> int:
+        """Pull up to one page of rows from the stream.
+
+        Returns:
+            Number of rows added
+        """
+        with self._lock:
+            wanted = min(self.page_rows, self.max_rows - self.loaded_rows)
+            added = 0
+            while added < wanted:
+                batch = self._pending if self._pending is not None else next(self._source, None)
+                self._pending = None
+                if batch is None:
+                    self.exhausted = True
+                    break
+                if self.schema is None:
+                    self.schema = batch.schema
+                remaining = wanted - added
+                if batch.num_rows > remaining:
+                    self._pending = batch.slice(remaining)
+                    batch = batch.slice(0, remaining)
+                if batch.num_rows:
+                    self.batches.append(batch)
+                    added += batch.num_rows
+            self.loaded_rows += added
+            if self.total_rows is not None and self.loaded_rows >= self.total_rows:
+                self.exhausted = True
+            return added
+
+    def to_table(self) -> pa.Table:
+        """Return the rows loaded so far as a single Arrow table (no copy)."""
+        if not self.batches:
+            return pa.table({}) if self.schema is None else self.schema.empty_table()
+        return pa.Table.from_batches(self.batches, schema=self.schema)
+
+
+def export_batches(batches: Iterable[pa.RecordBatch], file_path: str, file_format: str = "parquet") -> int:
+    """Stream record batches to a Parquet or CSV file, one batch in memory at a time.
+
+    Args:
+        batches: The record batches to write
+        file_path: Destination file path
+        file_format: Either "parquet" or "csv"
+
+    Returns:
+        Number of rows written
+    """
+    if file_format not in ("parquet", "csv"):
+        raise ValueError(f"Unsupported export format: {file_format}")
+
+    writer = None
+    rows_written = 0
+    try:
+        for batch in batches:
+            if writer is None:
+                if file_format == "parquet":
+                    writer = pq.ParquetWriter(file_path, batch.schema, compression="zstd")
+                else:
+                    writer = pa_csv.CSVWriter(file_path, batch.schema)
+            if file_format == "parquet":
+                writer.write_batch(batch)
+            else:
+                writer.write(batch)
+            rows_written += batch.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        # Empty result: still produce a valid (empty) file
+        open(file_path, "wb").close()
+    return rows_written
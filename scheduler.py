@@ -0,0 +1,324 @@
+"""Process-wide admission control for LLM and BigQuery calls.
+
+Every Streamlit session and batch worker in the process shares one
+``Scheduler`` per backend. It coalesces identical in-flight calls into one
+(single-flight), caps how many calls run at once, paces call starts with a
+token bucket and retries rate-limit and transient server errors with jittered
+exponential backoff. Queue depth, wait times, coalesced calls and retries are
+published to the Prometheus registry in ``tracing``.
+"""
+
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, TypeVar
+
+import tracing
+from config import Config
+
+T = TypeVar("T")
+
+# How often callers waiting for a slot, a token or a coalesced call report back
+_WAIT_POLL_SECONDS = 0.5
+
+# BigQuery reports some rate limits and transient failures as 403/400 with one of these reasons
+_RETRYABLE_REASONS = frozenset({"rateLimitExceeded", "backendError", "internalError"})
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether an error is a rate limit (429) or transient server error (5xx).
+
+    Provider SDKs expose the HTTP status as ``status_code``, ``code`` or on
+    ``response``; wrapped errors are checked through their ``__cause__``.
+    """
+    seen = 0
+    while error is not None and seen < 4:
+        status = getattr(error, "status_code", None)
+        if not isinstance(status, int):
+            status = getattr(error, "code", None)
+        if not isinstance(status, int):
+            status = getattr(getattr(error, "response", None), "status_code", None)
+        if isinstance(status, int) and (status == 429 or 500 <= status < 600):
+            return True
+        reasons = {item.get("reason") for item in getattr(error, "errors", None) or [] if isinstance(item, dict)}
+        if reasons & _RETRYABLE_REASONS:
+            return True
+        error = error.__cause__
+        seen += 1
+    return False
+
+
+class TokenBucket:
+    """Allows ``rate`` starts per second on average, in bursts of up to ``capacity``.
+
+    Tokens are reserved rather than polled for: a caller takes one immediately,
+    possibly driving the balance negative, and is told how long to wait. A
+    ``rate`` of 0 disables the limit.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token and return the seconds to wait before using it."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class _Flight:
+    """One in-flight call that identical requests wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[Exception] = None
+        # Set when the leader was interrupted (e.g. its Streamlit run stopped), not failed
+        self.abandoned = False
+
+
+class Scheduler:
+    """Admission control for one backend.
+
+    Args:
+        name: Backend label used in metrics and trace spans
+        max_concurrency: Most calls running at once; 0 disables the cap
+        rate: Call starts per second; 0 disables the limit
+        burst: Starts allowed back to back before ``rate`` applies
+        max_retries: Retries of a call failing with ``is_retryable`` errors
+        backoff_base: Seconds before the first retry, doubled for each further one
+        backoff_max: Longest backoff in seconds
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        rate: float,
+        burst: float,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0,
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency > 0 else None
+        self._bucket = TokenBucket(rate, burst)
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._calls = 0
+        self._coalesced = 0
+        self._retries = 0
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+
+    def run(
+        self,
+        fn: Callable[[], T],
+        key: Optional[Hashable] = None,
+        on_wait: Optional[Callable[[float, bool], None]] = None,
+        retry: bool = True,
+    ) -> T:
+        """Run ``fn`` within this backend's limits and return its result.
+
+        Calls with the same ``key`` that overlap in time run ``fn`` once: the
+        first caller runs it and the others wait for and share its result or
+        error. If the first caller is interrupted rather than failing, a
+        waiting caller runs ``fn`` itself instead.
+
+        Args:
+            fn: The call to make; it runs on the calling thread
+            key: Identity of the request for coalescing; None never coalesces
+            on_wait: Called with (seconds waited, coalesced) about twice a second
+                while queued or waiting on a coalesced call
+            retry: Retry ``fn`` on ``is_retryable`` errors; pass False when only
+                part of ``fn`` is safe to repeat and retry that part with ``call``
+
+        Raises:
+            Whatever ``fn`` raises once retries are exhausted
+        """
+        while True:
+            if key is None:
+                return self._run(fn, on_wait, retry)
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+                else:
+                    self._coalesced += 1
+            if not leader:
+                tracing.get_metrics().inc("scheduler_coalesced_total", {"backend": self.name})
+                with tracing.span("queue", backend=self.name, coalesced=True):
+                    self._wait(flight.done.wait, on_wait, coalesced=True)
+                if flight.abandoned:
+                    continue
+                if flight.error is not None:
+                    raise flight.error
+                return flight.result
+
+            try:
+                flight.result = self._run(fn, on_wait, retry)
+                return flight.result
+            except Exception as e:
+                flight.error = e
+                raise
+            except BaseException:
+                flight.abandoned = True
+                raise
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth, running calls and wait-time counters."""
+        with self._lock:
+            return {
+                "queued": self._queued,
+                "running": self._running,
+                "in_flight_keys": len(self._flights),
+                "calls": self._calls,
+                "coalesced": self._coalesced,
+                "retries": self._retries,
+                "average_wait_seconds": self._wait_seconds / self._calls if self._calls else 0.0,
+                "max_wait_seconds": self._max_wait_seconds,
+            }
+
+    def _run(self, fn: Callable[[], T], on_wait: Optional[Callable[[float, bool], None]], retry: bool) -> T:
+        metrics = tracing.get_metrics()
+        labels = {"backend": self.name}
+        started = time.monotonic()
+        acquired = False
+        self._update_counts(queued=1)
+        try:
+            with tracing.span("queue", backend=self.name, coalesced=False):
+                if self._slots is not None:
+                    self._wait(lambda timeout: self._slots.acquire(timeout=timeout), on_wait, started=started)
+                    acquired = True
+                self._sleep(self._bucket.reserve(), on_wait, started)
+        except BaseException:
+            if acquired:
+                self._slots.release()
+            raise
+        finally:
+            self._update_counts(queued=-1)
+
+        waited = time.monotonic() - started
+        metrics.observe("scheduler_wait_seconds", labels, waited)
+        with self._lock:
+            self._calls += 1
+            self._wait_seconds += waited
+            self._max_wait_seconds = max(self._max_wait_seconds, waited)
+        self._update_counts(running=1)
+        try:
+            return self.call(fn, on_wait) if retry else fn()
+        finally:
+            self._update_counts(running=-1)
+            if self._slots is not None:
+                self._slots.release()
+
+    def call(self, fn: Callable[[], T], on_wait: Optional[Callable[[float, bool], None]] = None) -> T:
+        """Call ``fn`` now, retrying rate-limit and transient server errors with backoff.
+
+        Takes no slot of its own: it is meant for the repeatable part of a
+        call already admitted by ``run(..., retry=False)``.
+
+        Raises:
+            Whatever ``fn`` raises once retries are exhausted
+        """
+        attempt = 0
+        while True:
+            try:
+                return fn()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                attempt += 1
+                with self._lock:
+                    self._retries += 1
+                tracing.get_metrics().inc("scheduler_retries_total", {"backend": self.name})
+                tracing.annotate(retries=attempt)
+                # Full jitter keeps retries from a burst from arriving together
+                backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+                self._sleep(max(backoff, self._bucket.reserve()), on_wait, time.monotonic())
+
+    def _wait(
+        self,
+        wait: Callable[[float], bool],
+        on_wait: Optional[Callable[[float, bool], None]],
+        coalesced: bool = False,
+        started: Optional[float] = None,
+    ):
+        """Block on ``wait(timeout)`` until it returns True, reporting progress in between."""
+        started = started if started is not None else time.monotonic()
+        while not wait(_WAIT_POLL_SECONDS):
+            if on_wait is not None:
+                on_wait(time.monotonic() - started, coalesced)
+
+    def _sleep(self, seconds: float, on_wait: Optional[Callable[[float, bool], None]], started: float):
+        deadline = time.monotonic() + seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, _WAIT_POLL_SECONDS))
+            if on_wait is not None:
+                on_wait(time.monotonic() - started, False)
+
+    def _update_counts(self, queued: int = 0, running: int = 0):
+        with self._lock:
+            self._queued += queued
+            self._running += running
+            queued, running = self._queued, self._running
+        metrics = tracing.get_metrics()
+        metrics.set_gauge("scheduler_queue_depth", {"backend": self.name}, queued)
+        metrics.set_gauge("scheduler_running", {"backend": self.name}, running)
+
+
+_schedulers: Dict[str, Scheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(backend: str) -> Scheduler:
+    """Return the process-wide scheduler of a backend, "llm" or "bigquery"."""
+    scheduler = _schedulers.get(backend)
+    if scheduler is not None:
+        return scheduler
+    with _schedulers_lock:
+        if backend not in _schedulers:
+            if backend == "llm":
+                limits = (Config.LLM_MAX_CONCURRENCY, Config.LLM_RATE_LIMIT, Config.LLM_RATE_BURST)
+            elif backend == "bigquery":
+                limits = (Config.BIGQUERY_MAX_CONCURRENCY, Config.BIGQUERY_RATE_LIMIT, Config.BIGQUERY_RATE_BURST)
+            else:
+                raise ValueError(f"Unknown backend '{backend}'.")
+            _schedulers[backend] = Scheduler(
+                backend,
+                *limits,
+                max_retries=Config.SCHEDULER_MAX_RETRIES,
+                backoff_base=Config.SCHEDULER_BACKOFF_BASE,
+                backoff_max=Config.SCHEDULER_BACKOFF_MAX,
+            )
+        return _schedulers[backend]
+
+
+def get_scheduler_stats() -> Dict[str, Dict[str, Any]]:
+    """Return the stats of every scheduler created so far, by backend."""
+    with _schedulers_lock:
+        schedulers = dict(_schedulers)
+    return {name: scheduler.stats() for name, scheduler in schedulers.items()}
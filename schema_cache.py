@@ -0,0 +1,144 @@
+"""Process-wide, TTL-evicting cache for BigQuery dataset schemas."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Set
+
+
+class SchemaCache:
+    """Thread-safe LRU cache with TTL expiry and background refresh-ahead.
+
+    Entries younger than ``refresh_ratio * ttl`` are served as-is. Entries between
+    that point and ``max_age`` are still served, but a background thread reloads
+    them so the next request sees fresh data without waiting; past the TTL this
+    is stale-while-revalidate, so an idle gap never makes a request wait. Entries
+    older than ``max_age`` are treated as misses and reloaded synchronously.
+    ``max_age`` defaults to the TTL, so nothing older than the TTL is served.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[Hashable], Any],
+        ttl: float,
+        max_entries: int = 32,
+        refresh_ratio: float = 0.8,
+        max_age: Optional[float] = None,
+    ):
+        self._loader = loader
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.refresh_ratio = refresh_ratio
+        self.max_age = max(ttl, max_age) if max_age is not None else ttl
+
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+        self._refreshing: Set[Hashable] = set()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any:
+        """Return the cached value for ``key``, loading it if missing or past ``max_age``.
+
+        Raises:
+            Whatever the loader raises when a synchronous load fails.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, loaded_at = entry
+                age = now - loaded_at
+                if age < self.max_age:
+                    self.hits += 1
+                    if age >= self.ttl:
+                        self.stale_hits += 1
+                    self._entries.move_to_end(key)
+                    if age >= self.ttl * self.refresh_ratio:
+                        self._schedule_refresh(key)
+                    return value
+            self.misses += 1
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Only one caller per key performs the load; the others wait and reuse it.
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and time.monotonic() - entry[1] < self.ttl:
+                    self._entries.move_to_end(key)
+                    return entry[0]
+            value = self._loader(key)
+            self._store(key, value)
+            return value
+
+    def is_fresh(self, key: Hashable) -> bool:
+        """Whether ``get(key)`` would be served from the cache without waiting on a load."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and time.monotonic() - entry[1] < self.max_age
+
+    def peek(self, key: Hashable) -> Any:
+        """Return the stored value for ``key`` even if expired, without loading or counting it."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] if entry is not None else None
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Drop one entry, or every entry when ``key`` is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current occupancy."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "refreshes": self.refreshes,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "max_age": self.max_age,
+            }
+
+    def _store(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted_key, _ = self._entries.popitem(last=False)
+                self._key_locks.pop(evicted_key, None)
+                self.evictions += 1
+
+    def _schedule_refresh(self, key: Hashable):
+        # Caller must hold self._lock.
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        thread = threading.Thread(target=self._refresh, args=(key,), daemon=True)
+        thread.start()
+
+    def _refresh(self, key: Hashable):
+        try:
+            value = self._loader(key)
+            self._store(key, value)
+            with self._lock:
+                self.refreshes += 1
+        except Exception:
+            # Keep serving the existing entry; it is reloaded synchronously once past max_age.
+            pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
@@ -0,0 +1,126 @@
+"""Prompt serialization of dataset schemas, with date-sharded tables collapsed."""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
+# A date shard such as events_20240101: a non-digit prefix, then YYYYMM[DD[HH]]
+_SHARD_NAME = re.compile(r"^(.*\D)(\d{6}|\d{8}|\d{10})$")
+
+
+@dataclass
+class SchemaEntry:
+    """One item of the prompt schema: a table, or date shards with identical columns."""
+    # The table name, or a wildcard such as "events_*" for a shard group
+    name: str
+    # Member tables in suffix order; a single table for ordinary entries
+    tables: List[str]
+    # INFORMATION_SCHEMA rows of the newest member (all members share its columns)
+    rows: List[Dict]
+
+    @property
+    def sharded(self) -> bool:
+        return len(self.tables) > 1
+
+    @property
+    def suffix_range(self) -> Tuple[str, str]:
+        """The first and last _TABLE_SUFFIX values of a shard group."""
+        prefix_length = len(self.name) - 1
+        return self.tables[0][prefix_length:], self.tables[-1][prefix_length:]
+
+
+def group_tables(tables: Dict[str, List[Dict]], min_shards: int = 2) -> Dict[str, SchemaEntry]:
+    """Collapse date shards with identical columns into wildcard entries.
+
+    Shards are grouped by name prefix, suffix length and column signature
+    (name, type, nullability). Groups smaller than ``min_shards`` stay as
+    separate tables; ``min_shards`` of 0 disables collapsing. When shards of one
+    prefix differ in columns, each signature becomes its own entry, keyed by
+    its suffix range so the keys stay unique.
+
+    Args:
+        tables: Table name to its INFORMATION_SCHEMA rows
+        min_shards: Smallest number of shards collapsed into one entry
+
+    Returns:
+        Entry key to entry, sorted by key
+    """
+    groups: Dict[Tuple, List[str]] = {}
+    singles: List[str] = []
+    for table in sorted(tables):
+        match = _SHARD_NAME.match(table) if min_shards else None
+        if match is None:
+            singles.append(table)
+            continue
+        prefix, suffix = match.groups()
+        signature = tuple((row['column_name'], row['data_type'], row['is_nullable']) for row in tables[table])
+        groups.setdefault((prefix, len(suffix), signature), []).append(table)
+
+    entries = {table: SchemaEntry(table, [table], tables[table]) for table in singles}
+    collapsed: Dict[str, List[SchemaEntry]] = {}
+    for (prefix, _, _), members in groups.items():
+        if len(members) < max(min_shards, 2):
+            entries.update((table, SchemaEntry(table, [table], tables[table])) for table in members)
+            continue
+        entry = SchemaEntry(f"{prefix}*", members, tables[members[-1]])
+        collapsed.setdefault(entry.name, []).append(entry)
+    for name, group in collapsed.items():
+        for entry in group:
+            first, last = entry.suffix_range
+            entries[name if len(group) == 1 else f"{name}[{first}..{last}]"] = entry
+    return dict(sorted(entries.items()))
+
+
+def format_entry(entry: SchemaEntry, compact: bool = True) -> str:
+    """Format one entry's block of the schema text.
+
+    The compact encoding lists every column on a single line as ``name TYPE``,
+    marking only required columns; the verbose one uses a line per column.
+    """
+    title = f"\nTable: {entry.name}"
+    if entry.sharded:
+        first, last = entry.suffix_range
+        title += f" [{len(entry.tables)} shards, _TABLE_SUFFIX {first}..{last}]"
+    if compact:
+        columns = ", ".join(
+            f"{row['column_name']} {row['data_type']}" + (" NOT NULL" if row['is_nullable'] != 'YES' else "")
+            for row in entry.rows
+        )
+        return f"{title}\n  {columns}"
+    lines = [title, "Columns:"]
+    for row in entry.rows:
+        nullable = "NULL" if row['is_nullable'] == 'YES' else "NOT NULL"
+        lines.append(f"  - {row['column_name']} ({row['data_type']}, {nullable})")
+    return "\n".join(lines)
+
+
+def join_blocks(entries: Iterable[SchemaEntry], blocks: Iterable[str], compact: bool = True) -> str:
+    """Assemble formatted entry blocks under the schema header.
+
+    The header explains the compact encoding and, when shard groups are
+    present, how to query them.
+    """
+    lines = ["Database Schema:", "================"]
+    if compact:
+        lines.append("Columns are listed as `name TYPE`; NOT NULL marks required columns.")
+    example = next((entry for entry in entries if entry.sharded), None)
+    if example is not None:
+        lines.append(
+            f"Entries ending in * stand for date-sharded tables with identical columns: query "
+            f"e.g. {example.name} filtered on _TABLE_SUFFIX, or name one shard such as {example.tables[-1]}."
+        )
+    lines.extend(blocks)
+    return "\n".join(lines)
+
+
+def entry_documents(entries: Dict[str, SchemaEntry]) -> Dict[str, str]:
+    """Build one retrieval document per entry from its name, columns and descriptions."""
+    documents = {}
+    for key, entry in entries.items():
+        parts = [entry.name.rstrip("*")]
+        for row in entry.rows:
+            parts.append(row['column_name'])
+            if row.get('description'):
+                parts.append(row['description'])
+        documents[key] = " ".join(parts)
+    return documents
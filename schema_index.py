@@ -0,0 +1,81 @@
+"""In-memory lookup structures derived from a fetched dataset schema."""
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set
+
+from schema_format import SchemaEntry
+from schema_retrieval import SchemaRetriever
+from schema_snapshot import TableSnapshot
+
+# A field declaration inside a STRUCT<...> type: "name TYPE"
+_STRUCT_FIELD = re.compile(r"[<,]\s*`?(\w+)`?\s+[A-Z]")
+
+
+class SchemaIndex:
+    """Precomputed table and column lookups for one dataset.
+
+    Built once from the INFORMATION_SCHEMA rows that were already fetched for the
+    prompt, so validation never needs another API round trip.
+    """
+
+    def __init__(self, schema_rows: Iterable[Dict] = ()):
+        self.columns: Dict[str, List[str]] = {}
+        self.nested_fields: Dict[str, Set[str]] = {}
+        self._add_rows(schema_rows)
+
+    def patched(self, schema_rows: Iterable[Dict], removed_tables: Iterable[str]) -> "SchemaIndex":
+        """Return a copy with ``removed_tables`` dropped and ``schema_rows`` added.
+
+        To replace a table, list it in ``removed_tables`` and pass its new rows.
+        Unchanged tables share their column lists with this index, which is left
+        untouched because validators in other sessions may be reading it.
+        """
+        removed = set(removed_tables)
+        index = SchemaIndex()
+        index.columns = {table: columns for table, columns in self.columns.items() if table not in removed}
+        index.nested_fields = {
+            table: fields for table, fields in self.nested_fields.items() if table not in removed
+        }
+        index._add_rows(schema_rows)
+        return index
+
+    def _add_rows(self, schema_rows: Iterable[Dict]):
+        for row in schema_rows:
+            self.columns.setdefault(row['table_name'], []).append(row['column_name'])
+            if 'STRUCT<' in (row.get('data_type') or ''):
+                fields = _STRUCT_FIELD.findall(row['data_type'])
+                self.nested_fields.setdefault(row['table_name'], set()).update(fields)
+        self.tables = frozenset(self.columns)
+        self._tables_by_lower = {name.lower(): name for name in self.columns}
+
+    def __contains__(self, table_name: str) -> bool:
+        return table_name in self.tables
+
+    def __len__(self) -> int:
+        return len(self.tables)
+
+    def resolve(self, table_name: str) -> Optional[str]:
+        """Return the canonical table name for a case-insensitive match, if any."""
+        return self._tables_by_lower.get(table_name.lower())
+
+    def table_names(self) -> List[str]:
+        """Return all table names in sorted order."""
+        return sorted(self.tables)
+
+
+@dataclass
+class DatasetSchema:
+    """A fetched dataset schema: raw rows, prompt text and derived indexes."""
+    rows: List[Dict]
+    text: str
+    index: SchemaIndex = field(default_factory=SchemaIndex)
+    retriever: Optional[SchemaRetriever] = None
+    # Estimated prompt tokens of each entry's formatted block
+    table_tokens: Dict[str, int] = field(default_factory=dict)
+    # Each entry's formatted block, reused by incremental refreshes
+    table_blocks: Dict[str, str] = field(default_factory=dict)
+    # Each concrete table's snapshot
+    tables: Dict[str, TableSnapshot] = field(default_factory=dict)
+    # Prompt entries: single tables, or date shards collapsed under a wildcard
+    entries: Dict[str, SchemaEntry] = field(default_factory=dict)
@@ -0,0 +1,110 @@
+"""Local BM25 retrieval over table and column metadata for prompt schema pruning."""
+
+import math
+import re
+from collections import Counter
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+_CAMEL_BOUNDARY = re.compile(r"([a-z0-9])([A-Z])")
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text and identifiers (snake_case, camelCase) into lower-case terms.
+
+    A light plural stem maps e.g. "orders" and "order" to the same term.
+    """
+    terms = []
+    for token in _TOKEN.findall(_CAMEL_BOUNDARY.sub(r"\1 \2", text).lower()):
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        terms.append(token)
+    return terms
+
+
+class SchemaRetriever:
+    """Scores tables against a question with precomputed sparse BM25 postings.
+
+    Each table is one document made of its name, its column names and any
+    column descriptions. The per-term BM25 weights are computed once and kept
+    as postings (term -> {table: weight}), so memory grows with the distinct
+    terms of each table rather than vocabulary x tables, and scoring a question
+    sums the postings of its terms.
+    """
+
+    def __init__(
+        self,
+        documents: Dict[str, str],
+        k1: float = 1.2,
+        b: float = 0.75,
+        tokenized: Optional[Dict[str, List[str]]] = None,
+    ):
+        self.k1 = k1
+        self.b = b
+        self.tables: List[str] = list(documents)
+        tokenized = tokenized or {}
+        # Kept so a patched retriever can skip re-tokenizing unchanged tables
+        self.terms: Dict[str, List[str]] = {
+            table: tokenized[table] if table in tokenized else tokenize(documents[table])
+            for table in self.tables
+        }
+        # Ties keep the documents' order
+        self._positions = {table: position for position, table in enumerate(self.tables)}
+
+        term_counts = {table: Counter(terms) for table, terms in self.terms.items()}
+        average_length = sum(len(terms) for terms in self.terms.values()) / len(self.tables) if self.tables else 0.0
+        doc_freq = Counter(term for counts in term_counts.values() for term in counts)
+        idf = {
+            term: math.log1p((len(self.tables) - freq + 0.5) / (freq + 0.5))
+            for term, freq in doc_freq.items()
+        }
+        self.postings: Dict[str, Dict[str, float]] = {}
+        for table, counts in term_counts.items():
+            norm = k1 * (1 - b + b * len(self.terms[table]) / max(average_length, 1e-9))
+            for term, count in counts.items():
+                self.postings.setdefault(term, {})[table] = idf[term] * count * (k1 + 1) / (count + norm)
+
+    def patched(self, documents: Dict[str, str], changed: Iterable[str]) -> "SchemaRetriever":
+        """Return a retriever over ``documents``, reusing this one's terms for tables not in ``changed``.
+
+        BM25 weights depend on every document, so the postings are always
+        rebuilt; only tokenization, the slow part, is skipped.
+        """
+        changed = set(changed)
+        reused = {table: terms for table, terms in self.terms.items() if table not in changed}
+        return SchemaRetriever(documents, self.k1, self.b, tokenized=reused)
+
+    def rank(self, question: str) -> List[Tuple[str, float]]:
+        """Return (table, score) pairs with a positive score, best first."""
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(question)):
+            for table, weight in self.postings.get(term, {}).items():
+                scores[table] = scores.get(table, 0.0) + weight
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], self._positions[item[0]]))
+        return [(table, score) for table, score in ranked if score > 0]
+
+
+def select_within_budget(
+    ranked: Iterable[Tuple[Hashable, float]],
+    tokens: Dict[Hashable, int],
+    top_k: int,
+    token_budget: int,
+) -> List[Hashable]:
+    """Take ranked keys best first, skipping any that would overflow ``token_budget``."""
+    selected = []
+    used_tokens = 0
+    for key, _ in ranked:
+        cost = tokens.get(key, 0)
+        if used_tokens + cost > token_budget:
+            continue
+        selected.append(key)
+        used_tokens += cost
+        if len(selected) >= top_k:
+            break
+    return selected
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token estimate (~4 characters per token)."""
+    return len(text) // 4 + 1
+
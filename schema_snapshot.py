@@ -0,0 +1,110 @@
+"""Per-table schema snapshots that let schema refreshes re-fetch only changed tables."""
+
+import gzip
+import json
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from config import Config
+
+# Bumped whenever the file layout changes; older files are ignored
+_FORMAT_VERSION = 1
+
+
+@dataclass
+class TableSnapshot:
+    """One table's INFORMATION_SCHEMA.COLUMNS rows as of its last-modified time."""
+    # Milliseconds since the epoch; None for a table with columns but no __TABLES__ entry
+    modified: Optional[int]
+    rows: List[Dict]
+
+
+def diff_tables(
+    previous: Dict[str, TableSnapshot],
+    versions: Dict[str, int],
+) -> Tuple[Set[str], Set[str]]:
+    """Compare a snapshot with current last-modified times.
+
+    Tables saved without a version have nothing to compare against, so they
+    are neither changed nor dropped here; only a full read refreshes them.
+
+    Returns:
+        tuple: (tables created or modified since the snapshot, tables dropped since it)
+    """
+    changed = {
+        table for table, modified in versions.items()
+        if table not in previous or previous[table].modified != modified
+    }
+    dropped = {
+        table for table, snapshot in previous.items()
+        if table not in versions and snapshot.modified is not None
+    }
+    return changed, dropped
+
+
+class SchemaSnapshotStore:
+    """Gzipped JSON snapshot files, one per (project, dataset).
+
+    Writes go to a temporary file that is renamed into place, so concurrent
+    processes sharing the directory never read a partial snapshot.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, project_id: str, dataset_id: str) -> str:
+        return os.path.join(self.directory, f"{project_id}.{dataset_id}.json.gz")
+
+    def load(self, project_id: str, dataset_id: str) -> Optional[Dict[str, TableSnapshot]]:
+        """Return the saved tables, or None if there is no usable snapshot."""
+        try:
+            with open(self.path(project_id, dataset_id), "rb") as handle:
+                data = json.loads(gzip.decompress(handle.read()))
+        except (OSError, ValueError, EOFError):
+            return None
+        if data.get("format") != _FORMAT_VERSION:
+            return None
+        return {
+            table: TableSnapshot(modified=entry["modified"], rows=entry["rows"])
+            for table, entry in data["tables"].items()
+        }
+
+    def save(self, project_id: str, dataset_id: str, tables: Dict[str, TableSnapshot]):
+        """Replace the saved snapshot with ``tables``."""
+        data = {
+            "format": _FORMAT_VERSION,
+            "tables": {
+                table: {"modified": snapshot.modified, "rows": snapshot.rows}
+                for table, snapshot in tables.items()
+            },
+        }
+        # json.dumps uses the C encoder; json.dump to a stream does not
+        payload = gzip.compress(json.dumps(data, default=str).encode("utf-8"), compresslevel=1)
+        handle = tempfile.NamedTemporaryFile(dir=self.directory, suffix=".tmp", delete=False)
+        try:
+            handle.write(payload)
+            handle.close()
+            os.replace(handle.name, self.path(project_id, dataset_id))
+        except BaseException:
+            handle.close()
+            os.unlink(handle.name)
+            raise
+
+
+_snapshot_store: Optional[SchemaSnapshotStore] = None
+_snapshot_store_lock = threading.Lock()
+
+
+def get_snapshot_store() -> SchemaSnapshotStore:
+    """Return the process-wide snapshot store configured from ``Config``."""
+    global _snapshot_store
+    if _snapshot_store is None:
+        with _snapshot_store_lock:
+            if _snapshot_store is None:
+                directory = Config.SCHEMA_SNAPSHOT_DIR or os.path.join(tempfile.gettempdir(), "bq_schema_snapshots")
+                _snapshot_store = SchemaSnapshotStore(directory)
+    return _snapshot_store
@@ -0,0 +1,176 @@
+"""Cache of generated SQL keyed by normalized question and schema fingerprint."""
+
+import hashlib
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence
+
+from config import Config
+
+_DROPPED_PUNCTUATION = re.compile(r"[^\w\s<>=!%'\".,()*/+-]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a question so trivially different phrasings share a cache entry.
+
+    Lower-cases, drops punctuation that does not change meaning (keeping
+    comparison and arithmetic operators, parentheses, quotes and decimal
+    points) and collapses whitespace.
+    """
+    normalized = _DROPPED_PUNCTUATION.sub(" ", question.lower())
+    normalized = _WHITESPACE.sub(" ", normalized)
+    return normalized.strip(" .,!")
+
+
+def schema_fingerprint(schema_text: str) -> str:
+    """Return a short stable hash of the schema text shown to the LLM."""
+    return hashlib.sha256(schema_text.encode("utf-8")).hexdigest()[:16]
+
+
+class SQLCache:
+    """Thread-safe LRU/TTL cache of generated SQL with optional SQLite persistence.
+
+    The in-memory layer serves repeat questions within a process. When a
+    ``db_path`` is given, entries are also written to SQLite so they survive
+    restarts and are shared by every Streamlit worker on the host.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 1000, db_path: Optional[str] = None):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.db_path = db_path
+
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sql_cache ("
+                "key TEXT PRIMARY KEY, sql TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(
+        question: str,
+        schema_text: str,
+        provider: str,
+        model_name: str,
+        temperature: float,
+        schema_prefixes: Sequence[str] = (),
+    ) -> str:
+        """Build the cache key for a question asked against a schema with a given model.
+
+        The dataset prefixes are part of the key because the generated SQL names
+        them: two datasets with identical schema text must not share entries.
+        """
+        parts = [
+            normalize_question(question),
+            schema_fingerprint(schema_text),
+            provider,
+            model_name,
+            repr(temperature),
+            ",".join(sorted(schema_prefixes)),
+        ]
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached SQL for ``key``, or None if missing or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                sql, created_at = entry
+                if now - created_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return sql
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT sql, created_at FROM sql_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[1] < self.ttl:
+                    self._store(key, row[0], row[1])
+                    self.hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, sql: str):
+        """Store generated SQL under ``key``."""
+        created_at = time.time()
+        with self._lock:
+            self._store(key, sql, created_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO sql_cache (key, sql, created_at) VALUES (?, ?, ?)",
+                    (key, sql, created_at),
+                )
+                self._db.execute("DELETE FROM sql_cache WHERE created_at < ?", (created_at - self.ttl,))
+                self._db.commit()
+
+    def clear(self):
+        """Drop every entry, including persisted ones."""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM sql_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit rate, occupancy and approximate memory use."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            memory_bytes = sum(
+                sys.getsizeof(key) + sys.getsizeof(sql) for key, (sql, _) in self._entries.items()
+            )
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "memory_bytes": memory_bytes,
+                "persistent": self._db is not None,
+            }
+
+    def _store(self, key: str, sql: str, created_at: float):
+        # Caller must hold self._lock.
+        self._entries[key] = (sql, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+_sql_cache: Optional[SQLCache] = None
+_sql_cache_lock = threading.Lock()
+
+
+def get_sql_cache() -> SQLCache:
+    """Return the process-wide SQL cache configured from ``Config``."""
+    global _sql_cache
+    if _sql_cache is None:
+        with _sql_cache_lock:
+            if _sql_cache is None:
+                _sql_cache = SQLCache(
+                    ttl=Config.SQL_CACHE_TTL,
+                    max_entries=Config.SQL_CACHE_MAX_ENTRIES,
+                    db_path=Config.SQL_CACHE_PATH or None,
+                )
+    return _sql_cache
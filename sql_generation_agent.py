@@ -1,65 +1,243 @@
-import streamlit as st
+import contextvars
 import os
-from typing import Dict, Any, Optional
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.messages import SystemMessage, HumanMessage
-from langchain_core.output_parsers import JsonOutputParser
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Any, List, Optional, Sequence, Tuple, Union
 from models import BigQuerySQL
 from config import Config
+from schema_retrieval import estimate_tokens
+from scheduler import get_scheduler
+from sql_cache import SQLCache, get_sql_cache
+import tracing
+
+
+# LLM clients and prompt chains are expensive to build and hold HTTP connection
+# pools, so they are shared across Streamlit reruns and sessions per configuration.
+# LangChain and the provider SDKs are likewise imported on first use, keeping
+# them out of process startup.
+_llm_instances: Dict[Tuple, Any] = {}
+_chains: Dict[Tuple, Any] = {}
+_llm_lock = threading.Lock()
+
+
+class SQLGenerationError(Exception):
+    """Raised when the LLM cannot be configured or does not return a usable query."""
 
 
 class SQLGenerationAgent:
-    """Handles AI-powered SQL query generation using configurable LLMs."""
+    """Handles AI-powered SQL query generation using configurable LLMs.
+    
+    The agent has no UI side effects: failures raise SQLGenerationError and
+    progress is reported through optional callbacks, so it can be driven by the
+    Streamlit app, the batch runner or any other client.
+    """
 
-    def __init__(self, schema_prefix: str):
-        self.schema_prefix = schema_prefix
+    def __init__(self, schema_prefix: Union[str, Sequence[str]]):
+        # One "`project.dataset." prefix per dataset the queries may read; the first is the default
+        self.schema_prefixes = [schema_prefix] if isinstance(schema_prefix, str) else list(schema_prefix)
+        self.schema_prefix = self.schema_prefixes[0]
         self.model_name = Config.MODEL_NAME or "gemini-2.5-flash"  # Default model
         self.temperature = Config.TEMPERATURE
         self.provider = Config.LLM_PROVIDER or "google"  # Default provider
 
         # Validate configuration
         if not self.model_name:
-            st.error("MODEL_NAME must be set in the .env file.")
-            st.stop()
+            raise ValueError("MODEL_NAME must be set in the .env file.")
         
         if not self.provider:
-            st.error("LLM_PROVIDER must be set in the .env file.")
-            st.stop()
+            raise ValueError("LLM_PROVIDER must be set in the .env file.")
 
-    def generate_sql_query(self, user_question: str, schema_text: str) -> Optional[str]:
-        """Uses LangChain and a configurable LLM to generate a SQL query."""
-        if not self._validate_api_key():
-            return None
+    def generate_sql_query(
+        self,
+        user_question: str,
+        schema_text: str,
+        use_cache: bool = True,
+        on_text: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        """Uses LangChain and a configurable LLM to generate a SQL query.
+        
+        Previously validated SQL for the same normalized question, schema and
+        model is returned from the shared SQL cache without calling the LLM.
+        LLM calls go through the process-wide "llm" scheduler, so an identical
+        prompt already in flight for another session is answered by that call.
+        
+        Args:
+            user_question: The user's natural-language question
+            schema_text: Schema to include in the prompt
+            use_cache: Whether to consult the shared SQL cache first
+            on_text: Called with the accumulated response text as tokens stream in
+        
+        Raises:
+            SQLGenerationError: If the LLM is misconfigured or returns no query
+        """
+        if use_cache:
+            cached_sql = get_sql_cache().get(self._cache_key(user_question, schema_text))
+            tracing.annotate(sql_cache_hit=cached_sql is not None)
+            if cached_sql:
+                return cached_sql
+
+        self._check_api_key()
+
+        with tracing.span("prompt_build"):
+            chain = self._get_chain()
+            human_message = self._create_human_message(user_question, schema_text)
+            tracing.annotate(prompt_tokens=estimate_tokens(self._create_system_message() + human_message))
+
+        return self._execute_chain(chain, human_message, on_text)
+
+    def generate_sql_candidates(
+        self,
+        user_question: str,
+        schema_text: str,
+        validator: Callable[[str], Tuple[bool, str]],
+        num_candidates: Optional[int] = None,
+    ) -> str:
+        """Generate several SQL candidates in parallel and return the first valid one.
+        
+        Candidates use increasing temperatures so they differ. Each is validated
+        as soon as it arrives; once one passes, the remaining requests are
+        cancelled (queued ones never start, streaming ones stop reading). If no
+        candidate passes, the first one generated is returned so the caller's
+        regeneration loop can repair it.
+        
+        Args:
+            user_question: The user's natural-language question
+            schema_text: Schema to include in the prompt
+            validator: Callable returning (is_valid, error_message) for a query;
+                it runs on worker threads
+            num_candidates: Number of parallel requests, defaults to Config.SPECULATIVE_CANDIDATES
+        
+        Raises:
+            SQLGenerationError: If no candidate produced a query
+        """
+        cached_sql = get_sql_cache().get(self._cache_key(user_question, schema_text))
+        tracing.annotate(sql_cache_hit=cached_sql is not None)
+        if cached_sql:
+            return cached_sql
 
-        # Initialize the appropriate LLM based on configuration
-        llm = self._initialize_llm()
+        self._check_api_key()
 
-        system_message = self._create_system_message()
+        num_candidates = max(1, num_candidates or Config.SPECULATIVE_CANDIDATES)
         human_message = self._create_human_message(user_question, schema_text)
+        # Build every chain up front on this thread, so configuration errors surface here
+        chains = [self._get_chain(temperature) for temperature in self._candidate_temperatures(num_candidates)]
+        cancelled = threading.Event()
 
-        prompt = ChatPromptTemplate.from_messages([
-            SystemMessage(content=system_message),
-            HumanMessage(content=human_message),
-        ])
+        def generate(candidate: int, chain) -> Optional[Dict[str, Any]]:
+            if cancelled.is_set():
+                return None
+            with tracing.span("llm_call", candidate=candidate):
+                return _stream_json(chain, human_message, cancelled=cancelled)
+
+        def generate_and_validate(candidate: int, chain) -> Tuple[Optional[str], bool]:
+            # Not coalesced: a cancelled candidate would hand its waiters no answer
+            response = get_scheduler("llm").run(lambda: generate(candidate, chain))
+            sql_query = response.get("query") if response else None
+            if not sql_query or cancelled.is_set():
+                return sql_query, False
+            return sql_query, validator(sql_query)[0]
+
+        first_generated = None
+        errors: List[str] = []
+        executor = ThreadPoolExecutor(max_workers=num_candidates, thread_name_prefix="sql-candidate")
+        try:
+            # Each worker runs in its own copy of this context, so its spans join the current trace
+            pending = {
+                executor.submit(contextvars.copy_context().run, generate_and_validate, candidate, chain)
+                for candidate, chain in enumerate(chains)
+            }
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        sql_query, is_valid = future.result()
+                    except Exception as e:
+                        errors.append(str(e))
+                        continue
+                    if is_valid:
+                        return sql_query
+                    first_generated = first_generated or sql_query
+        finally:
+            cancelled.set()
+            executor.shutdown(wait=False, cancel_futures=True)
 
-        parser = JsonOutputParser(pydantic_object=BigQuerySQL)
-        chain = prompt | llm | parser
+        if first_generated is None:
+            detail = errors[0] if errors else "no candidate returned a query"
+            raise SQLGenerationError(f"AI Agent failed to generate a valid SQL query. Error: {detail}")
+        return first_generated
 
-        return self._execute_chain(chain)
+    def _candidate_temperatures(self, num_candidates: int) -> List[float]:
+        """Spread candidate temperatures upward from the configured one, capped at 1.0."""
+        step = Config.SPECULATIVE_TEMPERATURE_STEP
+        return [min(1.0, self.temperature + i * step) for i in range(num_candidates)]
 
-    def _initialize_llm(self):
-        """Initialize the appropriate LLM based on the configured provider."""
+    def cache_sql(self, user_question: str, schema_text: str, sql_query: str):
+        """Remember SQL that passed validation so repeat questions skip the LLM."""
+        get_sql_cache().put(self._cache_key(user_question, schema_text), sql_query)
+
+    def _cache_key(self, user_question: str, schema_text: str) -> str:
+        """Build the SQL cache key for a question under the current model settings."""
+        return SQLCache.make_key(
+            user_question, schema_text, self.provider, self.model_name, self.temperature, self.schema_prefixes
+        )
+
+    def _llm_config_key(self, temperature: Optional[float] = None) -> Tuple:
+        """Identify the LLM configuration a cached client was built for."""
+        temperature = self.temperature if temperature is None else temperature
         if self.provider == "google":
+            return (self.provider, self.model_name, temperature, Config.GEMINI_API_KEY, Config.GOOGLE_BASE_URL)
+        return (self.provider, self.model_name, temperature, os.getenv("OPENAI_API_KEY"), Config.OPENAI_BASE_URL)
+
+    def _get_llm(self, temperature: Optional[float] = None):
+        """Return the process-wide LLM client for the current configuration."""
+        key = self._llm_config_key(temperature)
+        llm = _llm_instances.get(key)
+        if llm is None:
+            with _llm_lock:
+                llm = _llm_instances.get(key)
+                if llm is None:
+                    llm = self._initialize_llm(temperature)
+                    _llm_instances[key] = llm
+        return llm
+
+    def _get_chain(self, temperature: Optional[float] = None):
+        """Return the cached prompt | llm chain with the static system message baked in.
+        
+        Only the human message varies per question, so it is the sole template variable.
+        """
+        key = (self._llm_config_key(temperature), tuple(self.schema_prefixes))
+        chain = _chains.get(key)
+        if chain is None:
+            from langchain_core.messages import SystemMessage
+            from langchain_core.prompts import ChatPromptTemplate
+
+            prompt = ChatPromptTemplate.from_messages([
+                SystemMessage(content=self._create_system_message()),
+                ("human", "{human_message}"),
+            ])
+            chain = prompt | self._get_llm(temperature)
+            with _llm_lock:
+                chain = _chains.setdefault(key, chain)
+        return chain
+
+    def _initialize_llm(self, temperature: Optional[float] = None):
+        """Initialize the appropriate LLM based on the configured provider.
+        
+        Each provider SDK takes close to a second to import, so only the
+        configured one is loaded, on first use.
+        """
+        temperature = self.temperature if temperature is None else temperature
+        if self.provider == "google":
+            from langchain_google_genai import ChatGoogleGenerativeAI
+
             if not Config.GEMINI_API_KEY:
-                st.error("GEMINI_API_KEY must be set in the .env file for Google provider.")
-                st.stop()
+                raise SQLGenerationError("GEMINI_API_KEY must be set in the .env file for Google provider.")
             
             # Prepare parameters for Google LLM
             google_params = {
                 "model": self.model_name,
-                "temperature": self.temperature,
+                "temperature": temperature,
                 "google_api_key": Config.GEMINI_API_KEY,
                 "transport": "rest"
             }
@@ -71,15 +249,16 @@ class SQLGenerationAgent:
             return ChatGoogleGenerativeAI(**google_params)
             
         elif self.provider == "openai":
+            from langchain_openai import ChatOpenAI
+
             openai_api_key = os.getenv("OPENAI_API_KEY")
             if not openai_api_key:
-                st.error("OPENAI_API_KEY must be set in the .env file for OpenAI provider.")
-                st.stop()
+                raise SQLGenerationError("OPENAI_API_KEY must be set in the .env file for OpenAI provider.")
             
             # Prepare parameters for OpenAI LLM
             openai_params = {
                 "model": self.model_name,
-                "temperature": self.temperature,
+                "temperature": temperature,
                 "api_key": openai_api_key  # type: ignore
             }
             
@@ -89,29 +268,28 @@ class SQLGenerationAgent:
             
             return ChatOpenAI(**openai_params)
         else:
-            st.error(f"Unsupported LLM provider: {self.provider}. Supported providers are 'google' and 'openai'.")
-            st.stop()
+            raise SQLGenerationError(
+                f"Unsupported LLM provider: {self.provider}. Supported providers are 'google' and 'openai'."
+            )
 
-    def _validate_api_key(self) -> bool:
-        """Validate that the required API key is set based on the provider."""
+    def _check_api_key(self):
+        """Validate that the required API key is set based on the provider.
+        
+        Raises:
+            SQLGenerationError: If the key is missing or malformed
+        """
         if self.provider == "google":
             api_key = Config.GEMINI_API_KEY
             if not api_key:
-                st.error("GEMINI_API_KEY must be set in the .env file.")
-                return False
+                raise SQLGenerationError("GEMINI_API_KEY must be set in the .env file.")
             # Check if API key has the expected format (AIza followed by 33 characters)
             if not api_key.startswith("AIza") or len(api_key) < 30:
-                st.error("GEMINI_API_KEY appears to be invalid.")
-                return False
+                raise SQLGenerationError("GEMINI_API_KEY appears to be invalid.")
         elif self.provider == "openai":
-            api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key:
-                st.error("OPENAI_API_KEY must be set in the .env file.")
-                return False
+            if not os.getenv("OPENAI_API_KEY"):
+                raise SQLGenerationError("OPENAI_API_KEY must be set in the .env file.")
         else:
-            st.error(f"Unsupported LLM provider: {self.provider}")
-            return False
-        return True
+            raise SQLGenerationError(f"Unsupported LLM provider: {self.provider}")
 
     def _create_system_message(self) -> str:
         """Create the system message for the AI agent."""
@@ -124,9 +302,7 @@ class SQLGenerationAgent:
         1. Write a syntactically correct SQL query that best answers the user's question.
         2. Only use table and column names that appear in the provided schema — do not guess or invent names.
         3. Make the best possible guess about which table and columns to use *from the given list only*.
-        4. **Crucially, ensure the table name is correctly formatted with the full schema prefix**: 
-           For example, instead of `SELECT * FROM table_name`, use 
-           `SELECT * FROM {self.schema_prefix}table_name`
+        {self._table_prefix_rule()}
         5. Double-check that the table name you use actually exists in the schema provided.
         6. Return your output in a strict JSON format with one key: "query".
         ⚠️ Do NOT invent table or column names.
@@ -134,6 +310,18 @@ class SQLGenerationAgent:
         ⚠️ Do NOT include any explanation, notes, or comments — only the final JSON.
         """
 
+    def _table_prefix_rule(self) -> str:
+        """Rule 4 of the system message: how to qualify table names."""
+        if len(self.schema_prefixes) == 1:
+            return f"""4. **Crucially, ensure the table name is correctly formatted with the full schema prefix**: 
+           For example, instead of `SELECT * FROM table_name`, use 
+           `SELECT * FROM {self.schema_prefix}table_name`"""
+        examples = ", ".join(f"{prefix}table_name`" for prefix in self.schema_prefixes)
+        return f"""4. **Crucially, ensure every table name is formatted with the full prefix of its dataset**: 
+           The schema lists tables under a "Dataset:" heading per dataset. Reference each table with
+           the prefix of the dataset it is listed under, one of: {examples}.
+           Tables from different datasets can be joined in one query."""
+
     def _create_human_message(self, user_question: str, schema_text: str) -> str:
         """Create the human message containing the user question and schema."""
         return f"""
@@ -142,12 +330,100 @@ class SQLGenerationAgent:
         {schema_text}
         """
 
-    def _execute_chain(self, chain) -> Optional[str]:
-        """Execute the LangChain chain and return the generated SQL query."""
-        with st.spinner("Generating SQL query..."):
-            try:
-                response: Dict[str, Any] = chain.invoke({})
-                return response.get("query")
-            except Exception as e:
-                st.error(f"AI Agent failed to generate a valid SQL query. Error: {e}")
-                return None
\ No newline at end of file
+    def _execute_chain(self, chain, human_message: str, on_text: Optional[Callable[[str], None]] = None) -> str:
+        """Stream the chain's output and return the generated SQL query.
+        
+        The stream is closed as soon as the JSON object is complete instead of
+        waiting for the model to finish. Callers coalesced onto another
+        session's identical call get its result without streamed text.
+        """
+        key = (self._llm_config_key(), self._create_system_message(), human_message)
+
+        def call() -> Optional[Dict[str, Any]]:
+            with tracing.span("llm_call"):
+                return _stream_json(chain, human_message, on_text=on_text)
+
+        try:
+            response = get_scheduler("llm").run(call, key=key)
+        except Exception as e:
+            raise SQLGenerationError(f"AI Agent failed to generate a valid SQL query. Error: {e}") from e
+        sql_query = response.get("query") if response else None
+        if not sql_query:
+            raise SQLGenerationError("AI Agent returned a response without a SQL query.")
+        return sql_query
+
+
+def _stream_json(
+    chain,
+    human_message: str,
+    on_text: Optional[Callable[[str], None]] = None,
+    cancelled: Optional[threading.Event] = None,
+) -> Optional[Dict[str, Any]]:
+    """Stream a chain's output until the first JSON object is complete and parse it.
+    
+    Text after the object is ignored. Returns None if ``cancelled`` is set
+    before the object completes.
+    
+    Raises:
+        ValueError: If the stream ends before the object is complete
+    """
+    text = ""
+    end = -1
+    started = time.perf_counter()
+    for chunk in chain.stream({"human_message": human_message}):
+        if cancelled is not None and cancelled.is_set():
+            return None
+        if not text:
+            tracing.annotate(time_to_first_token=round(time.perf_counter() - started, 6))
+        text += _chunk_text(chunk)
+        if on_text is not None:
+            on_text(text)
+        end = _json_object_end(text)
+        if end != -1:
+            break
+    # The stream is closed early, so providers rarely report usage; estimate instead
+    tracing.annotate(completion_tokens=estimate_tokens(text))
+    if end == -1:
+        # The parser would otherwise accept the partial object, e.g. a cut-off query
+        raise ValueError(f"Response ended before its JSON object was complete: {text[-200:]!r}")
+    from langchain_core.output_parsers import JsonOutputParser
+
+    return JsonOutputParser(pydantic_object=BigQuerySQL).parse(text[:end])
+
+
+def _chunk_text(chunk) -> str:
+    """Extract the text of a streamed message chunk (string or content parts)."""
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+    parts = []
+    for part in content:
+        if isinstance(part, str):
+            parts.append(part)
+        elif isinstance(part, dict) and part.get("type") == "text":
+            parts.append(part.get("text", ""))
+    return "".join(parts)
+
+
+def _json_object_end(text: str) -> int:
+    """Return the index just past the first complete top-level JSON object, or -1."""
+    depth = 0
+    in_string = False
+    escaped = False
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}" and depth:
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return -1
@@ -0,0 +1,549 @@
+"""Local parse-and-bind validation of generated BigQuery SQL against the cached schema."""
+
+import difflib
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from schema_index import SchemaIndex
+
+_TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<ws>\s+)
+    |(?P<comment>--[^\n]*|\#[^\n]*|/\*.*?\*/)
+    |(?P<string>[rRbB]{0,2}(?:'''.*?'''|\"\"\".*?\"\"\"|'(?:[^'\\\n]|\\.)*'|"(?:[^"\\\n]|\\.)*"))
+    |(?P<quoted>`(?:[^`\\]|\\.)*`)
+    |(?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)
+    |(?P<param>@@?\w+)
+    |(?P<ident>[A-Za-z_][A-Za-z0-9_]*)
+    |(?P<op>.)
+    """,
+    re.DOTALL | re.VERBOSE,
+)
+
+# Reserved words, clause keywords, type names and date parts: never column references.
+_KEYWORDS = frozenset("""
+    ALL AND ANY ARRAY AS ASC ASSERT_ROWS_MODIFIED AT BETWEEN BY CASE CAST COLLATE CONTAINS CREATE CROSS
+    CUBE CURRENT DEFAULT DEFINE DESC DISTINCT ELSE END ENUM ESCAPE EXCEPT EXCLUDE EXISTS EXTRACT FALSE
+    FETCH FOLLOWING FOR FROM FULL GROUP GROUPING GROUPS HASH HAVING IF IGNORE IN INNER INTERSECT INTERVAL
+    INTO IS JOIN LATERAL LEFT LIKE LIMIT LOOKUP MERGE NATURAL NEW NO NOT NULL NULLS OF OFFSET ON OR ORDER
+    OUTER OVER PARTITION PRECEDING PROTO QUALIFY RANGE RECURSIVE RESPECT RIGHT ROLLUP ROWS SELECT SET
+    SOME STRUCT TABLESAMPLE THEN TO TREAT TRUE UNBOUNDED UNION UNNEST USING WHEN WHERE WINDOW WITH WITHIN
+    FIRST LAST ROW ORDINAL SAFE_OFFSET SAFE_ORDINAL REPLACE PIVOT UNPIVOT PERCENT SYSTEM SYSTEM_TIME VALUE
+    WITHOUT OPTIONS INCLUDE
+    INT64 INT SMALLINT INTEGER BIGINT TINYINT BYTEINT FLOAT64 FLOAT NUMERIC DECIMAL BIGNUMERIC BIGDECIMAL
+    BOOL BOOLEAN STRING BYTES DATE DATETIME TIME TIMESTAMP GEOGRAPHY JSON
+    YEAR QUARTER MONTH WEEK DAY HOUR MINUTE SECOND MILLISECOND MICROSECOND NANOSECOND DAYOFWEEK
+    DAYOFYEAR ISOWEEK ISOYEAR SUNDAY MONDAY TUESDAY WEDNESDAY THURSDAY FRIDAY SATURDAY
+    CURRENT_DATE CURRENT_DATETIME CURRENT_TIME CURRENT_TIMESTAMP _TABLE_SUFFIX _PARTITIONTIME _PARTITIONDATE
+""".split())
+
+# Functions that combine rows, so their values change when the input is sampled
+_AGGREGATE_FUNCTIONS = frozenset("""
+    ANY_VALUE APPROX_COUNT_DISTINCT APPROX_QUANTILES APPROX_TOP_COUNT APPROX_TOP_SUM ARRAY_AGG
+    ARRAY_CONCAT_AGG AVG BIT_AND BIT_OR BIT_XOR CORR COUNT COUNTIF COVAR_POP COVAR_SAMP LOGICAL_AND
+    LOGICAL_OR MAX MAX_BY MIN MIN_BY STDDEV STDDEV_POP STDDEV_SAMP STRING_AGG SUM VARIANCE VAR_POP VAR_SAMP
+""".split())
+
+# Pseudo-columns BigQuery adds to wildcard and ingestion-time partitioned tables
+_PSEUDO_COLUMNS = frozenset({"_TABLE_SUFFIX", "_PARTITIONTIME", "_PARTITIONDATE"})
+
+# Words that end a FROM item, so they can never be an implicit table alias.
+_CLAUSE_WORDS = frozenset("""
+    WHERE GROUP HAVING QUALIFY WINDOW ORDER LIMIT UNION INTERSECT EXCEPT JOIN INNER LEFT RIGHT FULL
+    CROSS OUTER ON USING FOR TABLESAMPLE PIVOT UNPIVOT WITH SELECT FROM AS NATURAL
+""".split())
+
+_VALUE_KINDS = ("ident", "quoted", "number", "string", "param")
+
+# Keywords that complete a value, so an identifier right after one is an implicit alias
+_VALUE_KEYWORDS = frozenset("""
+    END NULL TRUE FALSE CURRENT_DATE CURRENT_DATETIME CURRENT_TIME CURRENT_TIMESTAMP
+""".split())
+
+
+@dataclass
+class _Token:
+    kind: str
+    text: str
+    start: int
+    end: int
+
+    @property
+    def upper(self) -> str:
+        return self.text.upper() if self.kind == "ident" else ""
+
+    @property
+    def name(self) -> str:
+        """Identifier text with backticks removed."""
+        return self.text[1:-1] if self.kind == "quoted" else self.text
+
+
+@dataclass
+class SQLIssue:
+    """A single problem found while binding a query to the schema."""
+    code: str
+    message: str
+    name: str = ""
+    suggestion: Optional[str] = None
+
+    def __str__(self) -> str:
+        if self.suggestion:
+            return f"{self.message} Did you mean '{self.suggestion}'?"
+        return self.message
+
+
+@dataclass
+class _TableRef:
+    parts: List[str]
+    alias: Optional[str]
+    token_range: Tuple[int, int]
+
+
+@dataclass
+class TableReference:
+    """A base-table FROM item of a query."""
+    path: str
+    alias: Optional[str]
+    # Character offset just past the item and its alias
+    end: int
+
+
+@dataclass
+class QueryStructure:
+    """Facts about a query's shape that a rewrite of it has to respect."""
+    # Base tables read by the query; CTE references are excluded
+    tables: List[TableReference]
+    # Aggregate or window functions, GROUP BY, DISTINCT or PIVOT anywhere in the query
+    aggregated: bool
+    # ORDER BY on the outermost query
+    ordered: bool
+    # The outermost LIMIT and the character span of its row count
+    limit: Optional[int]
+    limit_span: Optional[Tuple[int, int]]
+    # Character offset just past the statement, before any trailing semicolon and comments
+    end: int
+    # Table-valued functions in FROM clauses, such as ML.PREDICT; the tables they read are not in ``tables``
+    table_functions: List[str]
+
+
+TABLE_ISSUE_CODES = frozenset({"no_tables", "unqualified_table", "unknown_dataset", "unknown_table"})
+
+
+class SQLValidator:
+    """Resolves every table and column reference in a query against schema indexes.
+
+    This is a tokenizer plus a lightweight FROM-clause parser, not a full SQL
+    grammar. It understands CTEs, aliases (explicit and implicit), joins,
+    comma joins, subqueries, UNNEST and backtick-quoted paths. Checks err on the
+    side of accepting a query: anything it cannot bind with confidence (struct
+    fields, columns of derived tables, keywords) is left for BigQuery to judge.
+    """
+
+    def __init__(self, indexes: Dict[Tuple[str, str], SchemaIndex], project_id: Optional[str] = None):
+        self.indexes = indexes
+        # Two-part dataset.table names resolve against the billing project only, as in BigQuery;
+        # defaults to the project of the first dataset
+        self.project_id = project_id if project_id is not None else next(iter(indexes), (None,))[0]
+
+    def validate(self, sql_query: str) -> List[SQLIssue]:
+        """Return the issues found in ``sql_query`` (empty when it binds cleanly)."""
+        tokens = _tokenize(sql_query)
+        if tokens is None:
+            return [SQLIssue("parse_error", "Query has unbalanced parentheses or an unterminated string.")]
+
+        cte_names = _cte_names(tokens)
+        table_refs, opaque_aliases, _ = _table_references(tokens)
+        issues: List[SQLIssue] = []
+
+        # alias or table name (lower-case) -> resolved column set (lower-case)
+        bound: Dict[str, Set[str]] = {}
+        scope_columns: Set[str] = set()
+        resolved_any = False
+        for ref in table_refs:
+            if len(ref.parts) == 1 and ref.parts[0].lower() in cte_names:
+                if ref.alias:
+                    opaque_aliases.add(ref.alias.lower())
+                continue
+            columns, issue = self._resolve_table(ref.parts)
+            if issue:
+                issues.append(issue)
+                continue
+            if columns is None:
+                # Resolved to something whose columns we do not track (e.g. INFORMATION_SCHEMA)
+                if ref.alias:
+                    opaque_aliases.add(ref.alias.lower())
+                continue
+            resolved_any = True
+            scope_columns |= columns
+            bound[ref.parts[-1].lower()] = columns
+            bound[".".join(ref.parts).lower()] = columns
+            if ref.alias:
+                bound[ref.alias.lower()] = columns
+
+        if not table_refs:
+            issues.append(SQLIssue("no_tables", "No table references found in query."))
+        if issues or not resolved_any:
+            return issues
+
+        # PIVOT/UNPIVOT invent output column names from data values
+        check_unqualified = not any(token.upper in ("PIVOT", "UNPIVOT") for token in tokens)
+        skip = set()
+        for ref in table_refs:
+            skip.update(range(*ref.token_range))
+        aliases = _alias_definitions(tokens) | opaque_aliases | cte_names | set(bound)
+
+        for run in _name_runs(tokens, skip):
+            parts = [tokens[i].name for i in run]
+            first = parts[0].lower()
+            if len(parts) > 1:
+                if first in bound:
+                    column = parts[1]
+                    if column.upper() not in _PSEUDO_COLUMNS and column.lower() not in bound[first]:
+                        issues.append(SQLIssue(
+                            "unknown_column",
+                            f"Column '{column}' does not exist in '{parts[0]}'.",
+                            name=f"{parts[0]}.{column}",
+                            suggestion=_closest(column, bound[first]),
+                        ))
+                elif first not in aliases and first not in scope_columns:
+                    issues.append(SQLIssue(
+                        "unknown_alias",
+                        f"'{parts[0]}' in '{'.'.join(parts)}' is not a table, alias or column in the query.",
+                        name=parts[0],
+                        suggestion=_closest(parts[0], aliases),
+                    ))
+            elif check_unqualified and first not in scope_columns and first not in aliases:
+                issues.append(SQLIssue(
+                    "unknown_column",
+                    f"Column '{parts[0]}' does not exist in any table used by the query.",
+                    name=parts[0],
+                    suggestion=_closest(parts[0], scope_columns),
+                ))
+
+        # Report each distinct problem once
+        unique = {}
+        for issue in issues:
+            unique.setdefault((issue.code, issue.name.lower()), issue)
+        return list(unique.values())
+
+    def _resolve_table(self, parts: List[str]) -> Tuple[Optional[Set[str]], Optional[SQLIssue]]:
+        """Resolve a table path to its lower-cased column set, or an issue."""
+        if any(part.upper() == "INFORMATION_SCHEMA" for part in parts):
+            return None, None
+        path = ".".join(parts)
+        if len(parts) == 1:
+            for index in self.indexes.values():
+                if _match_table(index, parts[0]):
+                    return None, SQLIssue(
+                        "unqualified_table",
+                        f"Table '{path}' must include its full `project.dataset.table` path.",
+                        name=path,
+                    )
+            return None, self._unknown_table(path, parts[0])
+
+        if len(parts) == 2:
+            candidates = [key for key in self.indexes if key == (self.project_id, parts[0])]
+        else:
+            candidates = [key for key in self.indexes if key == (parts[-3], parts[-2])]
+        if not candidates:
+            other_projects = [key[0] for key in self.indexes if len(parts) == 2 and key[1] == parts[0]]
+            if other_projects:
+                return None, SQLIssue(
+                    "unknown_dataset",
+                    f"Dataset '{parts[0]}' in '{path}' is not in the billing project '{self.project_id}'; "
+                    f"use `{other_projects[0]}.{path}`.",
+                    name=path,
+                )
+            return None, SQLIssue(
+                "unknown_dataset",
+                f"Dataset '{'.'.join(parts[:-1])}' in '{path}' is not one of the available datasets.",
+                name=path,
+            )
+
+        for key in candidates:
+            tables = _match_table(self.indexes[key], parts[-1])
+            if tables:
+                index = self.indexes[key]
+                columns = set()
+                for table in tables:
+                    # Nested STRUCT field names become columns once UNNESTed
+                    columns.update(column.lower() for column in index.columns[table])
+                    columns.update(field.lower() for field in index.nested_fields.get(table, ()))
+                return columns, None
+        return None, self._unknown_table(path, parts[-1])
+
+    def _unknown_table(self, path: str, table_name: str) -> SQLIssue:
+        known = set()
+        suggestion = None
+        for index in self.indexes.values():
+            known.update(index.tables)
+            suggestion = suggestion or index.resolve(table_name)
+        return SQLIssue(
+            "unknown_table",
+            f"Table '{path}' does not exist.",
+            name=path,
+            suggestion=suggestion or _closest(table_name, known),
+        )
+
+
+def format_issues(issues: List[SQLIssue]) -> str:
+    """Render issues as one line each, for users and regeneration prompts."""
+    return "\n".join(f"- {issue}" for issue in issues)
+
+
+def analyze_query(sql_query: str) -> Optional[QueryStructure]:
+    """Describe the tables, aggregation, ordering and row limit of a query.
+
+    Returns:
+        The query's structure, or None if it cannot be tokenized
+    """
+    tokens = _tokenize(sql_query)
+    if tokens is None:
+        return None
+    cte_names = _cte_names(tokens)
+    table_refs, _, table_functions = _table_references(tokens)
+    tables = [
+        TableReference(".".join(ref.parts), ref.alias, tokens[ref.token_range[1] - 1].end)
+        for ref in table_refs
+        if not (len(ref.parts) == 1 and ref.parts[0].lower() in cte_names)
+    ]
+
+    aggregated = False
+    ordered = False
+    limit = limit_span = None
+    depth = 0
+    for i, token in enumerate(tokens):
+        if token.kind == "op":
+            depth += {"(": 1, ")": -1}.get(token.text, 0)
+            continue
+        if token.upper in _AGGREGATE_FUNCTIONS and _is_op(tokens, i + 1, "("):
+            aggregated = True
+        elif token.upper in ("DISTINCT", "OVER", "PIVOT") or (
+            token.upper == "GROUP" and i + 1 < len(tokens) and tokens[i + 1].upper == "BY"
+        ):
+            # IS [NOT] DISTINCT FROM is a comparison, not deduplication
+            aggregated = aggregated or not (token.upper == "DISTINCT" and tokens[i - 1].upper in ("IS", "NOT"))
+        if depth:
+            continue
+        if token.upper == "ORDER" and i + 1 < len(tokens) and tokens[i + 1].upper == "BY":
+            ordered = True
+        elif token.upper == "LIMIT" and i + 1 < len(tokens) and tokens[i + 1].kind == "number":
+            limit = int(float(tokens[i + 1].text))
+            limit_span = (tokens[i + 1].start, tokens[i + 1].end)
+    statement = tokens[:-1] if tokens and _is_op(tokens, len(tokens) - 1, ";") else tokens
+    end = statement[-1].end if statement else 0
+    return QueryStructure(tables, aggregated, ordered, limit, limit_span, end, table_functions)
+
+
+def _match_table(index: SchemaIndex, table_name: str) -> List[str]:
+    """Return the index tables a (possibly wildcard) table name refers to."""
+    if table_name.endswith("*"):
+        prefix = table_name[:-1]
+        return [table for table in index.tables if table.startswith(prefix)]
+    return [table_name] if table_name in index else []
+
+
+def _closest(name: str, candidates) -> Optional[str]:
+    by_lower = {candidate.lower(): candidate for candidate in candidates}
+    matches = difflib.get_close_matches(name.lower(), list(by_lower), n=1, cutoff=0.75)
+    return by_lower[matches[0]] if matches else None
+
+
+def _tokenize(sql_query: str) -> Optional[List[_Token]]:
+    """Split SQL into tokens, dropping whitespace and comments. None if malformed."""
+    tokens = []
+    depth = 0
+    for match in _TOKEN_PATTERN.finditer(sql_query):
+        kind = match.lastgroup
+        if kind in ("ws", "comment"):
+            continue
+        text = match.group()
+        if kind == "op":
+            if text in "'\"`":
+                return None
+            depth += {"(": 1, ")": -1}.get(text, 0)
+            if depth < 0:
+                return None
+        tokens.append(_Token(kind, text, match.start(), match.end()))
+    return tokens if depth == 0 else None
+
+
+def _is_op(tokens: List[_Token], i: int, text: str) -> bool:
+    return i < len(tokens) and tokens[i].kind == "op" and tokens[i].text == text
+
+
+def _skip_parens(tokens: List[_Token], i: int) -> int:
+    """Given the index of '(', return the index just past its matching ')'."""
+    depth = 0
+    while i < len(tokens):
+        if _is_op(tokens, i, "("):
+            depth += 1
+        elif _is_op(tokens, i, ")"):
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return i
+
+
+def _cte_names(tokens: List[_Token]) -> Set[str]:
+    """Collect lower-cased CTE names from every WITH clause."""
+    names = set()
+    for i, token in enumerate(tokens):
+        if token.upper != "WITH":
+            continue
+        j = i + 1
+        if j < len(tokens) and tokens[j].upper == "RECURSIVE":
+            j += 1
+        while j + 1 < len(tokens) and tokens[j].kind in ("ident", "quoted") and tokens[j + 1].upper == "AS":
+            names.add(tokens[j].name.lower())
+            j += 2
+            if not _is_op(tokens, j, "("):
+                break
+            j = _skip_parens(tokens, j)
+            if not _is_op(tokens, j, ","):
+                break
+            j += 1
+    return names
+
+
+def _read_path(tokens: List[_Token], i: int) -> Tuple[List[str], int]:
+    """Read a (possibly hyphenated, backticked or wildcard) table path starting at ``i``."""
+    pieces = [tokens[i].name]
+    j = i + 1
+    while j < len(tokens) and tokens[j].start == tokens[j - 1].end and (
+        tokens[j].kind in ("ident", "quoted", "number")
+        or (tokens[j].kind == "op" and tokens[j].text in ".-*")
+    ):
+        pieces.append(tokens[j].name)
+        j += 1
+    # Allow whitespace around dots between quoted segments: `p`.`d`.`t`
+    while _is_op(tokens, j, ".") and j + 1 < len(tokens) and tokens[j + 1].kind in ("ident", "quoted"):
+        pieces.extend([".", tokens[j + 1].name])
+        j += 2
+    return [part for part in "".join(pieces).split(".") if part], j
+
+
+def _read_alias(tokens: List[_Token], i: int) -> Tuple[Optional[str], int]:
+    """Read an optional ``[AS] alias`` after a FROM item."""
+    if i < len(tokens) and tokens[i].upper == "AS":
+        i += 1
+        if i < len(tokens) and tokens[i].kind in ("ident", "quoted"):
+            return tokens[i].name, i + 1
+        return None, i
+    if i < len(tokens) and (
+        tokens[i].kind == "quoted" or (tokens[i].kind == "ident" and tokens[i].upper not in _CLAUSE_WORDS)
+    ):
+        return tokens[i].name, i + 1
+    return None, i
+
+
+def _is_from_keyword(tokens: List[_Token], i: int) -> bool:
+    """Whether tokens[i] starts a FROM list (not EXTRACT(... FROM ...) or IS DISTINCT FROM)."""
+    token = tokens[i]
+    if token.upper == "JOIN":
+        return True
+    if token.upper != "FROM":
+        return False
+    if i >= 1 and tokens[i - 1].upper == "DISTINCT" and i >= 2 and tokens[i - 2].upper in ("IS", "NOT"):
+        return False
+    # Walk back to the enclosing '(' and check whether it belongs to EXTRACT
+    depth = 0
+    for j in range(i - 1, -1, -1):
+        if _is_op(tokens, j, ")"):
+            depth += 1
+        elif _is_op(tokens, j, "("):
+            if depth == 0:
+                return not (j >= 1 and tokens[j - 1].upper == "EXTRACT")
+            depth -= 1
+    return True
+
+
+def _table_references(tokens: List[_Token]) -> Tuple[List[_TableRef], Set[str], List[str]]:
+    """Find base-table references, the aliases of derived FROM items and table-valued functions."""
+    refs: List[_TableRef] = []
+    opaque: Set[str] = set()
+    functions: List[str] = []
+    for i in range(len(tokens)):
+        if not _is_from_keyword(tokens, i):
+            continue
+        j = i + 1
+        while j < len(tokens):
+            token = tokens[j]
+            if _is_op(tokens, j, "(") or (token.upper == "UNNEST" and _is_op(tokens, j + 1, "(")):
+                # Subquery, parenthesized join or UNNEST: its columns are derived
+                j = _skip_parens(tokens, j + (0 if token.kind == "op" else 1))
+                alias, j = _read_alias(tokens, j)
+                if alias:
+                    opaque.add(alias.lower())
+            elif token.kind in ("ident", "quoted") and token.upper not in _CLAUSE_WORDS:
+                parts, end = _read_path(tokens, j)
+                if _is_op(tokens, end, "("):
+                    # Table-valued function such as ML.PREDICT(...)
+                    functions.append(".".join(parts))
+                    j = _skip_parens(tokens, end)
+                    alias, j = _read_alias(tokens, j)
+                    if alias:
+                        opaque.add(alias.lower())
+                else:
+                    alias, j = _read_alias(tokens, end)
+                    refs.append(_TableRef(parts, alias, (i + 1, j)))
+            else:
+                break
+            if not _is_op(tokens, j, ","):
+                break
+            j += 1
+    return refs, opaque, functions
+
+
+def _alias_definitions(tokens: List[_Token]) -> Set[str]:
+    """Collect lower-cased names introduced by ``AS name`` or implicit ``expr name`` aliases."""
+    aliases = set()
+    for i, token in enumerate(tokens):
+        if token.kind not in ("ident", "quoted") or token.upper in _KEYWORDS:
+            continue
+        if i == 0:
+            continue
+        previous = tokens[i - 1]
+        if previous.upper in ("AS", "OVER"):
+            aliases.add(token.name.lower())
+        elif previous.kind in _VALUE_KINDS and (
+            previous.upper not in _KEYWORDS or previous.upper in _VALUE_KEYWORDS
+        ):
+            # "SELECT amount total", "COUNT(*) n" or "CASE ... END flag": an identifier right after a complete value
+            aliases.add(token.name.lower())
+        elif _is_op(tokens, i - 1, ")") or _is_op(tokens, i - 1, "]"):
+            aliases.add(token.name.lower())
+    # Named window definitions: WINDOW w AS (...)
+    for i in range(len(tokens) - 1):
+        if tokens[i].kind == "ident" and tokens[i + 1].upper == "AS" and _is_op(tokens, i + 2, "("):
+            aliases.add(tokens[i].name.lower())
+    return aliases
+
+
+def _name_runs(tokens: List[_Token], skip: Set[int]) -> List[List[int]]:
+    """Yield token-index runs of dotted names (``a``, ``a.b``, ``a.b.c``) used as values."""
+    runs = []
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if i in skip or token.kind not in ("ident", "quoted") or (token.kind == "ident" and token.upper in _KEYWORDS):
+            i += 1
+            continue
+        if i > 0 and _is_op(tokens, i - 1, "."):
+            # Continuation of an expression like (expr).field or arr[OFFSET(0)].field
+            i += 1
+            continue
+        run = [i]
+        j = i + 1
+        while _is_op(tokens, j, ".") and j + 1 < len(tokens) and tokens[j + 1].kind in ("ident", "quoted"):
+            run.append(j + 1)
+            j += 2
+        is_call = _is_op(tokens, j, "(")
+        is_named_arg = _is_op(tokens, j, "=") and _is_op(tokens, j + 1, ">")
+        is_definition = j < len(tokens) and tokens[j].upper == "AS" and _is_op(tokens, j + 1, "(")
+        if not (is_call or is_named_arg or is_definition):
+            runs.append(run)
+        i = j
+    return runs
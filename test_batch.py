@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+from batch import answer_question, summarize
+from benchmarks.fakes import FakeChatModel, fake_sql_agent
+from pipeline import QuestionPipeline
+
+
+def result(status="success", **timings):
+    return {"status": status, "timings": timings}
+
+
+def test_summary_reports_stage_percentiles():
+    results = [result(total=float(seconds), execute=float(seconds) / 2) for seconds in range(1, 11)]
+    summary = summarize(results, wall_seconds=5.0)
+
+    assert summary["stages"]["total"] == {"count": 10, "p50": 5.5, "p95": 9.55}
+    assert summary["stages"]["execute"] == {"count": 10, "p50": 2.75, "p95": 4.775}
+
+
+def test_summary_skips_stages_no_question_reached():
+    results = [result(total=1.0, dry_run=0.5), result("error", total=2.0)]
+    stages = summarize(results, wall_seconds=1.0)["stages"]
+
+    assert stages["dry_run"] == {"count": 1, "p50": 0.5, "p95": 0.5}
+    assert stages["total"]["count"] == 2
+    assert "execute" not in stages
+
+
+def test_summary_counts_outcomes_and_throughput():
+    results = [result(total=1.0)] * 3 + [result("error", total=1.0)]
+    summary = summarize(results, wall_seconds=8.0)
+
+    assert (summary["questions"], summary["succeeded"], summary["failed"]) == (4, 3, 1)
+    assert summary["questions_per_second"] == 0.5
+    assert summary["wall_seconds"] == 8.0
+
+
+def test_summary_of_an_instant_batch_has_no_throughput():
+    assert summarize([], wall_seconds=0.0)["questions_per_second"] is None
+
+
+@pytest.mark.parametrize("mode, stages", [
+    ("dry-run", {"schema", "generate", "validate", "dry_run", "total"}),
+    ("execute", {"schema", "generate", "validate", "dry_run", "execute", "export", "total"}),
+])
+def test_answered_questions_feed_the_summary(bigquery, database_client, tmp_path, mode, stages):
+    pipeline = QuestionPipeline(database_client, fake_sql_agent(database_client.schema_prefix, FakeChatModel()))
+    results = [
+        answer_question(pipeline, {"id": str(n), "question": f"table_000{n} rows"}, mode, str(tmp_path), None)
+        for n in range(3)
+    ]
+
+    assert [answer["status"] for answer in results] == ["success"] * 3
+    if mode == "execute":
+        assert all(os.path.exists(answer["result_file"]) for answer in results)
+    summary = summarize(results, wall_seconds=1.0)
+    assert stages <= set(summary["stages"])
+    assert all(summary["stages"][stage]["count"] == 3 for stage in stages)
+    assert summary["questions_per_second"] == 3.0
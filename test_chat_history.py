@@ -0,0 +1,99 @@
+import gc
+import os
+
+import pytest
+
+from benchmarks.fakes import synthetic_arrow_table
+from chat_history import ChatHistory
+from result_pager import ResultPager
+
+
+def make_pager(num_rows, page_rows=100, max_rows=1000, source_table=None):
+    table = synthetic_arrow_table(num_rows, 3)
+    pager = ResultPager(
+        table.to_batches(max_chunksize=page_rows),
+        page_rows=page_rows,
+        max_rows=max_rows,
+        total_rows=num_rows,
+        source_table=table if source_table else None,
+    )
+    pager.load_next_page()
+    return pager
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = ChatHistory(memory_budget_bytes=1, disk_budget_bytes=1024 ** 3, preview_rows=5, spill_dir=str(tmp_path))
+    yield history
+    history.close()
+
+
+def test_older_results_are_spilled_and_read_back(history):
+    first = history.add_result("assistant", make_pager(500))
+    loaded = first.pager.to_table()
+    latest = history.add_result("assistant", make_pager(500))
+
+    assert first.pager is None and os.path.exists(first.spill_path)
+    assert latest.in_memory
+    assert history.load(first).equals(loaded)
+    assert first.preview.num_rows == 5
+    assert history.stats()["spilled"] == 1
+
+
+def test_spilling_a_cached_result_keeps_only_the_loaded_rows(history):
+    first = history.add_result("assistant", make_pager(5000, page_rows=100, max_rows=300, source_table=True))
+    first.pager.load_next_page()
+    history.add_result("assistant", make_pager(10))
+
+    assert first.loaded_rows == 200
+    assert history.load(first).num_rows == 200
+
+
+def test_oldest_spilled_results_are_evicted_past_the_disk_budget(tmp_path):
+    history = ChatHistory(memory_budget_bytes=1, disk_budget_bytes=1, preview_rows=5, spill_dir=str(tmp_path))
+    entries = [history.add_result("assistant", make_pager(500)) for _ in range(3)]
+
+    assert all(entry.evicted and entry.spill_path is None for entry in entries[:2])
+    assert entries[2].in_memory
+    assert history.load(entries[0]) is None
+    assert os.listdir(history.spill_dir) == []
+    history.close()
+
+
+def test_spill_files_are_deleted_when_the_history_is_collected(tmp_path):
+    history = ChatHistory(memory_budget_bytes=1, disk_budget_bytes=1024 ** 3, preview_rows=5, spill_dir=str(tmp_path))
+    for _ in range(2):
+        history.add_result("assistant", make_pager(500))
+    spill_dir = history.spill_dir
+    assert os.listdir(spill_dir)
+
+    del history
+    gc.collect()
+    assert not os.path.exists(spill_dir)
+
+
+def write_export(history, entry, file_format="csv"):
+    file_path = history.export_path(entry, file_format)
+    open(file_path, "w").close()
+    history.add_export(entry, file_format, file_path)
+    return file_path
+
+
+def test_exports_are_deleted_once_a_newer_result_arrives(history):
+    first = history.add_result("assistant", make_pager(500))
+    file_path = write_export(history, first)
+    assert first.exports == {"csv": file_path} and os.path.exists(file_path)
+
+    latest = history.add_result("assistant", make_pager(500))
+    assert first.exports == {} and not os.path.exists(file_path)
+    assert os.path.exists(write_export(history, latest))
+
+
+def test_exports_of_evicted_results_are_deleted(tmp_path):
+    history = ChatHistory(memory_budget_bytes=1, disk_budget_bytes=1, preview_rows=5, spill_dir=str(tmp_path))
+    entries = [history.add_result("assistant", make_pager(500)) for _ in range(2)]
+    history.add_result("assistant", make_pager(500))
+    assert entries[0].evicted
+    file_path = write_export(history, entries[0])
+    assert entries[0].exports == {} and not os.path.exists(file_path)
+    history.close()
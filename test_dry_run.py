@@ -0,0 +1,90 @@
+import pytest
+from google.api_core.exceptions import BadRequest
+
+from benchmarks.fakes import FakeChatModel, fake_sql_agent
+from bigquery_tools import _query_job_config
+from config import Config
+from pipeline import PipelineError, QuestionPipeline
+
+SQL = "SELECT column_000 FROM `test-project.test_dataset.table_0000`"
+
+
+def test_queries_within_the_budget_pass_with_their_estimate(bigquery, database_client):
+    assert database_client.dry_run(SQL) == (True, "", bigquery.bytes_processed)
+
+
+def test_queries_over_the_budget_are_refused(bigquery, database_client, monkeypatch):
+    monkeypatch.setattr(Config, "MAX_BYTES_BILLED", bigquery.bytes_processed - 1)
+    is_valid, error_message, estimated_bytes = database_client.dry_run(SQL)
+    assert not is_valid
+    assert "exceeds" in error_message and "budget" in error_message
+    assert estimated_bytes == bigquery.bytes_processed
+
+
+def test_a_zero_budget_disables_the_refusal(bigquery, database_client, monkeypatch):
+    monkeypatch.setattr(Config, "MAX_BYTES_BILLED", 0)
+    assert database_client.dry_run(SQL)[0]
+
+
+def test_dry_run_errors_are_reported(bigquery, database_client):
+    bigquery.dry_run_errors.append(BadRequest("Unrecognized name: amont"))
+    is_valid, error_message, estimated_bytes = database_client.dry_run(SQL)
+    assert not is_valid
+    assert error_message.startswith("Dry run failed:") and "Unrecognized name: amont" in error_message
+    assert estimated_bytes == 0
+
+
+def test_job_config_carries_the_budget_and_timeout(monkeypatch):
+    monkeypatch.setattr(Config, "MAX_BYTES_BILLED", 1024 ** 3)
+    monkeypatch.setattr(Config, "QUERY_TIMEOUT_MS", 60_000)
+    job_config = _query_job_config()
+    assert job_config.maximum_bytes_billed == 1024 ** 3
+    # The library keeps the value in its API form, an int64 string
+    assert int(job_config.job_timeout_ms) == 60_000
+    assert not job_config.use_legacy_sql
+
+
+def test_job_config_leaves_disabled_limits_unset(monkeypatch):
+    monkeypatch.setattr(Config, "MAX_BYTES_BILLED", 0)
+    monkeypatch.setattr(Config, "QUERY_TIMEOUT_MS", 0)
+    job_config = _query_job_config()
+    assert job_config.maximum_bytes_billed is None
+    assert job_config.job_timeout_ms is None
+
+
+def test_executed_jobs_are_submitted_with_the_limits(bigquery, database_client, monkeypatch):
+    monkeypatch.setattr(Config, "MAX_BYTES_BILLED", 1024 ** 3)
+    monkeypatch.setattr(Config, "QUERY_TIMEOUT_MS", 60_000)
+    database_client.execute_query(SQL)
+    job_config = bigquery.jobs[-1].job_config
+    assert (job_config.maximum_bytes_billed, int(job_config.job_timeout_ms)) == (1024 ** 3, 60_000)
+
+
+def make_pipeline(database_client, events, max_regenerations=2):
+    agent = fake_sql_agent(database_client.schema_prefix, FakeChatModel())
+    return QuestionPipeline(
+        database_client, agent, max_regenerations=max_regenerations,
+        on_event=lambda event, **details: events.append((event, details)),
+    )
+
+
+def test_dry_run_errors_are_fed_back_into_regeneration(bigquery, database_client):
+    bigquery.dry_run_errors.append(BadRequest("Unrecognized name: amont"))
+    events = []
+    prepared = make_pipeline(database_client, events).prepare("table_0000 rows")
+
+    assert prepared.regeneration_attempts == 1
+    assert prepared.estimated_bytes == bigquery.bytes_processed
+    failures = [details["error"] for event, details in events if event == "validation_failed"]
+    assert len(failures) == 1 and "Unrecognized name: amont" in failures[0]
+
+
+def test_queries_that_stay_over_budget_fail_the_pipeline(bigquery, database_client, monkeypatch):
+    monkeypatch.setattr(Config, "MAX_BYTES_BILLED", bigquery.bytes_processed - 1)
+    events = []
+    with pytest.raises(PipelineError, match="budget") as raised:
+        make_pipeline(database_client, events, max_regenerations=1).prepare("table_0000 rows")
+
+    assert raised.value.stage == "validate"
+    assert [event for event, _ in events].count("regenerating") == 1
+    assert not bigquery.jobs
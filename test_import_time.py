@@ -0,0 +1,18 @@
+import pytest
+
+from benchmarks.import_time import check_module
+
+ENTRY_POINTS = ["main", "batch", "pipeline"]
+
+# The benchmark's default is 1 s; CI machines are slower and noisier, so only gross regressions fail
+BUDGET_MS = 5000
+
+
+@pytest.mark.parametrize("module", ENTRY_POINTS)
+def test_heavy_sdks_are_not_imported_eagerly(module):
+    assert check_module(module, runs=1, budget_ms=float("inf")) == []
+
+
+@pytest.mark.parametrize("module", ENTRY_POINTS)
+def test_entry_points_import_within_budget(module):
+    assert check_module(module, runs=3, budget_ms=BUDGET_MS) == []
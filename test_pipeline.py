@@ -0,0 +1,87 @@
+from typing import List
+
+import pytest
+
+from benchmarks.fakes import FakeChatModel, fake_sql_agent
+from pipeline import PipelineError, QuestionPipeline
+from sql_cache import get_sql_cache
+
+QUESTION = "How many rows are in table_0000?"
+
+
+class ScriptedChatModel(FakeChatModel):
+    """Answers with each of ``answers`` in turn, then like ``FakeChatModel``, recording every prompt."""
+
+    answers: List[str] = []
+    prompts: List[str] = []
+
+    def _answer(self, messages) -> str:
+        self.prompts.append("\n".join(str(message.content) for message in messages))
+        if self.answers:
+            return '{"query": "%s"}' % self.answers.pop(0)
+        return FakeChatModel._answer(messages)
+
+
+def make_pipeline(database_client, answers=(), max_regenerations=2):
+    llm = ScriptedChatModel(answers=list(answers), prompts=[])
+    events = []
+    pipeline = QuestionPipeline(
+        database_client,
+        fake_sql_agent(database_client.schema_prefix, llm),
+        max_regenerations=max_regenerations,
+        on_event=lambda event, **details: events.append(event),
+    )
+    return pipeline, llm, events
+
+
+def cached_sql(pipeline, prompt_schema):
+    return get_sql_cache().get(pipeline.sql_agent._cache_key(QUESTION, prompt_schema))
+
+
+def test_valid_sql_is_prepared_without_regeneration(bigquery, database_client):
+    pipeline, llm, events = make_pipeline(database_client)
+    prepared = pipeline.prepare(QUESTION)
+
+    assert prepared.regeneration_attempts == 0
+    assert prepared.estimated_bytes == bigquery.bytes_processed
+    assert events == ["generated", "validated"]
+    assert {"schema", "generate", "validate", "dry_run"} <= set(prepared.timings)
+    assert cached_sql(pipeline, prepared.prompt_schema) == prepared.sql
+
+
+def test_invalid_sql_is_regenerated_with_the_validation_error(bigquery, database_client):
+    invalid = f"SELECT no_such_column FROM {database_client.schema_prefix}table_0000`"
+    pipeline, llm, events = make_pipeline(database_client, answers=[invalid])
+    prepared = pipeline.prepare(QUESTION)
+
+    assert prepared.regeneration_attempts == 1
+    assert prepared.sql != invalid
+    assert events == ["generated", "validation_failed", "regenerating", "generated", "validated"]
+    assert "Previous attempt failed with error" in llm.prompts[1]
+    assert "no_such_column" in llm.prompts[1]
+    # Only the repaired SQL is cached, under the original question
+    assert cached_sql(pipeline, prepared.prompt_schema) == prepared.sql
+
+
+def test_sql_that_never_validates_fails_and_is_not_cached(bigquery, database_client):
+    invalid = f"SELECT no_such_column FROM {database_client.schema_prefix}table_0000`"
+    pipeline, llm, events = make_pipeline(database_client, answers=[invalid] * 3, max_regenerations=2)
+    with pytest.raises(PipelineError, match="after 2 attempts") as raised:
+        pipeline.prepare(QUESTION)
+
+    assert raised.value.stage == "validate"
+    assert raised.value.sql_query == invalid
+    assert "generate" in raised.value.timings
+    assert len(llm.prompts) == 3
+    assert events.count("regenerating") == 2
+    prompt_schema = database_client.get_relevant_schema(QUESTION)
+    assert cached_sql(pipeline, prompt_schema) is None
+
+
+def test_repeat_questions_reuse_the_validated_sql(bigquery, database_client):
+    pipeline, llm, _ = make_pipeline(database_client)
+    first = pipeline.prepare(QUESTION)
+    second = pipeline.prepare(QUESTION)
+
+    assert second.sql == first.sql
+    assert len(llm.prompts) == 1
@@ -0,0 +1,78 @@
+import pytest
+
+from benchmarks.fakes import FakeQueryJob, synthetic_arrow_table
+from config import Config
+from query_jobs import wait_for_job
+
+
+def make_job(run_seconds):
+    return FakeQueryJob(None, synthetic_arrow_table(10, 2), bytes_processed=1024, run_seconds=run_seconds)
+
+
+def test_finished_job_reports_its_progress():
+    reports = []
+    progress = wait_for_job(make_job(0.05), timeout_seconds=5, on_progress=reports.append, poll_interval=0.01)
+    assert progress.state == "DONE"
+    assert progress.bytes_processed == 1024
+    assert reports[0].state == "RUNNING" and reports[-1] is progress
+
+
+def test_job_past_the_timeout_is_cancelled():
+    job = make_job(10)
+    with pytest.raises(TimeoutError, match="timeout"):
+        wait_for_job(job, timeout_seconds=0.05, poll_interval=0.01)
+    assert job.cancelled
+
+
+def test_interrupted_wait_cancels_the_job():
+    class Stop(BaseException):
+        # Streamlit's StopException and RerunException are BaseExceptions too
+        pass
+
+    def stop(progress):
+        raise Stop()
+
+    job = make_job(10)
+    with pytest.raises(Stop):
+        wait_for_job(job, timeout_seconds=None, on_progress=stop, poll_interval=0.01)
+    assert job.cancelled
+
+
+def test_finished_job_is_not_cancelled_on_error():
+    job = make_job(0)
+
+    def fail(progress):
+        raise RuntimeError("render failed")
+
+    with pytest.raises(RuntimeError):
+        wait_for_job(job, on_progress=fail)
+    assert not job.cancelled
+
+
+def test_execution_reports_progress_until_done(bigquery, database_client):
+    bigquery.job_seconds = 0.3
+    states = []
+    database_client.execute_query(
+        f"SELECT id FROM {database_client.schema_prefix}table_0001`", on_progress=lambda p: states.append(p.state)
+    )
+    assert states[0] == "RUNNING" and states[-1] == "DONE"
+
+
+def test_transient_poll_errors_are_retried_on_the_same_job(bigquery, database_client, monkeypatch):
+    from google.api_core.exceptions import ServiceUnavailable
+
+    monkeypatch.setattr(Config, "SCHEDULER_BACKOFF_BASE", 0.001)
+    bigquery.job_seconds = 0.1
+    bigquery.poll_errors.append(ServiceUnavailable("backend unavailable"))
+    result = database_client.execute_query(f"SELECT id FROM {database_client.schema_prefix}table_0001`")
+    assert result.num_rows == bigquery.result_table.num_rows
+    assert not bigquery.poll_errors
+    assert len(bigquery.jobs) == 1 and not bigquery.jobs[0].cancelled
+
+
+def test_non_retryable_poll_errors_cancel_the_job():
+    job = make_job(10)
+    job.poll_errors.append(PermissionError("access denied"))
+    with pytest.raises(PermissionError):
+        wait_for_job(job, poll_interval=0.01)
+    assert job.cancelled
@@ -0,0 +1,67 @@
+import pytest
+
+from query_preview import make_preview
+
+TABLE = "`p.d.orders`"
+
+
+def preview_sql(sql_query, sample_percent=1.0, row_limit=1000):
+    preview = make_preview(sql_query, sample_percent, row_limit)
+    return preview.sql if preview is not None else None
+
+
+def test_single_table_is_sampled_and_capped():
+    assert preview_sql(f"SELECT id FROM {TABLE} WHERE amount > 0") == (
+        f"SELECT id FROM {TABLE} TABLESAMPLE SYSTEM (1 PERCENT) WHERE amount > 0\nLIMIT 1000"
+    )
+
+
+def test_sample_goes_after_the_alias():
+    assert preview_sql(f"SELECT o.id FROM {TABLE} AS o") == (
+        f"SELECT o.id FROM {TABLE} AS o TABLESAMPLE SYSTEM (1 PERCENT)\nLIMIT 1000"
+    )
+
+
+def test_existing_limit_is_lowered_but_never_raised():
+    assert preview_sql(f"SELECT id FROM {TABLE} LIMIT 5000", row_limit=100).endswith("LIMIT 100")
+    assert preview_sql(f"SELECT id FROM {TABLE} LIMIT 10", row_limit=100).endswith("LIMIT 10")
+
+
+@pytest.mark.parametrize("suffix", [";", " ;  ", "; -- latest orders", ";\n/* done */\n", "  -- no semicolon"])
+def test_trailing_semicolon_and_comments_are_dropped_before_the_limit(suffix):
+    assert preview_sql(f"SELECT id FROM {TABLE}{suffix}") == (
+        f"SELECT id FROM {TABLE} TABLESAMPLE SYSTEM (1 PERCENT)\nLIMIT 1000"
+    )
+
+
+@pytest.mark.parametrize("sql_query", [
+    f"SELECT o.id FROM {TABLE} AS o JOIN `p.d.customers` AS c ON c.id = o.customer_id",
+    "SELECT id FROM `p.d.events_*` WHERE _TABLE_SUFFIX > '20240101'",
+    f"SELECT id FROM {TABLE} FOR SYSTEM_TIME AS OF TIMESTAMP '2024-01-01'",
+    f"SELECT id FROM {TABLE} TABLESAMPLE SYSTEM (10 PERCENT)",
+    "SELECT table_name FROM `p.d.INFORMATION_SCHEMA.TABLES`",
+])
+def test_queries_that_cannot_be_sampled_run_exactly(sql_query):
+    # A LIMIT alone would not lower the bytes billed, so no preview is offered
+    assert make_preview(sql_query, 1.0, 1000) is None
+
+
+def test_full_sample_is_not_a_preview():
+    assert make_preview(f"SELECT id FROM {TABLE}", 100, 1000) is None
+
+
+def test_labels_describe_what_the_sample_changes():
+    plain = make_preview(f"SELECT id FROM {TABLE}", 1.0, 1000)
+    ordered = make_preview(f"SELECT id FROM {TABLE} ORDER BY amount DESC", 1.0, 1000)
+    aggregated = make_preview(f"SELECT COUNT(*) FROM {TABLE}", 1.0, 1000)
+    assert not plain.approximate and "most matches are missing" in plain.describe()
+    assert ordered.ordered_only and "top rows may differ" in ordered.describe()
+    assert aggregated.approximate and not aggregated.ordered_only
+    assert "aggregates are approximate" in aggregated.describe()
+
+
+def test_preview_run_carries_its_caveat(bigquery, database_client):
+    sql_query = f"SELECT id FROM {database_client.schema_prefix}table_0001`"
+    pager = database_client.execute_query(sql_query, stream=True, preview=True)
+    assert "TABLESAMPLE SYSTEM" in bigquery.jobs[-1].query
+    assert pager.caveat.startswith("Approximate preview")
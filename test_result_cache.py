@@ -0,0 +1,153 @@
+import time
+
+import pytest
+
+import bigquery_tools
+from benchmarks.fakes import synthetic_arrow_table
+from result_cache import get_result_cache, is_cacheable, make_result_key, normalize_sql, referenced_tables
+
+
+@pytest.mark.parametrize("sql_query", [
+    "SELECT * FROM `p.d.t` WHERE d >= DATE_SUB(CURRENT_DATE, INTERVAL 7 DAY)",
+    "SELECT * FROM `p.d.t` WHERE d >= DATE_SUB(CURRENT_DATE(), INTERVAL 7 DAY)",
+    "SELECT current_timestamp AS now FROM `p.d.t`",
+    "SELECT * FROM `p.d.t` WHERE t < CURRENT_DATETIME",
+    "SELECT CURRENT_TIME FROM `p.d.t`",
+    "SELECT RAND() FROM `p.d.t`",
+    "SELECT GENERATE_UUID() FROM `p.d.t`",
+])
+def test_non_deterministic_queries_are_not_cacheable(sql_query):
+    assert not is_cacheable(sql_query)
+
+
+@pytest.mark.parametrize("sql_query", [
+    "SELECT current_date_column FROM `p.d.t`",
+    "SELECT * FROM `p.d.t` WHERE d = '2024-01-01'",
+])
+def test_deterministic_queries_are_cacheable(sql_query):
+    assert is_cacheable(sql_query)
+
+
+def test_key_ignores_formatting_but_not_literals():
+    versions = [("p:d.t", 1)]
+    assert make_result_key("SELECT a\n  FROM `p.d.t`;", versions) == make_result_key("SELECT a FROM `p.d.t`", versions)
+    assert normalize_sql("SELECT 'a  b'") != normalize_sql("SELECT 'a b'")
+
+
+def test_key_changes_with_table_versions():
+    assert make_result_key("SELECT a FROM `p.d.t`", [("p:d.t", 1)]) != make_result_key(
+        "SELECT a FROM `p.d.t`", [("p:d.t", 2)]
+    )
+
+
+def test_tables_are_the_from_items_of_the_query():
+    sql_query = (
+        "SELECT o.items.sku FROM `p-1.sales.orders` AS o "
+        "JOIN sales.customers AS c ON c.id = o.customer_id "
+        "JOIN `p-1`.`sales`.`returns` r ON r.id = o.id "
+        "JOIN other.d.t ON TRUE"
+    )
+    assert referenced_tables(sql_query, "bill") == [
+        ("bill", "sales", "customers"),
+        ("other", "d", "t"),
+        ("p-1", "sales", "orders"),
+        ("p-1", "sales", "returns"),
+    ]
+    assert referenced_tables("SELECT 'p.d.t' AS label FROM `p.d.u`") == [("p", "d", "u")]
+
+
+@pytest.mark.parametrize("sql_query", [
+    "SELECT * FROM `p.d.t` JOIN orders USING (id)",
+    "SELECT * FROM `p.d.INFORMATION_SCHEMA.COLUMNS`",
+    "SELECT * FROM ML.PREDICT(MODEL `p.d.m`, TABLE `p.d.t`)",
+    "SELECT * FROM `p.d.t` JOIN d.u USING (id)",
+])
+def test_queries_with_unresolved_from_items_have_no_tables(sql_query):
+    # The last query names a two-part table without a billing project to resolve it against
+    assert referenced_tables(sql_query) is None
+
+
+def test_per_part_quoted_tables_are_keyed(bigquery, database_client):
+    prefix = f"`{database_client.project_id}`.`{database_client.dataset_id}`"
+    sql_query = (
+        f"SELECT t1.id FROM {database_client.schema_prefix}table_0001` AS t1 "
+        f"JOIN {prefix}.`table_0002` AS t2 USING (id)"
+    )
+    database_client.execute_query(sql_query)
+    bigquery.table_modified["table_0002"] = 1
+    bigquery_tools._table_versions_cache.invalidate()
+    database_client.execute_query(sql_query)
+    assert get_result_cache().stats()["hits"] == 0
+
+
+def test_repeated_query_is_a_hit_without_bigquery_requests(bigquery, database_client):
+    sql_query = f"SELECT id FROM {database_client.schema_prefix}table_0001` LIMIT 500"
+    database_client.execute_query(sql_query)
+    requests = bigquery.query_count
+
+    database_client.execute_query(sql_query)
+    assert get_result_cache().stats()["hits"] == 1
+    assert bigquery.query_count == requests
+
+
+def test_modified_tables_miss_once_versions_expire(bigquery, database_client):
+    # The second table is named without its project, which resolves against the billing project
+    sql_query = (
+        f"SELECT t1.id FROM {database_client.schema_prefix}table_0001` AS t1 "
+        f"JOIN {database_client.dataset_id}.table_0002 AS t2 USING (id)"
+    )
+    database_client.execute_query(sql_query)
+    bigquery.table_modified["table_0002"] = 1
+    database_client.execute_query(sql_query)
+    assert get_result_cache().stats()["hits"] == 1
+
+    bigquery_tools._table_versions_cache.invalidate()
+    database_client.execute_query(sql_query)
+    assert get_result_cache().stats()["hits"] == 1
+
+
+def test_views_are_not_cached(bigquery, database_client):
+    bigquery.table_type = "VIEW"
+    sql_query = f"SELECT id FROM {database_client.schema_prefix}table_0001` LIMIT 500"
+    database_client.execute_query(sql_query)
+    database_client.execute_query(sql_query)
+    assert get_result_cache().stats()["hits"] == 0
+
+
+@pytest.mark.parametrize("num_rows", [500, 1000, 3000])
+def test_fully_read_streamed_result_is_cached(bigquery, database_client, num_rows):
+    bigquery.result_table = synthetic_arrow_table(num_rows, 3)
+    sql_query = f"SELECT id FROM {database_client.schema_prefix}table_0001`"
+    first = database_client.execute_query(sql_query, stream=True)
+    assert not first.cache_hit
+    while first.has_more:
+        first.load_next_page()
+
+    second = database_client.execute_query(sql_query, stream=True)
+    assert second.cache_hit
+    assert second.total_rows == num_rows
+    while second.has_more:
+        second.load_next_page()
+    assert second.to_table().equals(bigquery.result_table)
+
+
+def test_partly_read_streamed_result_is_not_downloaded_again(bigquery, database_client, monkeypatch):
+    reads = []
+    list_rows = bigquery.list_rows
+    monkeypatch.setattr(bigquery, "list_rows", lambda *args, **kwargs: reads.append(args) or list_rows(*args, **kwargs))
+    sql_query = f"SELECT id FROM {database_client.schema_prefix}table_0001`"
+    pager = database_client.execute_query(sql_query, stream=True)
+    assert pager.has_more
+    # Long enough for any background read to have started
+    time.sleep(0.2)
+    assert reads == []
+    assert get_result_cache().stats()["memory_entries"] == 0
+
+
+def test_results_over_the_memory_budget_are_not_cached(bigquery, database_client):
+    get_result_cache().memory_budget_bytes = bigquery.result_table.nbytes // 2
+    sql_query = f"SELECT id FROM {database_client.schema_prefix}table_0001`"
+    pager = database_client.execute_query(sql_query, stream=True)
+    while pager.has_more:
+        pager.load_next_page()
+    assert get_result_cache().stats()["memory_entries"] == 0
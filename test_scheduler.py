@@ -0,0 +1,183 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from config import Config
+from mcp_client import QueryExecutionError
+from scheduler import Scheduler, TokenBucket, get_scheduler, is_retryable
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def unlimited(**kwargs):
+    return Scheduler("test", max_concurrency=0, rate=0, burst=1, backoff_base=0.001, backoff_max=0.01, **kwargs)
+
+
+def run_concurrently(fn, count):
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        return [future.result() for future in [executor.submit(fn) for _ in range(count)]]
+
+
+def test_identical_calls_in_flight_run_once():
+    scheduler = unlimited()
+    calls = []
+    release = threading.Event()
+
+    def call():
+        calls.append(1)
+        release.wait(5)
+        return "result"
+
+    def run():
+        return scheduler.run(call, key="same")
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(run) for _ in range(4)]
+        deadline = time.monotonic() + 5
+        while scheduler.stats()["coalesced"] < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        assert [future.result() for future in futures] == ["result"] * 4
+    assert len(calls) == 1
+    assert scheduler.stats()["coalesced"] == 3
+
+
+def test_waiters_share_the_leaders_error():
+    scheduler = unlimited()
+    started = threading.Event()
+
+    def fail():
+        started.set()
+        time.sleep(0.2)
+        raise ValueError("bad query")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        leader = executor.submit(scheduler.run, fail, "key")
+        started.wait(5)
+        follower = executor.submit(scheduler.run, lambda: "unused", "key")
+        for future in (leader, follower):
+            with pytest.raises(ValueError, match="bad query"):
+                future.result()
+
+
+def test_waiters_retry_when_the_leader_is_interrupted():
+    class Stop(BaseException):
+        pass
+
+    scheduler = unlimited()
+    started = threading.Event()
+
+    def interrupted():
+        started.set()
+        time.sleep(0.2)
+        raise Stop()
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        leader = executor.submit(scheduler.run, interrupted, "key")
+        started.wait(5)
+        follower = executor.submit(scheduler.run, lambda: "own result", "key")
+        with pytest.raises(Stop):
+            leader.result()
+        assert follower.result() == "own result"
+
+
+def test_rate_limits_and_server_errors_are_retried():
+    scheduler = unlimited(max_retries=3)
+    failures = [HTTPError(429), HTTPError(503)]
+
+    def flaky():
+        if failures:
+            raise failures.pop(0)
+        return "ok"
+
+    assert scheduler.run(flaky) == "ok"
+    assert scheduler.stats()["retries"] == 2
+
+
+def test_client_errors_and_exhausted_retries_are_raised():
+    scheduler = unlimited(max_retries=2)
+    attempts = []
+
+    def call(status_code):
+        attempts.append(status_code)
+        raise HTTPError(status_code)
+
+    with pytest.raises(HTTPError):
+        scheduler.run(lambda: call(400))
+    with pytest.raises(HTTPError):
+        scheduler.run(lambda: call(500))
+    assert attempts == [400, 500, 500, 500]
+
+
+def test_is_retryable_follows_wrapped_errors_and_bigquery_reasons():
+    wrapped = RuntimeError("generation failed")
+    wrapped.__cause__ = HTTPError(429)
+    reason = Exception("quota")
+    reason.errors = [{"reason": "rateLimitExceeded"}]
+    assert is_retryable(wrapped)
+    assert is_retryable(reason)
+    assert not is_retryable(HTTPError(404))
+    assert not is_retryable(ValueError("bad"))
+
+
+def test_concurrency_is_capped():
+    scheduler = Scheduler("test", max_concurrency=2, rate=0, burst=1)
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def call():
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.pop()
+
+    run_concurrently(lambda: scheduler.run(call), 6)
+    assert max(peak) == 2
+    assert scheduler.stats()["running"] == 0 and scheduler.stats()["queued"] == 0
+
+
+def test_token_bucket_allows_a_burst_then_paces():
+    bucket = TokenBucket(rate=10, capacity=2)
+    waits = [bucket.reserve() for _ in range(4)]
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2] == pytest.approx(0.1, abs=0.02)
+    assert waits[3] == pytest.approx(0.2, abs=0.02)
+    assert TokenBucket(rate=0, capacity=1).reserve() == 0.0
+
+
+def test_concurrent_identical_queries_share_one_job(bigquery, database_client):
+    bigquery.job_seconds = 0.3
+    sql_query = f"SELECT id FROM {database_client.schema_prefix}table_0001` LIMIT 10"
+    results = run_concurrently(lambda: database_client.execute_query(sql_query), 4)
+    assert len(bigquery.jobs) == 1
+    assert all(result.num_rows == bigquery.result_table.num_rows for result in results)
+
+
+def test_lost_submission_responses_are_retried_under_the_same_job_id(bigquery, database_client):
+    from google.api_core.exceptions import ServiceUnavailable
+
+    get_scheduler("bigquery").backoff_base = 0.001
+    bigquery.submit_errors.append(ServiceUnavailable("connection reset"))
+    result = database_client.execute_query(f"SELECT id FROM {database_client.schema_prefix}table_0001` LIMIT 10")
+    assert result.num_rows == bigquery.result_table.num_rows
+    assert len(bigquery.jobs) == 1 and bigquery.jobs[0].job_id.startswith("nl2sql_")
+
+
+def test_failed_waits_never_resubmit_the_job(bigquery, database_client, monkeypatch):
+    from google.api_core.exceptions import ServiceUnavailable
+
+    monkeypatch.setattr(Config, "SCHEDULER_BACKOFF_BASE", 0.001)
+    bigquery.job_seconds = 5
+    bigquery.poll_errors.extend(ServiceUnavailable("unavailable") for _ in range(Config.SCHEDULER_MAX_RETRIES + 1))
+    with pytest.raises(QueryExecutionError, match="unavailable"):
+        database_client.execute_query(f"SELECT id FROM {database_client.schema_prefix}table_0001` LIMIT 10")
+    assert len(bigquery.jobs) == 1 and not bigquery.jobs[0].cancelled
@@ -0,0 +1,131 @@
+import threading
+import time
+
+import pytest
+
+from schema_cache import SchemaCache
+
+
+class Loader:
+    """Returns (key, load number) and can be held to observe who waits on a load."""
+
+    def __init__(self):
+        self.loads = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, key):
+        self.release.wait(5)
+        self.loads.append(key)
+        return key, len(self.loads)
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+def test_hits_and_misses_are_counted():
+    loader = Loader()
+    cache = SchemaCache(loader, ttl=60)
+    assert cache.get("a") == ("a", 1)
+    assert cache.get("a") == ("a", 1)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_entries_past_the_ttl_reload_synchronously_by_default():
+    loader = Loader()
+    cache = SchemaCache(loader, ttl=0.05, refresh_ratio=1.0)
+    cache.get("a")
+    time.sleep(0.06)
+    assert not cache.is_fresh("a")
+    assert cache.get("a") == ("a", 2)
+    assert cache.stats()["misses"] == 2
+
+
+def test_entries_near_the_ttl_are_refreshed_ahead():
+    loader = Loader()
+    cache = SchemaCache(loader, ttl=0.2, refresh_ratio=0.25)
+    cache.get("a")
+    time.sleep(0.06)
+    assert cache.get("a") == ("a", 1)
+    assert wait_until(lambda: cache.stats()["refreshes"] == 1)
+    assert cache.get("a") == ("a", 2)
+
+
+def test_stale_entries_are_served_while_they_revalidate():
+    loader = Loader()
+    cache = SchemaCache(loader, ttl=0.05, max_age=60)
+    cache.get("a")
+    time.sleep(0.06)
+    loader.release.clear()
+
+    started = time.monotonic()
+    assert cache.is_fresh("a")
+    assert cache.get("a") == ("a", 1)
+    assert time.monotonic() - started < 0.05
+    assert cache.stats()["stale_hits"] == 1
+
+    loader.release.set()
+    assert wait_until(lambda: cache.stats()["refreshes"] == 1)
+    assert cache.get("a") == ("a", 2)
+
+
+def test_entries_past_the_max_age_reload_synchronously():
+    loader = Loader()
+    cache = SchemaCache(loader, ttl=0.02, max_age=0.05)
+    cache.get("a")
+    time.sleep(0.06)
+    assert cache.get("a") == ("a", 2)
+    assert cache.stats()["stale_hits"] == 0
+
+
+def test_failed_refresh_keeps_serving_the_stale_entry():
+    calls = []
+
+    def loader(key):
+        calls.append(key)
+        if len(calls) > 1:
+            raise RuntimeError("backend unavailable")
+        return "schema"
+
+    cache = SchemaCache(loader, ttl=0.02, max_age=60)
+    cache.get("a")
+    time.sleep(0.03)
+    assert cache.get("a") == "schema"
+    assert wait_until(lambda: len(calls) == 2)
+    assert cache.get("a") == "schema"
+
+
+def test_least_recently_used_entries_are_evicted():
+    loader = Loader()
+    cache = SchemaCache(loader, ttl=60, max_entries=2)
+    cache.get("a")
+    cache.get("b")
+    cache.get("a")
+    cache.get("c")
+    assert cache.peek("b") is None
+    assert cache.peek("a") == ("a", 1)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_concurrent_misses_load_once():
+    loader = Loader()
+    loader.release.clear()
+    cache = SchemaCache(loader, ttl=60)
+    threads = [threading.Thread(target=cache.get, args=("a",)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    loader.release.set()
+    for thread in threads:
+        thread.join(5)
+    assert loader.loads == ["a"]
+
+
+@pytest.mark.parametrize("max_age, expected", [(None, 0.5), (0.1, 0.5), (2.0, 2.0)])
+def test_max_age_is_never_below_the_ttl(max_age, expected):
+    assert SchemaCache(Loader(), ttl=0.5, max_age=max_age).max_age == expected
@@ -0,0 +1,65 @@
+from benchmarks.fakes import synthetic_schema_rows
+from schema_format import format_entry, group_tables, join_blocks
+
+
+def rows_by_table(rows):
+    tables = {}
+    for row in rows:
+        tables.setdefault(row["table_name"], []).append(row)
+    return tables
+
+
+def columns(*names, data_type="STRING"):
+    return [{"column_name": name, "data_type": data_type, "is_nullable": "YES"} for name in names]
+
+
+def test_date_shards_with_identical_columns_collapse_into_one_entry():
+    entries = group_tables(rows_by_table(synthetic_schema_rows(2, 3, num_shards=5)))
+    assert list(entries) == ["events_*", "table_0000", "table_0001"]
+    shards = entries["events_*"]
+    assert shards.tables == [f"events_2024010{day}" for day in range(1, 6)]
+    assert shards.suffix_range == ("20240101", "20240105")
+
+
+def test_too_few_shards_stay_separate():
+    tables = rows_by_table(synthetic_schema_rows(0, 3, num_shards=2))
+    assert list(group_tables(tables, min_shards=3)) == ["events_20240101", "events_20240102"]
+    assert list(group_tables(tables, min_shards=0)) == ["events_20240101", "events_20240102"]
+
+
+def test_shards_with_different_columns_get_their_own_entries():
+    tables = {
+        "events_20240101": columns("id"),
+        "events_20240102": columns("id"),
+        "events_20240103": columns("id", "url"),
+        "events_20240104": columns("id", "url"),
+    }
+    entries = group_tables(tables)
+    assert list(entries) == ["events_*[20240101..20240102]", "events_*[20240103..20240104]"]
+    assert [row["column_name"] for row in entries["events_*[20240103..20240104]"].rows] == ["id", "url"]
+
+
+def test_suffix_lengths_and_prefixes_are_not_mixed():
+    tables = {name: columns("id") for name in ("sales_202401", "sales_202402", "sales_20240101", "orders")}
+    entries = group_tables(tables)
+    assert set(entries) == {"orders", "sales_*", "sales_20240101"}
+    assert entries["sales_*"].tables == ["sales_202401", "sales_202402"]
+
+
+def test_shard_groups_are_explained_in_the_schema_text():
+    entries = list(group_tables(rows_by_table(synthetic_schema_rows(1, 2, num_shards=3))).values())
+    text = join_blocks(entries, [format_entry(entry) for entry in entries])
+    assert "Table: events_* [3 shards, _TABLE_SUFFIX 20240101..20240103]" in text
+    assert "name one shard such as events_20240103" in text
+    assert "Table: events_20240102" not in text
+
+
+def test_compact_and_verbose_encodings():
+    entry = group_tables({"orders": [
+        {"column_name": "id", "data_type": "INT64", "is_nullable": "NO"},
+        {"column_name": "note", "data_type": "STRING", "is_nullable": "YES"},
+    ]})["orders"]
+    assert format_entry(entry) == "\nTable: orders\n  id INT64 NOT NULL, note STRING"
+    assert format_entry(entry, compact=False) == (
+        "\nTable: orders\nColumns:\n  - id (INT64, NOT NULL)\n  - note (STRING, NULL)"
+    )
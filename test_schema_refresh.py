@@ -0,0 +1,94 @@
+import os
+
+import bigquery_tools
+from adk_config import config
+from schema_snapshot import SchemaSnapshotStore, TableSnapshot, diff_tables, get_snapshot_store
+
+
+DATASET_ID = os.environ["DATASET_ID"]
+
+
+def refresh(previous=None):
+    return bigquery_tools._refresh_dataset_schema((config.project_id, DATASET_ID), previous)
+
+
+def test_diff_reports_created_modified_and_dropped_tables():
+    previous = {
+        "same": TableSnapshot(modified=1, rows=[]),
+        "modified": TableSnapshot(modified=1, rows=[]),
+        "dropped": TableSnapshot(modified=1, rows=[]),
+        "unversioned": TableSnapshot(modified=None, rows=[]),
+    }
+    changed, dropped = diff_tables(previous, {"same": 1, "modified": 2, "created": 1})
+    assert changed == {"modified", "created"}
+    assert dropped == {"dropped"}
+
+
+def test_refresh_re_reads_only_modified_tables(bigquery):
+    previous = refresh()
+    bigquery.table_modified["table_0002"] = 7
+    schema = refresh(previous)
+    assert bigquery.column_queries == [None, ["table_0002"]]
+    assert schema.tables["table_0002"].modified == 7
+    assert schema.table_blocks["table_0001"] is previous.table_blocks["table_0001"]
+    assert schema.rows == previous.rows
+
+
+def test_unchanged_dataset_reuses_the_previous_schema(bigquery):
+    previous = refresh()
+    assert refresh(previous) is previous
+    assert len(bigquery.column_queries) == 1
+
+
+def test_most_tables_changed_falls_back_to_a_full_read(bigquery):
+    previous = refresh()
+    for number in range(3):
+        bigquery.table_modified[f"table_{number:04d}"] = 9
+    schema = refresh(previous)
+    assert bigquery.column_queries == [None, None]
+    assert schema.tables["table_0000"].modified == 9 and schema.tables["table_0004"].modified == 0
+
+
+def test_dropped_tables_leave_the_schema(bigquery):
+    previous = refresh()
+    bigquery.schema_rows = [row for row in bigquery.schema_rows if row["table_name"] != "table_0003"]
+    schema = refresh(previous)
+    assert "table_0003" not in schema.tables
+    assert "table_0003" not in schema.index
+
+
+def test_tables_without_columns_are_not_fetched_again(bigquery):
+    bigquery.column_less_tables.append("empty_table")
+    previous = refresh()
+    assert previous.tables["empty_table"].rows == []
+
+    assert refresh(previous) is previous
+    assert len(bigquery.column_queries) == 1
+
+
+def test_unversioned_tables_are_kept_until_the_next_full_read(bigquery):
+    bigquery.unlisted_tables.append("table_0004")
+    previous = refresh()
+    assert previous.tables["table_0004"].modified is None
+
+    bigquery.table_modified["table_0001"] = 3
+    schema = refresh(previous)
+    assert "table_0004" in schema.tables and "table_0004" in schema.index
+    assert refresh(schema) is schema
+
+
+def test_cold_start_reads_columns_from_the_saved_snapshot(bigquery):
+    refresh()
+    assert get_snapshot_store().load(config.project_id, DATASET_ID) is not None
+
+    schema = refresh()
+    assert len(bigquery.column_queries) == 1
+    assert "table_0001" in schema.index
+
+
+def test_snapshot_round_trip(tmp_path):
+    store = SchemaSnapshotStore(str(tmp_path))
+    tables = {"orders": TableSnapshot(modified=5, rows=[{"table_name": "orders", "column_name": "id"}])}
+    store.save("p", "d", tables)
+    assert store.load("p", "d") == tables
+    assert store.load("p", "other") is None
@@ -0,0 +1,41 @@
+from schema_retrieval import SchemaRetriever, select_within_budget, tokenize
+
+DOCUMENTS = {
+    "orders": "orders order_id customer_id amount created_at",
+    "customers": "customers customer_id name country",
+    "products": "products product_id name price",
+}
+
+
+def test_tokenize_splits_identifiers_and_stems_plurals():
+    assert tokenize("customerOrders order_id") == ["customer", "order", "order", "id"]
+
+
+def test_rank_puts_the_matching_table_first():
+    ranked = SchemaRetriever(DOCUMENTS).rank("Total amount of orders per day")
+    assert ranked[0][0] == "orders"
+    assert all(score > 0 for _, score in ranked)
+
+
+def test_rank_ignores_unknown_terms():
+    assert SchemaRetriever(DOCUMENTS).rank("weather forecast") == []
+
+
+def test_postings_hold_only_terms_present_in_each_table():
+    retriever = SchemaRetriever(DOCUMENTS)
+    assert set(retriever.postings["customer"]) == {"orders", "customers"}
+    assert set(retriever.postings["price"]) == {"products"}
+
+
+def test_patched_retriever_matches_a_fresh_one():
+    documents = dict(DOCUMENTS, products="products product_id name price discount")
+    patched = SchemaRetriever(DOCUMENTS).patched(documents, ["products"])
+    fresh = SchemaRetriever(documents)
+    for question in ("price discount", "customers by country", "order amount"):
+        assert patched.rank(question) == fresh.rank(question)
+
+
+def test_select_within_budget_skips_tables_that_overflow():
+    ranked = [("a", 3.0), ("b", 2.0), ("c", 1.0)]
+    assert select_within_budget(ranked, {"a": 50, "b": 80, "c": 40}, top_k=5, token_budget=100) == ["a", "c"]
+    assert select_within_budget(ranked, {"a": 1, "b": 1, "c": 1}, top_k=2, token_budget=100) == ["a", "b"]
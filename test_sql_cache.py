@@ -0,0 +1,32 @@
+from sql_cache import SQLCache, normalize_question
+
+
+def make_key(question, schema_prefixes=("`p.d.",)):
+    return SQLCache.make_key(question, "Table: orders", "google", "model", 0.0, schema_prefixes)
+
+
+def test_normalization_ignores_case_whitespace_and_trailing_punctuation():
+    assert normalize_question("  Total  Revenue by Month? ") == normalize_question("total revenue by month")
+
+
+def test_arithmetic_operators_are_kept():
+    assert normalize_question("revenue / orders") != normalize_question("revenue * orders")
+    assert normalize_question("price + tax") != normalize_question("price tax")
+    assert make_key("revenue / orders") != make_key("revenue * orders")
+
+
+def test_parentheses_are_kept():
+    assert normalize_question("(a + b) * c") != normalize_question("a + (b * c)")
+
+
+def test_key_depends_on_dataset_prefixes_but_not_their_order():
+    assert make_key("orders per day", ["`p.a."]) != make_key("orders per day", ["`q.a."])
+    assert make_key("orders per day", ["`p.a.", "`p.b."]) == make_key("orders per day", ["`p.b.", "`p.a."])
+
+
+def test_persisted_entries_survive_a_new_instance(tmp_path):
+    db_path = str(tmp_path / "sql_cache.sqlite")
+    key = make_key("orders per day")
+    SQLCache(ttl=60, db_path=db_path).put(key, "SELECT 1")
+    assert SQLCache(ttl=60, db_path=db_path).get(key) == "SELECT 1"
+    assert SQLCache(ttl=60, db_path=db_path).get(make_key("orders per day", ["`other.d."])) is None
@@ -0,0 +1,89 @@
+import threading
+
+import pytest
+from langchain_core.messages import AIMessageChunk
+
+import tracing
+from benchmarks.fakes import FakeChatModel, fake_sql_agent
+from sql_generation_agent import _json_object_end, _stream_json
+
+SCHEMA_TEXT = "Table: orders\n  id INT64, amount FLOAT64"
+
+
+def test_candidates_record_llm_call_spans_in_the_callers_trace(bigquery, database_client):
+    agent = fake_sql_agent(database_client.schema_prefix, FakeChatModel())
+    trace = tracing.Trace("orders")
+    with trace.activate(), tracing.span("generate") as parent:
+        sql_query = agent.generate_sql_candidates(
+            "orders", SCHEMA_TEXT, validator=lambda sql: (False, "rejected"), num_candidates=3
+        )
+
+    assert "orders" in sql_query
+    calls = [span for span in trace.spans if span.name == "llm_call"]
+    assert sorted(span.attributes["candidate"] for span in calls) == [0, 1, 2]
+    assert all(span.parent_id == parent.span_id for span in calls)
+    assert all(span.attributes["completion_tokens"] > 0 for span in calls)
+
+
+def test_first_valid_candidate_is_returned(bigquery, database_client):
+    agent = fake_sql_agent(database_client.schema_prefix, FakeChatModel())
+    sql_query = agent.generate_sql_candidates("orders", SCHEMA_TEXT, validator=lambda sql: (True, ""), num_candidates=2)
+    assert sql_query == f"SELECT id FROM {database_client.schema_prefix}orders` LIMIT 100"
+
+
+class ChunkChain:
+    """A chain whose stream yields fixed text chunks and counts how many were read."""
+
+    def __init__(self, *chunks):
+        self.chunks = chunks
+        self.read = 0
+
+    def stream(self, inputs):
+        for chunk in self.chunks:
+            self.read += 1
+            yield AIMessageChunk(content=chunk)
+
+
+@pytest.mark.parametrize("head, tail", [
+    ('{"query": "SELECT 1"}', ""),
+    ('{"query": "SELECT \'{\' AS brace"}', ""),
+    ('{"query": "SELECT \'}\' AS brace"}', " more"),
+    ('{"query": "SELECT \\"x}\\" AS quoted"}', ""),
+    ('{"query": "SELECT \\\\"}', "}"),
+    ('```json\n{"a": {"b": 1}}', "\n```"),
+])
+def test_json_object_end_is_just_past_the_first_object(head, tail):
+    assert _json_object_end(head + tail) == len(head)
+
+
+@pytest.mark.parametrize("text", ['{"query": "SELECT \\"}', '{"query": "SELECT 1"', "no object here"])
+def test_json_object_end_of_an_incomplete_object(text):
+    assert _json_object_end(text) == -1
+
+
+def test_stream_stops_at_the_end_of_the_object():
+    chain = ChunkChain('{"query": "SELECT \'}\' ', 'AS brace"}', " Explanation: ...", "never read")
+    assert _stream_json(chain, "orders") == {"query": "SELECT '}' AS brace"}
+    assert chain.read == 2
+
+
+def test_escaped_quotes_do_not_end_the_string():
+    chain = ChunkChain('{"query": "SELECT \\"', '}\\" AS x"}')
+    assert _stream_json(chain, "orders") == {"query": 'SELECT "}" AS x'}
+    assert chain.read == 2
+
+
+def test_text_after_the_object_is_ignored():
+    chain = ChunkChain('{"query": "SELECT 1"} {"query": "SELECT 2"}')
+    assert _stream_json(chain, "orders") == {"query": "SELECT 1"}
+
+
+def test_truncated_stream_is_rejected():
+    with pytest.raises(ValueError, match="before its JSON object was complete"):
+        _stream_json(ChunkChain('{"query": "SELECT amount FR'), "orders")
+
+
+def test_cancelled_stream_returns_none():
+    cancelled = threading.Event()
+    cancelled.set()
+    assert _stream_json(ChunkChain('{"query": "SELECT 1"}'), "orders", cancelled=cancelled) is None
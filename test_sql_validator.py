@@ -0,0 +1,80 @@
+import pytest
+
+from mcp_client import BigQueryClient
+from schema_index import SchemaIndex
+from sql_validator import SQLValidator
+
+
+def make_index(tables):
+    return SchemaIndex(
+        {"table_name": table, "column_name": column, "data_type": "STRING"}
+        for table, columns in tables.items()
+        for column in columns
+    )
+
+
+SALES = make_index({"orders": ["id", "customer_id", "amount"], "customers": ["id", "name"]})
+EVENTS = make_index({"clicks": ["id", "url"]})
+SINGLE = SQLValidator({("p", "sales"): SALES})
+
+
+def issue_codes(validator, sql_query):
+    return [issue.code for issue in validator.validate(sql_query)]
+
+
+def test_two_part_names_resolve_against_the_billing_project_only():
+    validator = SQLValidator({("billing", "sales"): SALES, ("other", "events"): EVENTS}, project_id="billing")
+    assert issue_codes(validator, "SELECT amount FROM sales.orders") == []
+    assert issue_codes(validator, "SELECT url FROM `other.events.clicks`") == []
+
+    issues = validator.validate("SELECT url FROM events.clicks")
+    assert [issue.code for issue in issues] == ["unknown_dataset"]
+    assert "`other.events.clicks`" in issues[0].message
+
+
+def test_same_dataset_name_in_another_project_is_not_used_for_two_part_names():
+    validator = SQLValidator({("billing", "sales"): SALES, ("other", "sales"): EVENTS}, project_id="billing")
+    assert issue_codes(validator, "SELECT url FROM sales.clicks") == ["unknown_table"]
+    assert issue_codes(validator, "SELECT url FROM `other.sales.clicks`") == []
+
+
+def test_available_tables_are_project_qualified_across_projects(bigquery):
+    client = BigQueryClient("billing", datasets=[("billing", "sales"), ("other", "events")])
+    names = client.available_table_names()
+    assert "billing.sales.table_0000" in names
+    assert "other.events.table_0000" in names
+
+
+def test_available_tables_are_dataset_qualified_within_the_billing_project(bigquery):
+    client = BigQueryClient("billing", datasets=[("billing", "sales"), ("billing", "events")])
+    assert "events.table_0000" in client.available_table_names()
+
+
+@pytest.mark.parametrize("sql_query", [
+    "WITH recent AS (SELECT id, amount FROM `p.sales.orders`) SELECT r.amount FROM recent r",
+    "SELECT c.name, SUM(o.amount) AS total FROM `p.sales.orders` o "
+    "JOIN `p.sales.customers` c ON c.id = o.customer_id GROUP BY c.name ORDER BY total DESC",
+    "SELECT name FROM `p.sales.customers` WHERE id IN (SELECT customer_id FROM `p.sales.orders`)",
+    # Implicit aliases after keywords that complete a value
+    "SELECT CASE WHEN amount > 0 THEN 1 ELSE 0 END flag FROM `p.sales.orders` ORDER BY flag",
+    "SELECT NULL placeholder, TRUE active, FALSE archived FROM `p.sales.orders` ORDER BY placeholder",
+    "SELECT CURRENT_DATE today, CURRENT_TIMESTAMP loaded_at FROM `p.sales.orders` ORDER BY today, loaded_at",
+])
+def test_valid_queries_bind_cleanly(sql_query):
+    assert issue_codes(SINGLE, sql_query) == []
+
+
+@pytest.mark.parametrize("sql_query, code, suggestion", [
+    ("SELECT o.amont FROM `p.sales.orders` o", "unknown_column", "amount"),
+    ("SELECT nme FROM `p.sales.customers`", "unknown_column", "name"),
+    ("SELECT amount FROM `p.sales.order`", "unknown_table", "orders"),
+    ("SELECT x.amount FROM `p.sales.orders` o", "unknown_alias", None),
+    ("SELECT amount FROM orders", "unqualified_table", None),
+    ("SELECT amount FROM `p.other.orders`", "unknown_dataset", None),
+    ("SELECT (amount FROM `p.sales.orders`", "parse_error", None),
+    ("SELECT 1", "no_tables", None),
+])
+def test_binding_errors_are_reported_with_suggestions(sql_query, code, suggestion):
+    issues = SINGLE.validate(sql_query)
+    assert [issue.code for issue in issues] == [code]
+    assert issues[0].suggestion == suggestion
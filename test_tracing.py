@@ -0,0 +1,49 @@
+import socket
+import urllib.request
+
+import pytest
+
+import tracing
+
+
+@pytest.fixture
+def metrics_server():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = tracing.start_metrics_server(port)
+    yield server
+    server.shutdown()
+    server.server_close()
+    tracing._metrics_server = None
+
+
+def test_spans_nest_and_collect_annotations():
+    trace = tracing.Trace("question")
+    with trace.activate():
+        with tracing.span("execute") as outer:
+            with tracing.span("dry_run"):
+                tracing.annotate(bytes_processed=10)
+            tracing.annotate(rows=3)
+    inner = trace.spans[1]
+    assert inner.parent_id == outer.span_id and inner.depth == 1
+    assert inner.attributes == {"bytes_processed": 10}
+    assert outer.attributes == {"rows": 3}
+
+
+def test_spans_outside_a_trace_are_no_ops():
+    with tracing.span("execute") as current:
+        tracing.annotate(rows=3)
+    assert current is None
+
+
+def test_metrics_server_binds_to_localhost_by_default(metrics_server):
+    host, port = metrics_server.server_address
+    assert host == "127.0.0.1"
+    tracing.get_metrics().inc("questions_total", {"status": "success"})
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+        assert b"questions_total" in response.read()
+
+
+def test_disabled_metrics_server_is_not_started():
+    assert tracing.start_metrics_server(0) is None
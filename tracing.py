@@ -0,0 +1,305 @@
+"""Per-question timing spans, aggregated metrics and their exporters.
+
+A ``Trace`` covers one question. While it is active (``with trace.activate():``)
+any code can open nested spans with the module-level ``span()`` and attach
+attributes with ``annotate()``; both are no-ops when no trace is active, so
+library code can be instrumented without knowing who calls it.
+
+Finished traces feed the process-wide ``MetricsRegistry`` (exposed in
+Prometheus text format) and are appended to a JSONL file when configured.
+"""
+
+import contextvars
+import json
+import math
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from config import Config
+
+# Seconds; spans from sub-millisecond lookups up to multi-minute queries
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("current_trace", default=None)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+@dataclass
+class Span:
+    """One timed stage of a trace; offsets are seconds from the trace start."""
+    name: str
+    span_id: int
+    parent_id: Optional[int]
+    depth: int
+    start: float
+    duration: float = 0.0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+
+class Trace:
+    """The spans recorded while answering one question."""
+
+    def __init__(self, question: str):
+        self.trace_id = uuid.uuid4().hex
+        self.question = question
+        self.started_at = time.time()
+        self.status = "running"
+        self.spans: List[Span] = []
+        self.finished = False
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def activate(self) -> Iterator["Trace"]:
+        """Make this the trace that ``span()`` and ``annotate()`` record into."""
+        trace_token = _current_trace.set(self)
+        span_token = _current_span.set(None)
+        try:
+            yield self
+        finally:
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """Time a block as a child of the current span."""
+        parent = _current_span.get()
+        with self._lock:
+            current = Span(
+                name=name,
+                span_id=len(self.spans),
+                parent_id=parent.span_id if parent else None,
+                depth=parent.depth + 1 if parent else 0,
+                start=time.perf_counter() - self._origin,
+                attributes=dict(attributes),
+            )
+            self.spans.append(current)
+        token = _current_span.set(current)
+        try:
+            yield current
+        except BaseException as e:
+            current.attributes.setdefault("error", f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            current.duration = time.perf_counter() - self._origin - current.start
+            _current_span.reset(token)
+
+    @property
+    def duration(self) -> float:
+        """Seconds from the trace start to the end of its last span."""
+        return max((s.start + s.duration for s in self.spans), default=0.0)
+
+    def stage_totals(self) -> Dict[str, float]:
+        """Seconds spent per span name, summed over repeats (e.g. regenerations)."""
+        totals: Dict[str, float] = {}
+        for s in self.spans:
+            totals[s.name] = totals.get(s.name, 0.0) + s.duration
+        return totals
+
+    def finish(self, status: str = "success"):
+        """Close the trace and hand it to the metrics registry and JSONL log (once)."""
+        with self._lock:
+            if self.finished:
+                return
+            self.finished = True
+            self.status = status
+        get_metrics().record(self)
+        if Config.TRACE_LOG_PATH:
+            _append_jsonl(Config.TRACE_LOG_PATH, self.to_dict())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "question": self.question,
+            "started_at": self.started_at,
+            "status": self.status,
+            "duration": round(self.duration, 6),
+            "spans": [asdict(s) for s in self.spans],
+        }
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Time a block in the active trace; yields None when no trace is active."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    with trace.span(name, **attributes) as current:
+        yield current
+
+
+def annotate(**attributes: Any):
+    """Attach attributes to the innermost open span of the active trace, if any."""
+    current = _current_span.get()
+    if current is not None and _current_trace.get() is not None:
+        current.attributes.update(attributes)
+
+
+def current_trace() -> Optional[Trace]:
+    """Return the active trace, if any."""
+    return _current_trace.get()
+
+
+class MetricsRegistry:
+    """Process-wide counters and latency histograms built from finished traces.
+
+    Components can also publish their own counters, histograms and gauges
+    (e.g. scheduler queue depth) through ``inc``, ``observe`` and ``set_gauge``.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = _BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, Tuple], List[float]] = {}
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._gauges: Dict[Tuple[str, Tuple], float] = {}
+
+    def record(self, trace: Trace):
+        """Fold a finished trace into the metrics."""
+        with self._lock:
+            self._inc("questions_total", {"status": trace.status})
+            self._observe("question_duration_seconds", {}, trace.duration)
+            for s in trace.spans:
+                self._observe("stage_duration_seconds", {"stage": s.name}, s.duration)
+                attributes = s.attributes
+                for kind in ("prompt_tokens", "completion_tokens"):
+                    if attributes.get(kind):
+                        self._inc("llm_tokens_total", {"kind": kind.split("_")[0]}, attributes[kind])
+                for cache in ("sql_cache", "result_cache"):
+                    if f"{cache}_hit" in attributes:
+                        result = "hit" if attributes[f"{cache}_hit"] else "miss"
+                        self._inc("cache_requests_total", {"cache": cache.split("_")[0], "result": result})
+                if attributes.get("bytes_processed"):
+                    self._inc("bytes_processed_total", {}, attributes["bytes_processed"])
+                if attributes.get("rows"):
+                    self._inc("rows_returned_total", {}, attributes["rows"])
+
+    def inc(self, name: str, labels: Dict[str, str], amount: float = 1):
+        """Add to a counter."""
+        with self._lock:
+            self._inc(name, labels, amount)
+
+    def observe(self, name: str, labels: Dict[str, str], value: float):
+        """Record a value in a histogram."""
+        with self._lock:
+            self._observe(name, labels, value)
+
+    def set_gauge(self, name: str, labels: Dict[str, str], value: float):
+        """Set a gauge to its current value."""
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def render_prometheus(self, prefix: str = "bq_chat") -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self._counters}):
+                lines.append(f"# TYPE {prefix}_{name} counter")
+                for (metric, labels), value in sorted(self._counters.items()):
+                    if metric == name:
+                        lines.append(f"{prefix}_{name}{_labels(labels)} {_number(value)}")
+            for name in sorted({name for name, _ in self._gauges}):
+                lines.append(f"# TYPE {prefix}_{name} gauge")
+                for (metric, labels), value in sorted(self._gauges.items()):
+                    if metric == name:
+                        lines.append(f"{prefix}_{name}{_labels(labels)} {_number(value)}")
+            for name in sorted({name for name, _ in self._histograms}):
+                lines.append(f"# TYPE {prefix}_{name} histogram")
+                for (metric, labels), state in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    counts, total, count = state[:-2], state[-2], state[-1]
+                    for bound, bucket_count in zip(self.buckets, counts):
+                        bucket_labels = labels + (("le", _number(bound)),)
+                        lines.append(f"{prefix}_{name}_bucket{_labels(bucket_labels)} {_number(bucket_count)}")
+                    lines.append(f"{prefix}_{name}_bucket{_labels(labels + (('le', '+Inf'),))} {_number(count)}")
+                    lines.append(f"{prefix}_{name}_sum{_labels(labels)} {total:.6f}")
+                    lines.append(f"{prefix}_{name}_count{_labels(labels)} {_number(count)}")
+        return "\n".join(lines) + "\n"
+
+    def _inc(self, name: str, labels: Dict[str, str], amount: float = 1):
+        key = (name, tuple(sorted(labels.items())))
+        self._counters[key] = self._counters.get(key, 0) + amount
+
+    def _observe(self, name: str, labels: Dict[str, str], value: float):
+        key = (name, tuple(sorted(labels.items())))
+        # Cumulative bucket counts, then sum and count
+        state = self._histograms.setdefault(key, [0.0] * (len(self.buckets) + 2))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[i] += 1
+        state[-2] += value
+        state[-1] += 1
+
+
+def _labels(labels: Tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        f'{key}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for key, value in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() and not math.isinf(value) else repr(float(value))
+
+
+_metrics = MetricsRegistry()
+_jsonl_lock = threading.Lock()
+_metrics_server: Optional[ThreadingHTTPServer] = None
+_metrics_server_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Return the process-wide metrics registry."""
+    return _metrics
+
+
+def _append_jsonl(path: str, record: Dict[str, Any]):
+    line = json.dumps(record, default=str)
+    with _jsonl_lock:
+        with open(path, "a", encoding="utf-8") as handle:
+            handle.write(line + "\n")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = get_metrics().render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would otherwise flood stderr
+        pass
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> Optional[ThreadingHTTPServer]:
+    """Serve ``/metrics`` on a background thread, once per process.
+
+    Safe to call on every Streamlit rerun; returns the running server, or None
+    when ``port`` is 0. Only local scrapers can connect unless ``host`` names
+    a public interface.
+    """
+    global _metrics_server
+    if not port:
+        return None
+    with _metrics_server_lock:
+        if _metrics_server is None:
+            _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _metrics_server.daemon_threads = True
+            threading.Thread(target=_metrics_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _metrics_server